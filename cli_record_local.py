@@ -6,6 +6,7 @@ import argparse
 import os
 import shutil
 import sys
+import threading
 
 import digiflow as df
 import digiflow.record as df_r
@@ -13,6 +14,9 @@ import digiflow.record as df_r
 from lib import odem
 import lib.odem.commons as oc
 import lib.odem.monitoring.resource as odem_rm
+import lib.odem.ocr.ocr_d as odem_ocrd
+import lib.odem.record_store as odem_rs
+import lib.odem.worker as odem_worker
 
 from lib.odem.commons import (
     RECORD_IDENTIFIER,
@@ -30,6 +34,16 @@ from lib.odem import (
 
 DEFAULT_EXECUTORS = 2
 
+CFG = None
+LOGGER = None
+HANDLER: df_r.RecordHandler = None
+# records processed concurrently share
+# record file and page slots
+HANDLER_LOCK = threading.Lock()
+PAGE_SLOTS: threading.Semaphore = None
+# warm OCR-D containers shared by all records
+CONTAINER_POOL: odem_ocrd.ContainerPool = None
+
 
 def _trnfrm(row):
     oai_id = row[RECORD_IDENTIFIER]
@@ -42,118 +56,97 @@ def _trnfrm(row):
     return _record
 
 
-########
-# MAIN #
-########
-if __name__ == "__main__":
-    PARSER = argparse.ArgumentParser(
-        description="generate ocr-data for OAI-Record")
-    PARSER.add_argument(
-        "data",
-        help="path to file with OAI-Record information")
-    PARSER.add_argument(
-        "-c",
-        "--config",
-        required=False,
-        default="resources/odem.ini",
-        help="path to configuration file")
-    PARSER.add_argument(
-        "-e",
-        "--executors",
-        required=False,
-        help="Number of OCR-D Executors in parallel mode")
-    ARGS = PARSER.parse_args()
+def _save_record_state(*args, **kwargs):
+    with HANDLER_LOCK:
+        HANDLER.save_record_state(*args, **kwargs)
 
-    # check some pre-conditions
-    # inspect configuration settings
-    CONF_FILE = os.path.abspath(ARGS.config)
-    if not os.path.exists(CONF_FILE):
-        print(f"[ERROR] no config at '{CONF_FILE}'! Halt execution!")
-        sys.exit(1)
 
-    # pick common args
-    # SEQUENTIAL = ARGS.sequential_mode
-    # MUST_KEEP_RESOURCES = ARGS.keep_resources
-    # MUST_LOCK = ARGS.lock_mode
-    EXECUTOR_ARGS = ARGS.executors
+def _next_record() -> df_r.Record:
+    # mark busy at once, since it may be prefetched
+    # or another thread asks for next record
+    with HANDLER_LOCK:
+        return HANDLER.next_record(state=MARK_OCR_OPEN, new_state=MARK_OCR_BUSY)
 
-    CFG = odem.get_configparser()
-    configurations_read = CFG.read(CONF_FILE)
-    if not configurations_read:
-        print(f"unable to read config from '{CONF_FILE}! exit!")
-        sys.exit(1)
 
-    # set work_dirs and logger
-    LOCAL_WORK_ROOT = CFG.get(oc.CFG_SEC_FLOW, 'local_work_root')
-    LOCAL_LOG_DIR = CFG.get(oc.CFG_SEC_FLOW, 'local_log_dir')
-    if not os.path.exists(LOCAL_LOG_DIR) or not os.access(
-            LOCAL_LOG_DIR, os.W_OK):
-        raise RuntimeError(f"cant store log files at invalid {LOCAL_LOG_DIR}")
-    LOG_FILE_NAME = None
-    if CFG.has_option(oc.CFG_SEC_FLOW, 'logfile_name'):
-        LOG_FILE_NAME = CFG.get(oc.CFG_SEC_FLOW, 'logfile_name')
-    LOGGER = get_worker_logger(LOCAL_LOG_DIR, LOG_FILE_NAME)
+def _wrap_save_record_state(status: str, urn, **kwargs):
+    _save_record_state(urn, status, **kwargs)
 
-    # inspect what kind of input to process
-    # oai record file *OR* local data directory must be set
-    OAI_RECORD_FILE = os.path.abspath(ARGS.data)
 
-    # if valid n_executors via cli, use it's value
-    if EXECUTOR_ARGS and int(EXECUTOR_ARGS) > 0:
-        CFG.set(odem.CFG_SEC_OCR, 'n_executors', str(EXECUTOR_ARGS))
-    EXECUTORS = CFG.getint(odem.CFG_SEC_OCR, 'n_executors', fallback=DEFAULT_EXECUTORS)
-    LOGGER.debug("local work_root: '%s', executors:%s", LOCAL_WORK_ROOT, EXECUTORS)
+def _release_record(record: df_r.Record):
+    """Hand back prefetched record not processed"""
 
-    # request next open oai record data
-    DATA_FIELDS = CFG.getlist(oc.CFG_SEC_FLOW, 'data_fields')
-    LOGGER.info("data fields: '%s'", DATA_FIELDS)
-    LOGGER.info("use records from '%s'", OAI_RECORD_FILE)
-    handler = df_r.RecordHandler(
-        OAI_RECORD_FILE, data_fields=DATA_FIELDS, transform_func=_trnfrm)
-    record: df_r.Record = handler.next_record(state=MARK_OCR_OPEN)
-    if not record:
-        LOGGER.info("no open records in '%s', work done", OAI_RECORD_FILE)
-        sys.exit(1)
+    odem_worker.discard_staged(LOCAL_WORK_ROOT, record.local_identifier)
+    _save_record_state(record.identifier, MARK_OCR_OPEN)
 
-    def wrap_save_record_state(status: str, urn, **kwargs):
-        handler.save_record_state(urn, status, **kwargs)
 
+def _fail_record(record: df_r.Record, exc: Exception):
+    """Mark record failed by error escaping processing"""
+
+    _err_args = {str(exc): str(exc.args[0]) if exc.args else '',
+                 oc.STATS_KEY_EXCEPTION: type(exc).__name__}
+    _save_record_state(record.identifier, MARK_OCR_FAIL, INFO=f'{_err_args}')
+
+
+def _process_record(record: df_r.Record) -> bool:
+    """Run complete workflow for single record and
+    store outcome, return False if further processing
+    requires human interaction"""
+
+    local_ident = record.local_identifier
+    req_dst_dir = os.path.join(LOCAL_WORK_ROOT, local_ident)
+    # each record gets own copy since processing may alter it
+    record_cfg = oc.copy_configparser(CFG)
+    odem_process: ODEMProcessImpl = ODEMProcessImpl(record, record_cfg,
+                                                    work_dir=req_dst_dir,
+                                                    logger=LOGGER)
     try:
-        handler.save_record_state(record.identifier, MARK_OCR_BUSY)
-        local_ident = record.local_identifier
-        req_dst_dir = os.path.join(LOCAL_WORK_ROOT, local_ident)
-        if os.path.exists(req_dst_dir):
+        _save_record_state(record.identifier, MARK_OCR_BUSY)
+        # keep pages completed by previous, broken run
+        resume = record_cfg.getboolean(odem.CFG_SEC_FLOW, odem.CFG_SEC_FLOW_OPT_RESUME,
+                                       fallback=False)
+        if os.path.exists(req_dst_dir) and not resume:
             shutil.rmtree(req_dst_dir)
-        proc_type = CFG.get(odem.CFG_SEC_OCR, 'workflow_type', fallback=odem.DEFAULT_WORKLFOW)
-        odem_process: ODEMProcessImpl = ODEMProcessImpl(record, CFG,
-                                                        work_dir=req_dst_dir,
-                                                        logger=LOGGER)
+        # data prefetched by daemon meanwhile
+        preloaded = odem_worker.claim_staged(LOCAL_WORK_ROOT, local_ident, req_dst_dir)
+        proc_type = record_cfg.get(odem.CFG_SEC_OCR, 'workflow_type',
+                                   fallback=odem.DEFAULT_WORKLFOW)
         odem_process.logger = LOGGER
         odem_process.logger.info("[%s] odem from %s, %d executors", local_ident,
                                  OAI_RECORD_FILE, EXECUTORS)
-        odem_process.configuration = CFG
-        local_store_root = CFG.get(oc.CFG_SEC_FLOW, 'local_store_root', fallback=None)
+        odem_process.configuration = record_cfg
+        odem_process.preloaded = preloaded
+        local_store_root = record_cfg.get(oc.CFG_SEC_FLOW, 'local_store_root', fallback=None)
         if local_store_root is not None:
             store_root_dir = os.path.join(local_store_root, local_ident)
             odem_process.store = df.LocalStore(store_root_dir, req_dst_dir)
         process_resource_monitor: odem_rm.ProcessResourceMonitor = odem_rm.ProcessResourceMonitor(
-            odem_rm.from_configuration(CFG),
+            odem_rm.from_configuration(record_cfg),
             LOGGER.error,
-            wrap_save_record_state,
+            _wrap_save_record_state,
             None,
             odem_process.process_identifier,
             record.identifier
         )
         process_resource_monitor.check_vmem()
+        odem_process.fct_check_disk = process_resource_monitor.check_disk_space
         process_resource_monitor.monit_disk_space(odem_process.load)
         odem_process.inspect_metadata()
         odem_process.validate_metadata()
         odem_process.modify_mets_groups()
         odem_process.resolve_language_modelconfig()
+        process_resource_monitor.monit_disk_space(odem_process.load_deferred_images)
         odem_process.set_local_images()
         ocr_workflow = odem.OCRWorkflow.create(proc_type, odem_process)
-        the_runner = odem.OCRWorkflowRunner(local_ident, EXECUTORS, LOGGER, ocr_workflow)
-        if CFG.getboolean(odem.CFG_SEC_MONITOR, 'live', fallback=False):
+        the_runner = odem.OCRWorkflowRunner(local_ident, EXECUTORS, LOGGER, ocr_workflow,
+                                            page_slots=PAGE_SLOTS)
+        # live monitoring runs in child process which
+        # can't share page slots or containers with other records
+        live_monitoring = record_cfg.getboolean(odem.CFG_SEC_MONITOR, 'live', fallback=False) \
+            and PAGE_SLOTS is None
+        if CONTAINER_POOL is not None and not live_monitoring \
+                and isinstance(ocr_workflow, odem.OCRDPageParallel):
+            ocr_workflow.container_pool = CONTAINER_POOL
+        if live_monitoring:
             LOGGER.info("[%s] live-monitoring of ocr workflow resources",
                         local_ident)
             ocr_results = process_resource_monitor.monit_vmem(the_runner.run)
@@ -179,7 +172,7 @@ if __name__ == "__main__":
                 the_info = f"{stats_kwargs}"
         else:
             the_info = f"{stats_kwargs}"
-        handler.save_record_state(record.identifier, MARK_OCR_DONE, INFO=str(the_info))
+        _save_record_state(record.identifier, MARK_OCR_DONE, INFO=str(the_info))
         odem_process.logger.info("[%s] duration: %s/%s (%s)", odem_process.process_identifier,
                                  odem_process.statistics['timedelta'], EXECUTORS,
                                  odem_process.statistics)
@@ -194,16 +187,144 @@ if __name__ == "__main__":
         LOGGER.warning("[%s] odem skips '%s'",
                        odem_process.process_identifier, odem_missmatch.args)
         exc_dict = {exc_label: odem_missmatch.args[0]}
-        handler.save_record_state(record.identifier,
-                                  status=odem.MARK_OCR_SKIP,
-                                  **exc_dict)
+        _save_record_state(record.identifier,
+                           status=odem.MARK_OCR_SKIP,
+                           **exc_dict)
     except ODEMException as _odem_exc:
         _err_args = {'ODEMException': _odem_exc.args[0]}
         LOGGER.error("[%s] odem fails with: '%s'", odem_process.process_identifier, _err_args)
-        handler.save_record_state(record.identifier, MARK_OCR_FAIL, INFO=f'{_err_args}')
-    except RuntimeError as exc:
+        _save_record_state(record.identifier, MARK_OCR_FAIL, INFO=f'{_err_args}')
+    except Exception as exc:  # pylint:disable=broad-exception-caught
+        # pick whole error context, since some exception's args are
+        # rather mysterious, i.e. "13" for PermissionError
+        _err_args = {str(exc): str(exc.args[0]) if exc.args else '',
+                     oc.STATS_KEY_EXCEPTION: type(exc).__name__}
         LOGGER.error("odem fails for '%s' after %s with: '%s'",
-                     record, odem_process.statistics['timedelta'], str(exc))
-        handler.save_record_state(record.identifier, MARK_OCR_FAIL,
-                                  INFO=f'{str(exc) : exc.args[0]}')
+                     record, odem_process.statistics.get('timedelta'), str(exc))
+        _save_record_state(record.identifier, MARK_OCR_FAIL,
+                           INFO=f'{_err_args}')
+        odem_process.clear_mets_resources(keep_resumable=True)
+        return False
+    return True
+
+
+########
+# MAIN #
+########
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(
+        description="generate ocr-data for OAI-Record")
+    PARSER.add_argument(
+        "data",
+        help="path to file with OAI-Record information or SQLite record store (*.sqlite)")
+    PARSER.add_argument(
+        "-c",
+        "--config",
+        required=False,
+        default="resources/odem.ini",
+        help="path to configuration file")
+    PARSER.add_argument(
+        "-e",
+        "--executors",
+        required=False,
+        help="Number of OCR-D Executors in parallel mode")
+    PARSER.add_argument(
+        "-d",
+        "--daemon",
+        required=False,
+        action="store_true",
+        help="keep processing open records until SIGTERM rather than just one")
+    ARGS = PARSER.parse_args()
+
+    # check some pre-conditions
+    # inspect configuration settings
+    CONF_FILE = os.path.abspath(ARGS.config)
+    if not os.path.exists(CONF_FILE):
+        print(f"[ERROR] no config at '{CONF_FILE}'! Halt execution!")
+        sys.exit(1)
+
+    # pick common args
+    # SEQUENTIAL = ARGS.sequential_mode
+    # MUST_KEEP_RESOURCES = ARGS.keep_resources
+    # MUST_LOCK = ARGS.lock_mode
+    EXECUTOR_ARGS = ARGS.executors
+
+    CFG = odem.get_configparser()
+    configurations_read = CFG.read(CONF_FILE)
+    if not configurations_read:
+        print(f"unable to read config from '{CONF_FILE}! exit!")
+        sys.exit(1)
+
+    # set work_dirs and logger
+    LOCAL_WORK_ROOT = CFG.get(oc.CFG_SEC_FLOW, 'local_work_root')
+    LOCAL_LOG_DIR = CFG.get(oc.CFG_SEC_FLOW, 'local_log_dir')
+    if not os.path.exists(LOCAL_LOG_DIR) or not os.access(
+            LOCAL_LOG_DIR, os.W_OK):
+        raise RuntimeError(f"cant store log files at invalid {LOCAL_LOG_DIR}")
+    LOG_FILE_NAME = None
+    if CFG.has_option(oc.CFG_SEC_FLOW, 'logfile_name'):
+        LOG_FILE_NAME = CFG.get(oc.CFG_SEC_FLOW, 'logfile_name')
+    LOGGER = get_worker_logger(LOCAL_LOG_DIR, LOG_FILE_NAME)
+
+    # inspect what kind of input to process
+    # oai record file *OR* local data directory must be set
+    OAI_RECORD_FILE = os.path.abspath(ARGS.data)
+
+    # if valid n_executors via cli, use it's value
+    if EXECUTOR_ARGS and int(EXECUTOR_ARGS) > 0:
+        CFG.set(odem.CFG_SEC_OCR, 'n_executors', str(EXECUTOR_ARGS))
+    EXECUTORS = CFG.getint(odem.CFG_SEC_OCR, 'n_executors', fallback=DEFAULT_EXECUTORS)
+    LOGGER.debug("local work_root: '%s', executors:%s", LOCAL_WORK_ROOT, EXECUTORS)
+
+    # request next open oai record data
+    DATA_FIELDS = CFG.getlist(oc.CFG_SEC_FLOW, 'data_fields')
+    LOGGER.info("data fields: '%s'", DATA_FIELDS)
+    LOGGER.info("use records from '%s'", OAI_RECORD_FILE)
+    HANDLER = odem_rs.open_record_handler(
+        OAI_RECORD_FILE, data_fields=DATA_FIELDS, transform_func=_trnfrm)
+
+    if ARGS.daemon:
+        # keep running until SIGTERM/SIGINT
+        SHUTDOWN = odem_worker.WorkerShutdown(LOGGER)
+        SHUTDOWN.install()
+        PREFETCHER = None
+        if CFG.getboolean(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_PREFETCH, fallback=False):
+            PREFETCHER = odem_worker.RecordPrefetcher(
+                lambda r: odem_worker.stage_record(r, CFG, LOCAL_WORK_ROOT, LOGGER),
+                _release_record, LOGGER)
+        N_CONCURRENT = CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_CONCURRENT_RECORDS,
+                                  fallback=1)
+        if N_CONCURRENT > 1:
+            # total pages in flight bound by executors
+            PAGE_SLOTS = threading.BoundedSemaphore(EXECUTORS)
+        if CFG.getboolean(odem.CFG_SEC_OCR, 'docker_container_pool', fallback=False):
+            # at most executors containers, however many records run
+            CONTAINER_POOL = odem.create_container_pool(
+                CFG, EXECUTORS, LOCAL_WORK_ROOT,
+                f'odem_local_{os.getpid()}', LOGGER)
+        WORKER = odem_worker.RecordWorker(
+            _next_record,
+            _process_record,
+            SHUTDOWN,
+            poll_interval=CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_POLL_INTERVAL,
+                                     fallback=odem_worker.DEFAULT_POLL_INTERVAL),
+            max_records=CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_MAX_RECORDS,
+                                   fallback=0),
+            logger=LOGGER,
+            prefetcher=PREFETCHER,
+            n_concurrent=N_CONCURRENT,
+            fct_fail_record=_fail_record)
+        try:
+            N_PROCESSED = WORKER.run()
+        finally:
+            if CONTAINER_POOL is not None:
+                CONTAINER_POOL.stop()
+        LOGGER.info("worker processed %d records from '%s'", N_PROCESSED, OAI_RECORD_FILE)
+        sys.exit(1 if WORKER.failed else 0)
+
+    record: df_r.Record = HANDLER.next_record(state=MARK_OCR_OPEN)
+    if not record:
+        LOGGER.info("no open records in '%s', work done", OAI_RECORD_FILE)
+        sys.exit(1)
+    if not _process_record(record):
         sys.exit(1)
@@ -1,5 +1,6 @@
 """Record Service
    Providing and manage access to local resource list files
+   and SQLite record stores, the latter take precedence
 """
 
 import configparser
@@ -12,6 +13,7 @@ from pathlib import Path
 import digiflow.record as df_r
 
 import lib.odem.commons as oc
+import lib.odem.record_store as odem_rs
 
 
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -77,8 +79,16 @@ if __name__ == "__main__":
     server_info: df_r.HandlerInformation = df_r.HandlerInformation(
         SRV_RESOURCE_DIR, LOGGER)
     server_info.client_ips = CLIENT_IPS
+    server_info.assignment_policy = THE_CONF.get('record-server', 'assignment_policy',
+                                                 fallback=odem_rs.POLICY_FIFO)
+    if server_info.assignment_policy not in odem_rs.POLICIES:
+        LOGGER.error("invalid assignment_policy '%s', expect one of %s",
+                     server_info.assignment_policy, odem_rs.POLICIES)
+        sys.exit(1)
+    server_info.server_threads = THE_CONF.getint('record-server', 'server_threads',
+                                                 fallback=1)
     try:
-        df_r.run_server(SRV_HOST, SRV_PORT, start_data=server_info)
+        odem_rs.run_server(SRV_HOST, SRV_PORT, start_data=server_info)
     except Exception as exc:
         LOGGER.error("Record server encoutered %s", exc.args)
         sys.exit(1)
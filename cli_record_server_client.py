@@ -4,11 +4,14 @@
 
 import argparse
 import configparser
+import functools
 import logging
 import os
 import shutil
 import sys
+import threading
 import time
+import typing
 
 import digiflow as df
 import digiflow.record as df_r
@@ -17,6 +20,9 @@ from lib import odem
 import lib.odem.commons as oc
 import lib.odem.monitoring.datatypes as odem_md
 import lib.odem.monitoring.resource as odem_rm
+import lib.odem.ocr.ocr_d as odem_ocrd
+import lib.odem.record_store as odem_rs
+import lib.odem.worker as odem_worker
 
 # internal lock file
 # when running lock mode
@@ -28,6 +34,12 @@ STATETIME_FORMAT = '%Y-%m-%d_%H:%M:%S'
 
 LOGGER: logging.Logger = None
 CFG: configparser.ConfigParser = None
+CLIENT: odem_rs.LeaseClient = None
+LEASES: odem_worker.RecordLeases = None
+# records processed concurrently share page slots
+PAGE_SLOTS: threading.Semaphore = None
+# warm OCR-D containers shared by all records
+CONTAINER_POOL: odem_ocrd.ContainerPool = None
 
 
 def _notify(subject, message):
@@ -60,127 +72,36 @@ def _oai_arg_parser(value):
     return value
 
 
-########
-# MAIN #
-########
-if __name__ == "__main__":
-    PARSER = argparse.ArgumentParser(
-        description="generate ocr-data for records")
-    PARSER.add_argument(
-        "data_file",
-        type=_oai_arg_parser,
-        help="name of record data file managed by server")
-    PARSER.add_argument(
-        "-c",
-        "--config",
-        help="absolute path to configuration file")
-    PARSER.add_argument(
-        "-e",
-        "--executors",
-        required=False,
-        help="number of parallel executors, overwrites configuration")
-    PARSER.add_argument(
-        "-n",
-        "--name",
-        required=False,
-        help="optional name of final export artefact if current workflow creates one")
-
-    # evaluate commandline arguments
-    ARGS = PARSER.parse_args()
-    OAI_RECORD_FILE_NAME = ARGS.data_file
-
-    # check some pre-conditions
-    # inspect configuration settings
-    CONF_FILE = os.path.abspath(ARGS.config)
-    if not os.path.exists(CONF_FILE):
-        print(f"[ERROR] no config at '{CONF_FILE}'! Halt execution!")
-        sys.exit(1)
-    CFG = odem.get_configparser()
-    configurations_read = CFG.read(CONF_FILE)
-    if not configurations_read:
-        print(f"[ERROR] unable to read config from '{CONF_FILE}! exit!")
-        sys.exit(1)
-
-    # set work_dirs and logger
-    LOCAL_WORK_ROOT = CFG.get(oc.CFG_SEC_FLOW, 'local_work_root')
-    LOG_FILE_NAME = None
-    if CFG.has_option(oc.CFG_SEC_FLOW, 'logfile_name'):
-        LOG_FILE_NAME = CFG.get(oc.CFG_SEC_FLOW, 'logfile_name')
-    LOCAL_LOG_DIR = CFG.get(oc.CFG_SEC_FLOW, 'local_log_dir')
-    if not os.path.exists(LOCAL_LOG_DIR) or not os.access(
-            LOCAL_LOG_DIR, os.W_OK):
-        raise RuntimeError(f"cant store log files at invalid {LOCAL_LOG_DIR}")
-    LOGGER = odem.get_worker_logger(LOCAL_LOG_DIR, LOG_FILE_NAME)
-
-    # respect possible lock
-    if os.path.isfile(LOCK_FILE_PATH):
-        LOGGER.info("workflow already running and locked, skip processing")
-        sys.exit(0)
-    else:
-        LOGGER.info("set workflow lock %s right now", LOCK_FILE_PATH)
-        with open(LOCK_FILE_PATH, mode="+w", encoding="UTF-8") as a_lock_file:
-            the_msg = (f"start odem workflow with record file '{OAI_RECORD_FILE_NAME}' "
-                       f"and configuration '{CONF_FILE}' at {time.strftime(STATETIME_FORMAT)}")
-            a_lock_file.write(the_msg)
-
-    # if valid n_executors via cli, use it's value
-    EXECUTOR_ARGS = ARGS.executors
-    if EXECUTOR_ARGS and int(EXECUTOR_ARGS) > 0:
-        CFG.set(odem.CFG_SEC_OCR, oc.CFG_SEC_OCR_OPT_EXECS, str(EXECUTOR_ARGS))
-    EXECUTORS = CFG.getint(odem.CFG_SEC_OCR, oc.CFG_SEC_OCR_OPT_EXECS)
-    LOGGER.debug("local work_root: '%s', executors:%s", LOCAL_WORK_ROOT, EXECUTORS)
-
-    # evaluate optional export name
-    if hasattr(ARGS, "name") and ARGS.name is not None:
-        EXPORT_NAME = ARGS.name
-        CFG.set(oc.CFG_SEC_EXP, oc.CFG_SEC_EXP_OPT_NAME, EXPORT_NAME)
-
-    # pylint: disable=no-member
-    DATA_FIELDS = CFG.getlist(oc.CFG_SEC_FLOW, 'data_fields')
-    HOST = CFG.get('record-server', 'record_server_url')
-    PORT = CFG.getint('record-server', 'record_server_port')
-    ODEM_OPEN = CFG.get('record-server', 'record_state_open', fallback=odem.MARK_OCR_OPEN)
-    ODEM_BUSY = CFG.get('record-server', 'record_state_busy', fallback=odem.MARK_OCR_BUSY)
-    ODEM_SKIP = CFG.get('record-server', 'record_state_skip', fallback=odem.MARK_OCR_SKIP)
-    ODEM_FAIL = CFG.get('record-server', 'record_state_fails', fallback=odem.MARK_OCR_FAIL)
-    ODEM_DONE = CFG.get('record-server', 'record_state_done', fallback=odem.MARK_OCR_DONE)
-    LOGGER.info("client requests %s:%s/%s for records (state: %s, fmt:%s)",
-                HOST, PORT, OAI_RECORD_FILE_NAME, ODEM_OPEN, DATA_FIELDS)
-    CLIENT = df_r.Client(OAI_RECORD_FILE_NAME, HOST, PORT, logger=LOGGER)
-
-    # try to get next data record
-    try:
-        record = CLIENT.get_record(get_record_state=ODEM_OPEN,
-                                   set_record_state=ODEM_BUSY)
-        if not record:
-            # if no open data records, lock worker and exit
-            LOGGER.info("no open records in '%s', work done", OAI_RECORD_FILE_NAME)
-            sys.exit(1)
-    except (odem.OAIRecordExhaustedException, df_r.RecordsServiceException) as req_exc:
-        exc_dict = req_exc.args[0]
-        LOGGER.warning("no data for '%s' from '%s':'%s': %s",
-                       OAI_RECORD_FILE_NAME, HOST, PORT, exc_dict)
-        _notify('[OCR-D-ODEM] Date done', exc_dict)
-        # human interaction required
-        sys.exit(1)
+def _process_record(record: df_r.Record) -> bool:
+    """Run complete workflow for single record and
+    communicate outcome, return False if further
+    processing requires human interaction"""
 
     rec_ident = record.identifier
     local_ident = record.local_identifier
     req_dst_dir = os.path.join(LOCAL_WORK_ROOT, local_ident)
-    odem_process: odem.ODEMProcessImpl = odem.ODEMProcessImpl(record, CFG,
+    # each record gets own copy since processing may alter it
+    record_cfg = oc.copy_configparser(CFG)
+    odem_process: odem.ODEMProcessImpl = odem.ODEMProcessImpl(record, record_cfg,
                                                               work_dir=req_dst_dir,
                                                               logger=LOGGER)
     try:
-        if os.path.exists(req_dst_dir):
+        # keep pages completed by previous, broken run
+        resume = record_cfg.getboolean(odem.CFG_SEC_FLOW, odem.CFG_SEC_FLOW_OPT_RESUME,
+                                       fallback=False)
+        if os.path.exists(req_dst_dir) and not resume:
             shutil.rmtree(req_dst_dir)
+        # data prefetched by daemon meanwhile
+        odem_process.preloaded = odem_worker.claim_staged(LOCAL_WORK_ROOT, local_ident,
+                                                          req_dst_dir)
 
-        local_store_root = CFG.get(oc.CFG_SEC_FLOW, 'local_store_root', fallback=None)
+        local_store_root = record_cfg.get(oc.CFG_SEC_FLOW, 'local_store_root', fallback=None)
         if local_store_root is not None:
             store_root_dir = os.path.join(local_store_root, local_ident)
             odem_process.store = df.LocalStore(store_root_dir, req_dst_dir)
 
         pr_monitor: odem_rm.ProcessResourceMonitor = odem_rm.ProcessResourceMonitor(
-            odem_rm.from_configuration(CFG),
+            odem_rm.from_configuration(record_cfg),
             LOGGER.error,
             CLIENT.update,
             _notify,
@@ -189,16 +110,26 @@ if __name__ == "__main__":
         )
 
         pr_monitor.check_vmem()
+        odem_process.fct_check_disk = pr_monitor.check_disk_space
         pr_monitor.monit_disk_space(odem_process.load)
         odem_process.inspect_metadata()
         odem_process.validate_metadata()
         odem_process.modify_mets_groups()
         odem_process.resolve_language_modelconfig()
+        pr_monitor.monit_disk_space(odem_process.load_deferred_images)
         odem_process.set_local_images()
-        proc_type = CFG.get(odem.CFG_SEC_OCR, 'workflow_type', fallback=None)
+        proc_type = record_cfg.get(odem.CFG_SEC_OCR, 'workflow_type', fallback=None)
         ocr_workflow = odem.OCRWorkflow.create(proc_type, odem_process)
-        the_runner = odem.OCRWorkflowRunner(local_ident, EXECUTORS, LOGGER, ocr_workflow)
-        if CFG.getboolean(odem.CFG_SEC_MONITOR, 'live', fallback=False):
+        the_runner = odem.OCRWorkflowRunner(local_ident, EXECUTORS, LOGGER, ocr_workflow,
+                                            page_slots=PAGE_SLOTS)
+        # live monitoring runs in child process which
+        # can't share page slots or containers with other records
+        live_monitoring = record_cfg.getboolean(odem.CFG_SEC_MONITOR, 'live', fallback=False) \
+            and PAGE_SLOTS is None
+        if CONTAINER_POOL is not None and not live_monitoring \
+                and isinstance(ocr_workflow, odem.OCRDPageParallel):
+            ocr_workflow.container_pool = CONTAINER_POOL
+        if live_monitoring:
             LOGGER.info("[%s] live-monitoring of ocr workflow resources",
                         local_ident)
             ocr_results = pr_monitor.monit_vmem(the_runner.run)
@@ -246,12 +177,15 @@ if __name__ == "__main__":
         # * misses model config for language
         # * contains no images
         # * contains no OCR results but should have at least one page
-        exc_dict = {'ODEMException': str(data_exc.args[0])}
+        exc_dict = {'ODEMException': str(data_exc.args[0]),
+                    oc.STATS_KEY_EXCEPTION: type(data_exc).__name__}
         LOGGER.error("[%s] odem fails with ODEMException:"
                      "'%s'", odem_process.process_identifier, exc_dict)
         CLIENT.update(status=ODEM_FAIL, oai_urn=rec_ident, **exc_dict)
         _notify(f'[OCR-D-ODEM] Failure for {rec_ident}', f'{exc_dict}')
-        odem_process.clear_mets_resources()
+        # pages done before download failed are kept by manifest
+        odem_process.clear_mets_resources(
+            keep_resumable=isinstance(data_exc, odem.ODEMDownloadException))
     except odem_md.NotEnoughDiskSpaceException as _space_exc:
         exc_dict = {'NotEnoughDiskSpaceException': _space_exc.args[0]}
         LOGGER.error("[%s] odem fails with NotEnoughDiskSpaceException:"
@@ -269,20 +203,246 @@ if __name__ == "__main__":
         _notify(f'[OCR-D-ODEM] Failure for {rec_ident}', f'{exc_dict}')
         LOGGER.warning("[%s] remove working sub_dirs beneath '%s'",
                        odem_process.process_identifier, LOCAL_WORK_ROOT)
-        odem_process.clear_mets_resources()
+        odem_process.clear_mets_resources(keep_resumable=True)
 
     except Exception as exc:
         # pick whole error context, since some exception's args are
         # rather mysterious, i.e. "13" for PermissionError
-        exc_dict = {str(exc): str(exc.args[0])}
         _name = type(exc).__name__
+        exc_dict = {str(exc): str(exc.args[0]), oc.STATS_KEY_EXCEPTION: _name}
         LOGGER.error("[%s] odem fails with %s:"
                      "'%s'", odem_process.process_identifier, _name, exc_dict)
         # when running parallel
         CLIENT.update(status=ODEM_FAIL, oai_urn=rec_ident, info=exc_dict)
         _notify(f'[OCR-D-ODEM] Failure for {rec_ident}', f'{exc_dict}')
-        odem_process.clear_mets_resources()
+        odem_process.clear_mets_resources(keep_resumable=True)
         # don't remove lock file, human interaction required
+        return False
+    return True
+
+
+def _release_record(record: df_r.Record):
+    """Hand back prefetched record not processed"""
+
+    odem_worker.discard_staged(LOCAL_WORK_ROOT, record.local_identifier)
+    CLIENT.update(status=ODEM_OPEN, oai_urn=record.identifier)
+    if LEASES is not None:
+        LEASES.done(record)
+
+
+def _fail_record(record: df_r.Record, exc: Exception):
+    """Mark record failed by error escaping processing"""
+
+    exc_dict = {str(exc): str(exc.args[0]) if exc.args else '',
+                oc.STATS_KEY_EXCEPTION: type(exc).__name__}
+    CLIENT.update(status=ODEM_FAIL, oai_urn=record.identifier, info=exc_dict)
+
+
+def _process_leased(record: df_r.Record) -> bool:
+    """Process record, which isn't leased
+    anymore when it's final state is set"""
+
+    try:
+        return _process_record(record)
+    finally:
+        LEASES.done(record)
+
+
+def _lease_records(n_records) -> typing.List[df_r.Record]:
+    """Lease batch of open records and mark them busy"""
+
+    try:
+        return CLIENT.lease_records(get_record_state=ODEM_OPEN,
+                                    set_record_state=ODEM_BUSY, n_records=n_records)
+    except (df_r.RecordsExhaustedException, df_r.RecordsServiceException) as req_exc:
+        LOGGER.warning("no data for '%s' from '%s':'%s': %s",
+                       OAI_RECORD_FILE_NAME, HOST, PORT, req_exc.args[0])
+        return []
+
+
+def _next_record(notify_exhausted=True) -> typing.Optional[df_r.Record]:
+    """Request next open record and mark it busy"""
+
+    try:
+        return CLIENT.get_record(get_record_state=ODEM_OPEN,
+                                 set_record_state=ODEM_BUSY)
+    except (odem.OAIRecordExhaustedException, df_r.RecordsServiceException) as req_exc:
+        exc_dict = req_exc.args[0]
+        LOGGER.warning("no data for '%s' from '%s':'%s': %s",
+                       OAI_RECORD_FILE_NAME, HOST, PORT, exc_dict)
+        if notify_exhausted:
+            _notify('[OCR-D-ODEM] Date done', exc_dict)
+        return None
+
+
+########
+# MAIN #
+########
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(
+        description="generate ocr-data for records")
+    PARSER.add_argument(
+        "data_file",
+        type=_oai_arg_parser,
+        help="name of record data file managed by server")
+    PARSER.add_argument(
+        "-c",
+        "--config",
+        help="absolute path to configuration file")
+    PARSER.add_argument(
+        "-e",
+        "--executors",
+        required=False,
+        help="number of parallel executors, overwrites configuration")
+    PARSER.add_argument(
+        "-n",
+        "--name",
+        required=False,
+        help="optional name of final export artefact if current workflow creates one")
+    PARSER.add_argument(
+        "-d",
+        "--daemon",
+        required=False,
+        action="store_true",
+        help="keep processing records until SIGTERM rather than just one")
+
+    # evaluate commandline arguments
+    ARGS = PARSER.parse_args()
+    OAI_RECORD_FILE_NAME = ARGS.data_file
+
+    # check some pre-conditions
+    # inspect configuration settings
+    CONF_FILE = os.path.abspath(ARGS.config)
+    if not os.path.exists(CONF_FILE):
+        print(f"[ERROR] no config at '{CONF_FILE}'! Halt execution!")
+        sys.exit(1)
+    CFG = odem.get_configparser()
+    configurations_read = CFG.read(CONF_FILE)
+    if not configurations_read:
+        print(f"[ERROR] unable to read config from '{CONF_FILE}! exit!")
+        sys.exit(1)
+
+    # set work_dirs and logger
+    LOCAL_WORK_ROOT = CFG.get(oc.CFG_SEC_FLOW, 'local_work_root')
+    LOG_FILE_NAME = None
+    if CFG.has_option(oc.CFG_SEC_FLOW, 'logfile_name'):
+        LOG_FILE_NAME = CFG.get(oc.CFG_SEC_FLOW, 'logfile_name')
+    LOCAL_LOG_DIR = CFG.get(oc.CFG_SEC_FLOW, 'local_log_dir')
+    if not os.path.exists(LOCAL_LOG_DIR) or not os.access(
+            LOCAL_LOG_DIR, os.W_OK):
+        raise RuntimeError(f"cant store log files at invalid {LOCAL_LOG_DIR}")
+    LOGGER = odem.get_worker_logger(LOCAL_LOG_DIR, LOG_FILE_NAME)
+
+    # respect possible lock
+    if os.path.isfile(LOCK_FILE_PATH):
+        LOGGER.info("workflow already running and locked, skip processing")
+        sys.exit(0)
+    else:
+        LOGGER.info("set workflow lock %s right now", LOCK_FILE_PATH)
+        with open(LOCK_FILE_PATH, mode="+w", encoding="UTF-8") as a_lock_file:
+            the_msg = (f"start odem workflow with record file '{OAI_RECORD_FILE_NAME}' "
+                       f"and configuration '{CONF_FILE}' at {time.strftime(STATETIME_FORMAT)}")
+            a_lock_file.write(the_msg)
+
+    # if valid n_executors via cli, use it's value
+    EXECUTOR_ARGS = ARGS.executors
+    if EXECUTOR_ARGS and int(EXECUTOR_ARGS) > 0:
+        CFG.set(odem.CFG_SEC_OCR, oc.CFG_SEC_OCR_OPT_EXECS, str(EXECUTOR_ARGS))
+    EXECUTORS = CFG.getint(odem.CFG_SEC_OCR, oc.CFG_SEC_OCR_OPT_EXECS)
+    LOGGER.debug("local work_root: '%s', executors:%s", LOCAL_WORK_ROOT, EXECUTORS)
+
+    # evaluate optional export name
+    if hasattr(ARGS, "name") and ARGS.name is not None:
+        EXPORT_NAME = ARGS.name
+        CFG.set(oc.CFG_SEC_EXP, oc.CFG_SEC_EXP_OPT_NAME, EXPORT_NAME)
+
+    # pylint: disable=no-member
+    DATA_FIELDS = CFG.getlist(oc.CFG_SEC_FLOW, 'data_fields')
+    HOST = CFG.get('record-server', 'record_server_url')
+    PORT = CFG.getint('record-server', 'record_server_port')
+    ODEM_OPEN = CFG.get('record-server', 'record_state_open', fallback=odem.MARK_OCR_OPEN)
+    ODEM_BUSY = CFG.get('record-server', 'record_state_busy', fallback=odem.MARK_OCR_BUSY)
+    ODEM_SKIP = CFG.get('record-server', 'record_state_skip', fallback=odem.MARK_OCR_SKIP)
+    ODEM_FAIL = CFG.get('record-server', 'record_state_fails', fallback=odem.MARK_OCR_FAIL)
+    ODEM_DONE = CFG.get('record-server', 'record_state_done', fallback=odem.MARK_OCR_DONE)
+    LOGGER.info("client requests %s:%s/%s for records (state: %s, fmt:%s)",
+                HOST, PORT, OAI_RECORD_FILE_NAME, ODEM_OPEN, DATA_FIELDS)
+    LEASE_SECONDS = CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_LEASE_SECONDS,
+                               fallback=odem_rs.DEFAULT_LEASE_SECONDS)
+    FCT_CAPACITY = None
+    if CFG.getboolean('record-server', 'report_capacity', fallback=True):
+        # server picks records fitting into this machine
+        FCT_CAPACITY = functools.partial(odem_rm.ResourceMonitor.get_capacity,
+                                         LOCAL_WORK_ROOT)
+    CLIENT = odem_rs.LeaseClient(OAI_RECORD_FILE_NAME, HOST, PORT, logger=LOGGER,
+                                 lease_seconds=LEASE_SECONDS, fct_capacity=FCT_CAPACITY)
+
+    if ARGS.daemon:
+        # keep running until SIGTERM/SIGINT, lock held all the time
+        SHUTDOWN = odem_worker.WorkerShutdown(LOGGER)
+        SHUTDOWN.install()
+        PREFETCHER = None
+        if CFG.getboolean(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_PREFETCH, fallback=False):
+            PREFETCHER = odem_worker.RecordPrefetcher(
+                lambda r: odem_worker.stage_record(r, CFG, LOCAL_WORK_ROOT, LOGGER),
+                _release_record, LOGGER)
+        N_CONCURRENT = CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_CONCURRENT_RECORDS,
+                                  fallback=1)
+        if N_CONCURRENT > 1:
+            # total pages in flight bound by executors
+            PAGE_SLOTS = threading.BoundedSemaphore(EXECUTORS)
+        if CFG.getboolean(odem.CFG_SEC_OCR, 'docker_container_pool', fallback=False):
+            # at most executors containers, however many records run
+            CONTAINER_POOL = odem.create_container_pool(
+                CFG, EXECUTORS, LOCAL_WORK_ROOT,
+                f'odem_{OAI_RECORD_FILE_NAME}_{os.getpid()}', LOGGER)
+        FCT_NEXT_RECORD = functools.partial(_next_record, notify_exhausted=False)
+        FCT_PROCESS_RECORD = _process_record
+        LEASE_RECORDS = CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_LEASE_RECORDS,
+                                   fallback=0)
+        if LEASE_RECORDS > 0:
+            # record server must provide record store
+            LEASES = odem_worker.RecordLeases(_lease_records, CLIENT.heartbeat,
+                                              _release_record, LEASE_RECORDS,
+                                              heartbeat_interval=LEASE_SECONDS / 3,
+                                              logger=LOGGER)
+            LEASES.start()
+            FCT_NEXT_RECORD = LEASES.next_record
+            FCT_PROCESS_RECORD = _process_leased
+        WORKER = odem_worker.RecordWorker(
+            FCT_NEXT_RECORD,
+            FCT_PROCESS_RECORD,
+            SHUTDOWN,
+            poll_interval=CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_POLL_INTERVAL,
+                                     fallback=odem_worker.DEFAULT_POLL_INTERVAL),
+            max_records=CFG.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_MAX_RECORDS,
+                                   fallback=0),
+            logger=LOGGER,
+            prefetcher=PREFETCHER,
+            n_concurrent=N_CONCURRENT,
+            fct_fail_record=_fail_record)
+        try:
+            N_PROCESSED = WORKER.run()
+        finally:
+            if LEASES is not None:
+                LEASES.release()
+            if CONTAINER_POOL is not None:
+                CONTAINER_POOL.stop()
+        LOGGER.info("worker processed %d records", N_PROCESSED)
+        if WORKER.failed:
+            sys.exit(1)
+        if os.path.isfile(LOCK_FILE_PATH):
+            os.remove(LOCK_FILE_PATH)
+            LOGGER.info("finally removed %s, worker shut down", LOCK_FILE_PATH)
+        sys.exit(0)
+
+    # try to get next data record
+    record = _next_record()
+    if not record:
+        # if no open data records, lock worker and exit
+        LOGGER.info("no open records in '%s', work done", OAI_RECORD_FILE_NAME)
+        sys.exit(1)
+    if not _process_record(record):
         sys.exit(1)
 
     # if exception thrown previously which doesn't
@@ -292,4 +452,4 @@ if __name__ == "__main__":
     if os.path.isfile(LOCK_FILE_PATH):
         os.remove(LOCK_FILE_PATH)
         LOGGER.info("[%s] finally removed %s, ready for next onslaught",
-                    odem_process.process_identifier, LOCK_FILE_PATH)
+                    record.local_identifier, LOCK_FILE_PATH)
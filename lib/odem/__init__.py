@@ -7,6 +7,7 @@ from .ocr.ocr_workflow import (
     OCRWorkflow,
     OCRDPageParallel,
     ODEMTesseract,
+    create_container_pool,
 )
 from .ocr.ocr_d import get_recognition_level
 from .processing.mets import (
@@ -21,5 +22,6 @@ from .processing.mets import (
 from .processing.ocr_files import (
     PUNCTUATIONS,
     ODEMMetadataOcrException,
+    convert_and_postprocess,
     postprocess_ocr_file,
 )
@@ -1,7 +1,9 @@
 """ODEM Core"""
 
 import configparser
+import contextlib
 import dataclasses
+import functools
 import logging
 import logging.config
 import os
@@ -13,6 +15,7 @@ from enum import Enum
 from pathlib import Path
 
 import ocrd_utils
+import psutil
 import digiflow.record as df_r
 
 #
@@ -54,6 +57,17 @@ CFG_SEC_FLOW_LOGCONF = "odem_logging.ini"
 CFG_SEC_FLOW_LOG_DIR = "local_log_dir"
 CFG_SEC_FLOW_LOGFILE = "local_service_logfile"
 CFG_SEC_FLOW_LOGNAME = "local_service_logname"
+CFG_SEC_FLOW_OPT_RESUME = "resume"
+CFG_SEC_FLOW_OPT_STREAMING = "streaming_load"
+CFG_SEC_FLOW_OPT_DOWNLOAD_WORKERS = "download_workers"
+CFG_SEC_FLOW_OPT_DOWNLOAD_WORKERS_HOST = "download_workers_per_host"
+CFG_SEC_FLOW_OPT_TWO_PHASE = "two_phase_load"
+CFG_SEC_FLOW_OPT_POLL_INTERVAL = "worker_poll_interval"
+CFG_SEC_FLOW_OPT_MAX_RECORDS = "worker_max_records"
+CFG_SEC_FLOW_OPT_PREFETCH = "worker_prefetch"
+CFG_SEC_FLOW_OPT_CONCURRENT_RECORDS = "worker_concurrent_records"
+CFG_SEC_FLOW_OPT_LEASE_RECORDS = "worker_lease_records"
+CFG_SEC_FLOW_OPT_LEASE_SECONDS = "worker_lease_seconds"
 CFG_SEC_MONITOR = 'monitoring'
 CFG_SEC_OCR = 'ocr'
 CFG_SEC_OCR_OPT_EXECS = 'n_executors'
@@ -126,10 +140,26 @@ STATS_KEY_N_PAGES = 'n_images_pages'
 STATS_KEY_N_OCRABLE = 'n_images_ocrable'
 STATS_KEY_N_LINES = 'n_text_lines'
 STATS_KEY_N_EXECS = 'n_execs'
+STATS_KEY_N_EXECS_PEAK = 'n_execs_peak'
+STATS_KEY_N_EXECS_MEAN = 'n_execs_mean'
+STATS_KEY_RETRIES = 'ocr_retries'
+STATS_KEY_N_RESUMED = 'n_resumed'
+STATS_KEY_CACHE = 'ocr_cache'
+STATS_KEY_DOWNLOAD_FAILS = 'download_failures'
+STATS_KEY_DOWNLOAD = 'download'
+STATS_KEY_SLOT_WAIT = 'page_slot_wait'
 STATS_KEY_N_OCR = 'n_ocr'
 STATS_KEY_OCR_LOSS = 'ocr_loss'
 STATS_KEY_MB = 'mb'
 STATS_KEY_MPS = 'mps'
+STATS_KEY_HOST = 'host'
+STATS_KEY_TIMEDELTA = 'timedelta'
+STATS_KEY_EXCEPTION = 'exception'
+STATS_KEY_STAGES = 'stages'
+STATS_KEY_OCR_STEPS = 'ocr_steps'
+# stages timed besides process methods
+STAGE_OCR = 'ocr'
+STAGE_PAGE_TO_ALTO = 'page_to_alto'
 LOGGER_WORKER_QNAME = "odem.worker"
 
 # default language for fallback
@@ -164,6 +194,11 @@ class ODEMDerivateException(ODEMException):
     archivable PDF/A derivates"""
 
 
+class ODEMDownloadException(ODEMException):
+    """Mark images failed to download while streaming,
+    pages done so far are kept to be resumed"""
+
+
 class OAIRecordExhaustedException(Exception):
     """Mark given resource contains no open records"""
 
@@ -196,6 +231,8 @@ class OCRResult:
         self.local_path = local_path
         self.images_fsize = images_fsize
         self.images_mps = images_mps
+        # seconds each run of pipeline step took
+        self.step_timings: typing.Dict[str, typing.List[float]] = {}
 
     def move(self, new_path: Path) -> Path:
         """Move created OCR resource from
@@ -257,6 +294,24 @@ class ODEMProcess:
         logging.config.fileConfig(conf_file_location, defaults=conf_logname)
         self.logger = logging.getLogger('odem')
 
+    @contextlib.contextmanager
+    def timed(self, stage):
+        """Account wall-clock and CPU seconds and bytes read
+        and written during stage to statistics, summed up
+        if stage runs several times. CPU and I/O are counted
+        for whole worker process including finished child
+        processes, but not work done by containers."""
+
+        start = _usage()
+        try:
+            yield
+        finally:
+            spent = [round(b - a, 2) for a, b in zip(start, _usage())]
+            stages = self.process_statistics.setdefault(STATS_KEY_STAGES, {})
+            totals = stages.setdefault(stage, dict.fromkeys(_USAGE_KEYS, 0))
+            for a_key, a_value in zip(_USAGE_KEYS, spent):
+                totals[a_key] = round(totals[a_key] + a_value, 2)
+
     def load(self):
         """Load Data via OAI-PMH-API very LAZY
         i.e. if not metadata file exists already in
@@ -277,6 +332,38 @@ class ODEMProcess:
         """re-do metadata and transform into output format"""
 
 
+_USAGE_KEYS = ('wall', 'cpu', 'read', 'written')
+
+
+def _usage() -> typing.Tuple[float, float, int, int]:
+    """Wall-clock and CPU seconds and bytes read
+    and written by this process so far"""
+
+    this_process = psutil.Process()
+    cpu = this_process.cpu_times()
+    cpu_seconds = cpu.user + cpu.system + cpu.children_user + cpu.children_system
+    try:
+        io = this_process.io_counters()
+        # chars include data served by page cache
+        n_read = getattr(io, 'read_chars', io.read_bytes)
+        n_written = getattr(io, 'write_chars', io.write_bytes)
+    except (AttributeError, psutil.Error):
+        n_read = n_written = 0
+    return time.time(), cpu_seconds, n_read, n_written
+
+
+def timed_stage(stage):
+    """Decorate ODEMProcess method to be timed as stage"""
+
+    def _decorate(fct):
+        @functools.wraps(fct)
+        def _timed(self: ODEMProcess, *args, **kwargs):
+            with self.timed(stage):
+                return fct(self, *args, **kwargs)
+        return _timed
+    return _decorate
+
+
 def get_configparser():
     """init plain configparser"""
 
@@ -299,6 +386,17 @@ def get_configparser():
         })
 
 
+def copy_configparser(configuration: configparser.ConfigParser) -> configparser.ConfigParser:
+    """Independent copy of configuration with raw values,
+    since processing a record may alter some options,
+    i.e. export name, which must not leak into next one"""
+
+    the_copy = get_configparser()
+    the_copy.read_dict({a_section: dict(configuration.items(a_section, raw=True))
+                        for a_section in configuration.sections()})
+    return the_copy
+
+
 def get_worker_logger(log_dir, log_infix=None, path_log_config=None) -> logging.Logger:
     """Create logger with log_infix to divide several
     instances running on same host and
@@ -68,6 +68,18 @@ class RmResourceData(typing.NamedTuple):
     disk_usage: RmDiskUsage
 
 
+class RmLoad(typing.NamedTuple):
+    load_per_cpu: float
+    cpu_pressure: typing.Optional[float]
+    memory_available: int
+
+
+class RmCapacity(typing.NamedTuple):
+    cores: int
+    memory_available: int
+    disk_free: int
+
+
 RmResourceDataCallback = typing.Callable[[RmResourceData], None]
 
 
@@ -92,6 +104,15 @@ class ProcessResourceMonitorConfig(typing.NamedTuple):
     max_vmem_bytes: typing.Optional[int] = None
 
 
+class ExecutorScalerConfig(typing.NamedTuple):
+    floor: int
+    ceiling: int
+    memory_per_executor: typing.Optional[int] = None
+    max_load_per_cpu: float = 1.0
+    max_cpu_pressure: float = 25.0
+    interval: float = 1
+
+
 class TheProcess(multiprocessing.Process):
     def __init__(self, run: typing.Callable, queue: multiprocessing.Queue):
         multiprocessing.Process.__init__(self)
@@ -0,0 +1,143 @@
+"""Aggregate statistics reported by workers into
+metrics exposed in Prometheus text format"""
+
+import collections
+import re
+import threading
+import typing
+
+import lib.odem.commons as oc
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# label for records without any host information
+UNKNOWN_HOST = 'unknown'
+# label for failures without any exception information
+UNKNOWN_EXCEPTION = 'unknown'
+
+_TIMEDELTA = re.compile(r'(?:(\d+) days?, )?(\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+
+
+def timedelta_seconds(the_timedelta) -> typing.Optional[float]:
+    """Seconds of duration formatted like datetime.timedelta,
+    i.e. '1:02:03' or '2 days, 1:02:03', None if malformed"""
+
+    matched = _TIMEDELTA.fullmatch(str(the_timedelta).strip())
+    if matched is None:
+        return None
+    days, hours, minutes, seconds = matched.groups()
+    return ((int(days or 0) * 24 + int(hours)) * 60 + int(minutes)) * 60 + float(seconds)
+
+
+def exception_class(info) -> typing.Optional[str]:
+    """Name of exception record failed with, if any.
+    Workers report it either explicitly or as key of
+    exception's message, maybe nested as info of info"""
+
+    if not isinstance(info, dict):
+        return None
+    if info.get(oc.STATS_KEY_EXCEPTION):
+        return str(info[oc.STATS_KEY_EXCEPTION])
+    for a_key in info:
+        if str(a_key).endswith('Exception'):
+            return str(a_key)
+    return exception_class(info.get('info'))
+
+
+def _escape(label_value) -> str:
+    return str(label_value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _sample(name, labels: typing.Dict[str, typing.Any], value) -> str:
+    if labels:
+        the_labels = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        name = f'{name}{{{the_labels}}}'
+    return f'{name} {round(float(value), 6):g}'
+
+
+class RecordMetrics:
+    """Running aggregates of records finished by workers.
+
+    Records saved with fail state count as failures by
+    their exception class, records saved with skip state
+    (or one of it's variants like 'ocr_skip_type') as
+    skipped by their reason. Records reported with OCR
+    statistics count as done by host. Pages per hour and
+    MB per minute relate to records' processing time as
+    measured by workers, so slow hosts stand out even
+    if they process several records at once.
+    """
+
+    def __init__(self, fail_state=oc.MARK_OCR_FAIL, skip_state=oc.MARK_OCR_SKIP):
+        self.fail_state = fail_state
+        self.skip_state = skip_state
+        self.pages = collections.Counter()
+        self.megabytes = collections.Counter()
+        self.seconds = collections.Counter()
+        self.done = collections.Counter()
+        self.failures = collections.Counter()
+        self.skips = collections.Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, info, state, client_name=UNKNOWN_HOST):
+        """Account for record's final state and statistics"""
+
+        with self._lock:
+            if state == self.fail_state:
+                self.failures[exception_class(info) or UNKNOWN_EXCEPTION] += 1
+                return
+            if str(state).startswith(self.skip_state):
+                self.skips[exception_class(info) or state] += 1
+                return
+            if not isinstance(info, dict) or oc.STATS_KEY_N_OCR not in info:
+                return
+            host = info.get(oc.STATS_KEY_HOST, client_name)
+            self.done[host] += 1
+            self.pages[host] += int(info[oc.STATS_KEY_N_OCR])
+            self.megabytes[host] += float(info.get(oc.STATS_KEY_MB, 0))
+            self.seconds[host] += timedelta_seconds(info.get(oc.STATS_KEY_TIMEDELTA)) or 0
+
+    def render(self, queue_depths: typing.Dict[str, typing.Dict[str, int]] = None) -> str:
+        """Metrics in Prometheus text format, including
+        number of records by state for each list"""
+
+        lines = []
+
+        def _metric(name, kind, the_help, samples):
+            lines.append(f'# HELP {name} {the_help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(_sample(name, labels, value) for labels, value in samples)
+
+        with self._lock:
+            hosts = sorted(self.done)
+            n_finished = (sum(self.done.values()) + sum(self.failures.values())
+                          + sum(self.skips.values()))
+            _metric('odem_records_done_total', 'counter', 'Records done by host',
+                    [({'host': h}, self.done[h]) for h in hosts])
+            _metric('odem_pages_total', 'counter', 'Pages with OCR by host',
+                    [({'host': h}, self.pages[h]) for h in hosts])
+            _metric('odem_megabytes_total', 'counter', 'MB of images processed by host',
+                    [({'host': h}, self.megabytes[h]) for h in hosts])
+            _metric('odem_pages_per_hour', 'gauge',
+                    'Pages per hour of record processing time by host',
+                    [({'host': h}, self.pages[h] * 3600 / self.seconds[h])
+                     for h in hosts if self.seconds[h] > 0])
+            _metric('odem_megabytes_per_minute', 'gauge',
+                    'MB per minute of record processing time by host',
+                    [({'host': h}, self.megabytes[h] * 60 / self.seconds[h])
+                     for h in hosts if self.seconds[h] > 0])
+            _metric('odem_record_failures_total', 'counter',
+                    'Records failed by exception class',
+                    [({'exception': e}, n) for e, n in sorted(self.failures.items())])
+            _metric('odem_records_skipped_total', 'counter',
+                    'Records skipped by reason',
+                    [({'reason': r}, n) for r, n in sorted(self.skips.items())])
+            _metric('odem_record_failure_ratio', 'gauge',
+                    'Share of finished records failed by exception class',
+                    [({'exception': e}, n / n_finished)
+                     for e, n in sorted(self.failures.items())])
+        _metric('odem_records', 'gauge', 'Records by list and state',
+                [({'list': a_list, 'state': a_state}, n)
+                 for a_list, states in sorted((queue_depths or {}).items())
+                 for a_state, n in sorted(states.items())])
+        return '\n'.join(lines) + '\n'
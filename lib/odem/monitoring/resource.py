@@ -16,6 +16,11 @@ import psutil
 import lib.odem as odem
 import lib.odem.monitoring.datatypes as odem_mdt
 
+PATH_CPU_PRESSURE = '/proc/pressure/cpu'
+
+# docker-like memory units, all binary
+MEMORY_UNITS = {'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
 
 class ResourceMonitor:
     __POLL_INTERVAL = 0.001  # 1 ms
@@ -154,6 +159,38 @@ class ResourceMonitor:
             )
         )
 
+    @staticmethod
+    def get_cpu_pressure(path_pressure: str = PATH_CPU_PRESSURE) -> typing.Optional[float]:
+        """Share of time (percent, avg10) where at least one task
+        was stalled waiting for CPU according to Linux PSI.
+        Returns None if kernel doesn't provide pressure info."""
+        try:
+            with open(path_pressure, encoding='utf-8') as pressure_reader:
+                for line in pressure_reader:
+                    if line.startswith('some'):
+                        return float(re.search(r'avg10=([\d.]+)', line).group(1))
+        except (OSError, AttributeError, ValueError):
+            pass
+        return None
+
+    @staticmethod
+    def get_capacity(path: str) -> odem_mdt.RmCapacity:
+        """What this machine offers to new records"""
+        return odem_mdt.RmCapacity(
+            cores=psutil.cpu_count() or 1,
+            memory_available=psutil.virtual_memory().available,
+            disk_free=psutil.disk_usage(os.path.abspath(path)).free,
+        )
+
+    @staticmethod
+    def get_load() -> odem_mdt.RmLoad:
+        load_1min = psutil.getloadavg()[0]
+        return odem_mdt.RmLoad(
+            load_per_cpu=load_1min / (psutil.cpu_count() or 1),
+            cpu_pressure=ResourceMonitor.get_cpu_pressure(),
+            memory_available=psutil.virtual_memory().available,
+        )
+
     @staticmethod
     def get_resource_data(process_filter: odem_mdt.RmProcessFilter = None, disk_usage_path: str = '/') -> odem_mdt.RmResourceData:
         virtual_memory: odem_mdt.RmMemory = ResourceMonitor.get_virtual_memory()
@@ -220,6 +257,25 @@ class ProcessResourceMonitor(typing.Generic[odem_mdt.Result]):
         else:
             fct_process_load()
 
+    def check_disk_space(self, bytes_loaded: int, bytes_projected: int):
+        """Disk check for data loaded in background: like
+        monit_disk_space requires free space after complete
+        load, projected from data loaded so far"""
+
+        if not self.__config.enable_resource_monitoring:
+            return
+        memory_now: odem_mdt.RmMemory = self.__resource_monitor.get_disk_usage(
+            self.__config.path_disk_usage).memory
+        memory_free_after_load: int = memory_now.free - max(0, bytes_projected - bytes_loaded)
+        memory_free_needed: int = math.ceil(bytes_projected * self.__config.factor_free_disk_space_needed)
+        if memory_free_after_load < memory_free_needed:
+            raise odem_mdt.NotEnoughDiskSpaceException(
+                path=self.__config.path_disk_usage,
+                bytes_needed=memory_free_needed,
+                bytes_free=memory_free_after_load,
+                bytes_total=memory_now.total
+            )
+
     def monit_vmem(self, fct_process_run: typing.Callable[[], odem_mdt.Result]) -> odem_mdt.Result | None:
         result_queue: multiprocessing.Queue = multiprocessing.Queue()
         if not self.__config.enable_resource_monitoring:
@@ -278,6 +334,87 @@ class ProcessResourceMonitor(typing.Generic[odem_mdt.Result]):
         self.__process.kill_with_exception(exc)
 
 
+class ExecutorScaler:
+    """Decide how many pages may be in flight at once,
+    between configured floor and ceiling.
+
+    Grows by one if there's CPU left and memory available
+    for at least two more executors and shrinks by one if
+    CPU is overloaded or memory doesn't suffice for another
+    executor. Decides at most once per interval.
+    """
+
+    def __init__(self, config: odem_mdt.ExecutorScalerConfig,
+                 fct_probe: typing.Callable[[], odem_mdt.RmLoad] = None):
+        self.__config: odem_mdt.ExecutorScalerConfig = config
+        self.__fct_probe: typing.Callable[[], odem_mdt.RmLoad] = fct_probe
+        self.__last_decision: float = 0
+
+    @property
+    def floor(self) -> int:
+        return self.__config.floor
+
+    @property
+    def ceiling(self) -> int:
+        return self.__config.ceiling
+
+    def clamp(self, n_executors: int) -> int:
+        return max(self.floor, min(self.ceiling, n_executors))
+
+    def propose(self, n_current: int) -> int:
+        time_now: float = time.time()
+        if time_now - self.__last_decision < self.__config.interval:
+            return self.clamp(n_current)
+        self.__last_decision = time_now
+        fct_probe = self.__fct_probe if self.__fct_probe is not None else ResourceMonitor.get_load
+        load: odem_mdt.RmLoad = fct_probe()
+        cpu_pressure: float = load.cpu_pressure if load.cpu_pressure is not None else 0
+        cpu_overloaded: bool = load.load_per_cpu > self.__config.max_load_per_cpu or \
+            cpu_pressure > self.__config.max_cpu_pressure
+        cpu_idle: bool = load.load_per_cpu < self.__config.max_load_per_cpu and \
+            cpu_pressure < self.__config.max_cpu_pressure / 2
+        mem_per_exec: int = self.__config.memory_per_executor or 0
+        mem_short: bool = load.memory_available < mem_per_exec
+        mem_spare: bool = load.memory_available >= 2 * mem_per_exec
+        if cpu_overloaded or mem_short:
+            return self.clamp(n_current - 1)
+        if cpu_idle and mem_spare:
+            return self.clamp(n_current + 1)
+        return self.clamp(n_current)
+
+
+def parse_memory_limit(limit: str) -> int:
+    """Turn docker-like memory limit like '4GiB', '4g'
+    or '512m' into number of bytes"""
+
+    matched = re.fullmatch(r'\s*([\d.]+)\s*([bkmgt]?)(?:i?b)?\s*', str(limit).lower())
+    if matched is None:
+        raise ValueError(f"invalid memory limit '{limit}'")
+    unit: str = matched.group(2) or 'b'
+    return int(float(matched.group(1)) * MEMORY_UNITS[unit])
+
+
+def scaler_from_configuration(config: configparser.ConfigParser,
+                              n_executors: int) -> typing.Optional[ExecutorScaler]:
+    """Create executor scaler if adaptive executors are
+    enabled, otherwise stick to fixed number of executors"""
+
+    if not config.getboolean(odem.CFG_SEC_OCR, 'n_executors_adaptive', fallback=False):
+        return None
+    cfg_floor = config.getint(odem.CFG_SEC_OCR, 'n_executors_min', fallback=1)
+    cfg_ceiling = config.getint(odem.CFG_SEC_OCR, 'n_executors_max',
+                                fallback=max(n_executors, psutil.cpu_count() or 1))
+    cfg_memory_limit = config.get(odem.CFG_SEC_OCR, 'docker_container_memory_limit', fallback=None)
+    return ExecutorScaler(odem_mdt.ExecutorScalerConfig(
+        floor=max(1, cfg_floor),
+        ceiling=max(1, cfg_floor, cfg_ceiling),
+        memory_per_executor=parse_memory_limit(cfg_memory_limit) if cfg_memory_limit else None,
+        max_load_per_cpu=config.getfloat(odem.CFG_SEC_MONITOR, 'max_load_per_cpu', fallback=1.0),
+        max_cpu_pressure=config.getfloat(odem.CFG_SEC_MONITOR, 'max_cpu_pressure', fallback=25.0),
+        interval=config.getfloat(odem.CFG_SEC_MONITOR, 'polling_interval', fallback=1),
+    ))
+
+
 def from_configuration(config: configparser.ConfigParser) -> odem_mdt.ProcessResourceMonitorConfig:
     """Encapsulate transformation from configuration options into
     process monitor input config"""
@@ -1,11 +1,18 @@
 """Implementation of OCR-D related OCR generation functionalities"""
 
+import functools
+import logging
 import os
+import queue
+import re
 import shutil
 import subprocess
+import threading
+import time
 import typing
 
 from pathlib import Path
+from xml.sax.saxutils import quoteattr
 
 import digiflow as df
 import lxml.etree as ET
@@ -15,34 +22,147 @@ import lib.odem.processing.image as oi
 
 # pylint: disable=c-extension-no-member
 
-def setup_workspace(path_workspace, image_src):
-    """Wrap ocrd workspace init and add single file"""
+# exit code of a process killed by SIGKILL, i.e.
+# when container exceeds it's memory limit
+EXIT_CODE_OOM = 137
 
+# command for idle pool containers
+POOL_CONTAINER_CMD = 'sleep infinity'
+
+# fast zlib level for workspace PNG images, which
+# are temporary anyway, rather than PIL default 6
+DEFAULT_PNG_COMPRESS_LEVEL = 1
+
+# physical page IDs within workspace METS
+WORKSPACE_PAGE_ID = 'PHYS_{:02d}'
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+# workspace METS fragments
+_WORKSPACE_DATE_MARK = 'ODEM_CREATEDATE'
+_WORKSPACE_FILES_MARK = 'ODEM_FILES'
+_WORKSPACE_PAGES_MARK = 'ODEM_PAGES'
+_WORKSPACE_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+_WORKSPACE_METS_FILE = ('<mets:file ID="{file_id}" MIMETYPE="{mimetype}">'
+                        '<mets:FLocat xlink:href={href} LOCTYPE="OTHER" OTHERLOCTYPE="FILE"/>'
+                        '</mets:file>')
+_WORKSPACE_METS_PAGE = ('<mets:div ID="{page_id}" TYPE="page">'
+                        '<mets:fptr FILEID="{file_id}"/></mets:div>')
+
+
+def setup_workspace(path_workspace, image_src, native_formats=None,
+                    png_compress_level=None, image_infos=None):
+    """Create workspace and add single file or list of
+    files, each as physical page of it's own in given order,
+    i.e. 'PHYS_01', 'PHYS_02', ...
+
+    Images with extension listed in native_formats, which
+    the configured processors accept as they are, and which
+    carry their resolution, are linked right away, all others
+    are converted to PNG with given compress level.
+    Workspace METS is rendered from a prepared template
+    rather than parsed, enriched and serialized each time.
+    Resolution is taken from image_infos if probed before."""
+
+    image_srcs = image_src if isinstance(image_src, (list, tuple)) else [image_src]
+    native_formats = native_formats or []
     # init clean workspace
     page_dir = Path(path_workspace).absolute()
     if page_dir.exists():
         shutil.rmtree(page_dir)
-    png_image = oi.ensure_format_png(image_src)
     image_dir = page_dir / oc.FILEGROUP_IMG
     image_dir.mkdir(parents=True)
-    dst_image = image_dir / png_image.name
-    shutil.move(png_image, dst_image)
-    mets_path = shutil.copyfile(oc.PROJECT_RES / "mets_empty.xml", page_dir / "mets.xml")
-    mets_proc = df.MetsProcessor(mets_path)
+    mets_files = []
+    mets_pages = []
+    for i, an_image in enumerate(image_srcs, start=1):
+        an_image = Path(an_image)
+        the_suffix = an_image.suffix.lower()
+        if the_suffix == oi.EXT_PNG or (the_suffix in native_formats
+                                        and _has_dpi(an_image, image_infos)):
+            # keep original since it may be required for re-runs
+            ws_image = image_dir / an_image.name
+            _place_image(an_image, ws_image)
+        else:
+            png_image = oi.ensure_format_png(an_image, png_compress_level)
+            ws_image = image_dir / png_image.name
+            shutil.move(png_image, ws_image)
+        file_id = f"MAX_{i:02d}"
+        mimetype = oi.MIME_TYPES.get(ws_image.suffix.lower(), f"image/{ws_image.suffix[1:]}")
+        mets_files.append(_WORKSPACE_METS_FILE.format(
+            file_id=file_id, mimetype=mimetype,
+            href=quoteattr(f"{oc.FILEGROUP_IMG}/{ws_image.name}")))
+        mets_pages.append(_WORKSPACE_METS_PAGE.format(
+            page_id=WORKSPACE_PAGE_ID.format(i), file_id=file_id))
+    (start, head, middle, tail) = _workspace_mets_template()
+    with open(page_dir / "mets.xml", 'wb') as writer:
+        writer.write(start)
+        writer.write(time.strftime(_WORKSPACE_DATE_FORMAT).encode('utf-8'))
+        writer.write(head)
+        writer.write(''.join(mets_files).encode('utf-8'))
+        writer.write(middle)
+        writer.write(''.join(mets_pages).encode('utf-8'))
+        writer.write(tail)
+    return page_dir
+
+
+def _has_dpi(image_path, image_infos) -> bool:
+    if image_infos and str(image_path) in image_infos:
+        return image_infos[str(image_path)].dpi > 0
+    return oi.has_dpi(image_path)
+
+
+def _place_image(src, dst):
+    """Hard link if possible, copy otherwise"""
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+@functools.lru_cache(maxsize=1)
+def _workspace_mets_template() -> typing.Tuple[bytes, bytes, bytes, bytes]:
+    """Render static parts of empty workspace METS once
+    and split it where creation date, page files and
+    physical pages go"""
+
+    mets_proc = df.MetsProcessor(str(oc.PROJECT_RES / "mets_empty.xml"))
     mets_proc.enrich_agent(agent_name="OCR-D", agent_note="page parallel")
+    mets_hdr = mets_proc.root.find(".//mets:metsHdr", namespaces=df.XMLNS)
+    mets_hdr.set("CREATEDATE", _WORKSPACE_DATE_MARK)
     max_group = mets_proc.root.find(".//mets:fileGrp[@USE='MAX']", namespaces=df.XMLNS)
-    file_attr = {"ID": "MAX_01", "MIMETYPE" : f"image/{png_image.suffix[1:]}"}
-    mets_file = ET.SubElement(max_group, "{http://www.loc.gov/METS/}file", file_attr)
-    locat_attr = {"{http://www.w3.org/1999/xlink}href": f"MAX/{png_image.name}",
-                  "LOCTYPE": "OTHER", "OTHERLOCTYPE": "FILE"}
-    ET.SubElement(mets_file, "{http://www.loc.gov/METS/}FLocat", locat_attr)
+    max_group.append(ET.Comment(_WORKSPACE_FILES_MARK))
     page_root = mets_proc.root.find(".//mets:div[@TYPE='physSequence']",
                                     namespaces=df.XMLNS)
-    page_01 = ET.SubElement(page_root, "{http://www.loc.gov/METS/}div",
-                            {"ID": "PHYS_01", "TYPE": "page"})
-    ET.SubElement(page_01, "{http://www.loc.gov/METS/}fptr", {"FILEID": "MAX_01"})
-    mets_proc.write()
-    return page_dir
+    page_root.append(ET.Comment(_WORKSPACE_PAGES_MARK))
+    rendered = ET.tostring(mets_proc.root.getroottree(), encoding='UTF-8',
+                           xml_declaration=True)
+    (start, rest) = rendered.split(_WORKSPACE_DATE_MARK.encode('utf-8'))
+    (head, rest) = rest.split(f'<!--{_WORKSPACE_FILES_MARK}-->'.encode('utf-8'))
+    (middle, tail) = rest.split(f'<!--{_WORKSPACE_PAGES_MARK}-->'.encode('utf-8'))
+    return start, head, middle, tail
+
+
+def collect_page_results(path_workspace, file_group) -> typing.Dict[str, Path]:
+    """Map physical pages of processed workspace to their
+    existing result files of given file group as
+    recorded by OCR-D within workspace METS"""
+
+    page_dir = Path(path_workspace).absolute()
+    mets_root = ET.parse(page_dir / "mets.xml").getroot()
+    group_files = {}
+    for a_file in mets_root.iterfind(f".//mets:fileGrp[@USE='{file_group}']/mets:file",
+                                     namespaces=df.XMLNS):
+        a_locat = a_file.find("mets:FLocat", namespaces=df.XMLNS)
+        if a_locat is not None:
+            group_files[a_file.get("ID")] = page_dir / a_locat.get(XLINK_HREF)
+    page_results = {}
+    for a_page in mets_root.iterfind(".//mets:div[@TYPE='page']", namespaces=df.XMLNS):
+        for fptr in a_page.iterfind("mets:fptr", namespaces=df.XMLNS):
+            result_path = group_files.get(fptr.get("FILEID"))
+            if result_path is not None and result_path.is_file():
+                page_results[a_page.get("ID")] = result_path
+    return page_results
 
 
 def get_recognition_level(model_config: str, rtl_models: typing.List) -> str:
@@ -55,6 +175,30 @@ def get_recognition_level(model_config: str, rtl_models: typing.List) -> str:
     return 'word'
 
 
+def get_ocrd_process_args(ocrd_process_list: typing.List, model_config: str,
+                          tesseract_model_rtl: typing.List) -> str:
+    """Render configured OCR-D processing steps for
+    actual model configuration as arguments
+    for 'ocrd process'"""
+
+    # determine if language requires word-level for RTLs
+    tess_level = get_recognition_level(model_config, tesseract_model_rtl)
+    model_config = model_config.replace('.traineddata', '')
+    ocrd_process_args = {
+        'tesseract_level': tess_level,
+        'model_config': model_config
+    }
+    the_steps = [f'"{p.format(**ocrd_process_args)}"' for p in ocrd_process_list]
+    return " ".join(the_steps)
+
+
+def sanitize_container_name(container_name: str) -> str:
+    """Replace chars not allowed by docker
+    within container names"""
+
+    return re.sub(r'[^a-zA-Z0-9_.-]', '-', container_name)
+
+
 @df.run_profiled
 def run_ocr_page(*args):
     """wrap ocr container process
@@ -74,21 +218,12 @@ def run_ocr_page(*args):
     ocrd_resources_volumes = args[8]
     tesseract_model_rtl = args[9]
 
-    # determine if language requires word-level for RTLs
-    tess_level = get_recognition_level(model_config, tesseract_model_rtl)
-
-    model_config = model_config.replace('.traineddata', '')
-
-    os.chdir(ocr_dir)
+    ocr_dir = os.path.abspath(str(ocr_dir))
     # replace not allowed chars
     container_name = container_name.replace('+', '-')
 
-    ocrd_process_args = {
-        'tesseract_level': tess_level,
-        'model_config': model_config
-    }
-    ocrd_process_list: typing.List = [f'"{p.format(**ocrd_process_args)}"' for p in ocrd_process_list]
-    ocrd_process_str: str = " ".join(ocrd_process_list)
+    ocrd_process_str: str = get_ocrd_process_args(ocrd_process_list, model_config,
+                                                  tesseract_model_rtl)
     cmd: str = f"docker run --rm -u {container_user_id}"
     cmd += f" --name {container_name}"
     if container_memory_limit is not None:
@@ -99,4 +234,190 @@ def run_ocr_page(*args):
         cmd += f" -v {host_dir}:{cntr_dir}"
     cmd += f" {container_image}"
     cmd += f" ocrd process {ocrd_process_str}"
-    subprocess.run(cmd, shell=True, check=True, timeout=container_timeout)
+    subprocess.run(cmd, shell=True, check=True, timeout=container_timeout, cwd=ocr_dir)
+
+
+class ContainerPool:
+    """Keep one long-lived OCR-D container per executor slot
+    rather than start a fresh container for each single page.
+
+    Each pool container mounts mount_root at the very same
+    path inside the container, therefore page workspaces
+    beneath can be processed with 'docker exec' using
+    their absolute path as working directory.
+
+    Containers which timed out, died or got killed due
+    exceeding their memory limit will be replaced.
+
+    Only n_warm containers are started up front, further
+    ones up to n_slots when pages wait for a container.
+    """
+
+    def __init__(self, n_slots: int, container_image: str, mount_root,
+                 container_label: str, container_user,
+                 container_memory_limit: str = None,
+                 ocrd_resources_volumes: typing.Dict = None,
+                 logger: logging.Logger = None):
+        self.n_slots = n_slots
+        self.container_image = container_image
+        self.mount_root = os.path.realpath(str(mount_root))
+        self.container_label = sanitize_container_name(container_label)
+        self.container_user = container_user
+        self.container_memory_limit = container_memory_limit
+        self.ocrd_resources_volumes = ocrd_resources_volumes or {}
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.n_replaced = 0
+        self._idle: queue.Queue = queue.Queue()
+        self._containers: typing.List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        """Pool containers started and not stopped yet"""
+        return len(self._containers) > 0
+
+    def start(self, n_warm: int = None):
+        """Start a container for each slot,
+        or for n_warm slots if given"""
+
+        n_warm = self.n_slots if n_warm is None else max(1, min(n_warm, self.n_slots))
+        for _ in range(n_warm):
+            with self._lock:
+                container_name = self._reserve_slot()
+            self._idle.put(self._add_container(container_name))
+        self.logger.info("[%s] started %d of %d pool containers (%s)",
+                         self.container_label, n_warm, self.n_slots, self.container_image)
+
+    def _reserve_slot(self) -> str:
+        """Name of container for next slot, caller holds lock"""
+
+        i_slot = 1
+        while f"{self.container_label}_slot{i_slot:02d}" in self._containers:
+            i_slot += 1
+        container_name = f"{self.container_label}_slot{i_slot:02d}"
+        self._containers.append(container_name)
+        return container_name
+
+    def _add_container(self, container_name) -> str:
+        try:
+            self._start_container(container_name)
+        except subprocess.CalledProcessError:
+            self._drop_slot(container_name)
+            raise
+        return container_name
+
+    def _drop_slot(self, container_name):
+        """Forget container which couldn't be started and
+        wake up a page waiting for it, if any, to start
+        another one instead"""
+
+        with self._lock:
+            self._containers.remove(container_name)
+        self._idle.put(None)
+
+    def _acquire(self) -> str:
+        """Next idle container, start another one
+        if there's none and slots are left"""
+
+        while True:
+            with self._lock:
+                container_name = None
+                if self._idle.empty() and len(self._containers) < self.n_slots:
+                    container_name = self._reserve_slot()
+            if container_name is not None:
+                return self._add_container(container_name)
+            container_name = self._idle.get()
+            if container_name is not None:
+                return container_name
+
+    def stop(self):
+        """Remove all pool containers"""
+
+        for container_name in self._containers:
+            self._remove_container(container_name)
+        self.logger.info("[%s] removed %d pool containers (%d replaced)",
+                         self.container_label, len(self._containers), self.n_replaced)
+        self._containers = []
+        self._idle = queue.Queue()
+
+    def _start_container(self, container_name):
+        cmd: str = f"docker run -d --rm -u {self.container_user}"
+        cmd += f" --name {container_name}"
+        if self.container_memory_limit is not None:
+            cmd += f" --memory {self.container_memory_limit}"
+            cmd += f" --memory-swap {self.container_memory_limit}"  # same value disables swap
+        cmd += f" -v {self.mount_root}:{self.mount_root}"
+        for host_dir, cntr_dir in self.ocrd_resources_volumes.items():
+            cmd += f" -v {host_dir}:{cntr_dir}"
+        cmd += f" {self.container_image} {POOL_CONTAINER_CMD}"
+        subprocess.run(cmd, shell=True, check=True, capture_output=True)
+
+    @staticmethod
+    def _remove_container(container_name):
+        subprocess.run(f"docker rm -f {container_name}", shell=True,
+                       check=False, capture_output=True)
+
+    @staticmethod
+    def is_alive(container_name) -> bool:
+        """Inspect whether container still running"""
+
+        cmd = f"docker inspect -f '{{{{.State.Running}}}}' {container_name}"
+        inspected = subprocess.run(cmd, shell=True, check=False, capture_output=True)
+        return inspected.returncode == 0 and inspected.stdout.decode().strip() == 'true'
+
+    def replace(self, container_name) -> str:
+        """Drop container and start a fresh one with same
+        name, which is returned. If this fails, slot is
+        dropped, too, and pool may grow again on demand."""
+
+        self._remove_container(container_name)
+        try:
+            self._start_container(container_name)
+        except subprocess.CalledProcessError:
+            self.logger.error("[%s] failed to replace pool container %s",
+                              self.container_label, container_name)
+            self._drop_slot(container_name)
+            raise
+        with self._lock:
+            self.n_replaced += 1
+        self.logger.warning("[%s] replaced pool container %s",
+                            self.container_label, container_name)
+        return container_name
+
+    @df.run_profiled
+    def run_ocr_page(self, *args):
+        """Dispatch ocr for page workspace into next
+        idle pool container and wait for completion"""
+
+        ocr_dir = os.path.realpath(str(args[0]))
+        container_timeout: int = args[1]
+        ocrd_process_list: typing.List = args[2]
+        model_config = args[3]
+        tesseract_model_rtl = args[4]
+
+        if os.path.commonpath([self.mount_root, ocr_dir]) != self.mount_root:
+            raise oc.ODEMException(f"{ocr_dir} not beneath pool mount {self.mount_root}")
+        ocrd_process_str: str = get_ocrd_process_args(ocrd_process_list, model_config,
+                                                      tesseract_model_rtl)
+        container_name = self._acquire()
+        idle_name = container_name
+        try:
+            cmd: str = f"docker exec -w {ocr_dir} {container_name}"
+            cmd += f" ocrd process {ocrd_process_str}"
+            subprocess.run(cmd, shell=True, check=True, timeout=container_timeout,
+                           cwd=ocr_dir)
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as sub_exc:
+            # ocrd process inside container survives
+            # the killed exec client, therefore drop container
+            if isinstance(sub_exc, subprocess.TimeoutExpired) \
+                    or sub_exc.returncode == EXIT_CODE_OOM \
+                    or not self.is_alive(container_name):
+                idle_name = None
+                try:
+                    idle_name = self.replace(container_name)
+                except subprocess.CalledProcessError as replace_exc:
+                    raise sub_exc from replace_exc
+            raise
+        finally:
+            if idle_name is not None:
+                self._idle.put(idle_name)
@@ -4,6 +4,7 @@ import abc
 import collections
 import configparser
 import logging
+import math
 import os
 import re
 import shutil
@@ -555,15 +556,42 @@ def drop_empty_contents(xml_root):
                     printspace.remove(parent_super)
 
 
-def profile(func):
+def profile(func) -> float:
     """profile execution time of provided function"""
 
-    func_start = time.time()
+    func_start = time.perf_counter()
     func()
-    func_end = time.time()
-    func_delta = func_end - func_start
-    label = str(func).split()[4].split('.')[2]
-    return f"{label} run {func_delta:.2f}s"
+    return time.perf_counter() - func_start
+
+
+def step_label(step) -> str:
+    """Label of step in timings, i.e. it's class name"""
+
+    return type(step).__name__
+
+
+def _percentile(ordered: typing.List[float], share: float) -> float:
+    """Nearest-rank percentile of ascending samples"""
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def aggregate_step_timings(results: typing.List[oc.OCRResult]) -> typing.Dict:
+    """Count, mean, p50, p95 and max seconds of each
+    step over all results, with timings, of a record"""
+
+    samples = collections.defaultdict(list)
+    for a_result in results:
+        for a_label, seconds in getattr(a_result, 'step_timings', {}).items():
+            samples[a_label].extend(seconds)
+    aggregated = {}
+    for a_label, seconds in sorted(samples.items()):
+        ordered = sorted(seconds)
+        aggregated[a_label] = {'count': len(ordered),
+                               'mean': round(sum(ordered) / len(ordered), 3),
+                               'p50': round(_percentile(ordered, 0.50), 3),
+                               'p95': round(_percentile(ordered, 0.95), 3),
+                               'max': round(ordered[-1], 3)}
+    return aggregated
 
 
 def run_pipeline(*args) -> oc.OCRResult:
@@ -593,9 +621,11 @@ def run_pipeline(*args) -> oc.OCRResult:
             if isinstance(step, StepIOExtern):
                 the_logger.debug("[%s] call '%s' (env: '%s')",
                               file_name, step.cmd, step._env)
-            profile_result = profile(step.execute)
+            step_seconds = profile(step.execute)
+            p_result.step_timings.setdefault(step_label(step), []).append(step_seconds)
+            profile_result = f"{step_label(step)} run {step_seconds:.2f}s"
             if hasattr(step, 'statistics'):
-                if profile_result and isinstance(step, StepEstimateOCR):
+                if isinstance(step, StepEstimateOCR):
                     p_result.statistics = step.statistics
                 the_logger.info("[%s] %s, statistics: %s",
                              file_name, profile_result,
@@ -2,13 +2,16 @@
 
 from __future__ import annotations
 
+import collections
 import concurrent.futures
 import configparser
 import logging
 import os
+import queue
 import shutil
 import subprocess
 import sys
+import threading
 import time
 import typing
 
@@ -16,10 +19,13 @@ from pathlib import Path
 
 import lib.odem.commons as oc
 import lib.odem.odem_process_impl as odem_p
+import lib.odem.monitoring.resource as odem_rm
 import lib.odem.ocr.ocr_d as odem_ocrd
 import lib.odem.ocr.ocr_pipeline as odem_tess
+import lib.odem.processing.download as odem_download
 import lib.odem.processing.image as odem_img
 import lib.odem.processing.ocr_files as odem_fmt
+import lib.odem.processing.result_cache as odem_cache
 
 # estimated ocr-d runtime
 # for a regular page (A4, 1MB)
@@ -28,61 +34,273 @@ DEFAULT_RUNTIME_PAGE = 1.0
 ODEM_PAGE_TIME_FORMAT = '%Y-%m-%d_%H-%m-%S'
 # how long to process single page?
 DEFAULT_DOCKER_CONTAINER_TIMEOUT = 600
+# seconds to wait before first retry, doubles each retry
+DEFAULT_RETRY_BACKOFF = 5.0
+# raise memory limit for retry after OOM
+DEFAULT_MEMORY_ESCALATION = 2.0
+
+# retry statistics keys
+RETRY_STATS_PAGES = 'pages'
+RETRY_STATS_ATTEMPTS = 'attempts'
+RETRY_STATS_OOM = 'oom'
+RETRY_STATS_TIMEOUT = 'timeout'
+RETRY_STATS_RECOVERED = 'recovered'
+RETRY_STATS_FAILED = 'failed'
 
 LOCAL_OCRD_RESULT_DIR = 'PAGE'
 
+# how often to look for downloaded images
+# while executors are busy (seconds)
+STREAM_POLL_INTERVAL = 0.1
+
+# lower bound of adaptive executors polling
+# interval, zero would busy wait (seconds)
+MIN_POLL_INTERVAL = 0.05
+
+# staging dir for images converted ahead
+PREFETCH_DIR = '.prefetch'
+
+# upper bound of ocr result cache
+DEFAULT_RESULT_CACHE_SIZE = '10GiB'
+# key of page statistics kept with cached result
+CACHE_META_STATISTICS = 'statistics'
+
+# input dispatch policies
+SCHEDULING_METS_ORDER = 'mets_order'
+SCHEDULING_LARGEST_FIRST = 'largest_first'
+# rough megapixels per MB for JPG
+# if image dimensions unknown
+COST_MPS_PER_MB = 4.0
+
+
+def _get_file_id(image_path) -> str:
+    return os.path.basename(image_path).split('.')[0]
+
+
+def estimate_page_cost(image_path, image_info: odem_img.ImageInfo = None) -> float:
+    """Estimate relative OCR cost of page image by it's
+    megapixels, with file size as fallback if image
+    dimensions can't be read"""
+
+    try:
+        if image_info is None:
+            image_info = odem_img.probe_image(image_path)
+    except OSError:
+        try:
+            return os.path.getsize(image_path) / 1048576 * COST_MPS_PER_MB
+        except OSError:
+            return 0.0
+    if image_info.mps > 0:
+        return image_info.mps
+    return image_info.filesize_mb * COST_MPS_PER_MB
+
+
+def schedule_mets_order(costs: typing.List[float]) -> typing.List[int]:
+    """Dispatch inputs as they come"""
+    return list(range(len(costs)))
+
+
+def schedule_largest_first(costs: typing.List[float]) -> typing.List[int]:
+    """Dispatch most expensive inputs first, so huge plates
+    don't end up as lonely stragglers at the end of a
+    record while all other executors idle. Ties keep
+    their original order."""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+SCHEDULING_POLICIES: typing.Dict[str, typing.Callable[[typing.List[float]], typing.List[int]]] = {
+    SCHEDULING_METS_ORDER: schedule_mets_order,
+    SCHEDULING_LARGEST_FIRST: schedule_largest_first,
+}
+
+
+def register_scheduling_policy(name, policy):
+    """Make custom policy available for option
+    [ocr] scheduling_policy. A policy maps estimated
+    input costs to the order of input indices
+    to dispatch."""
+    SCHEDULING_POLICIES[name] = policy
+
+
+def create_container_pool(config: configparser.ConfigParser, n_slots: int, mount_root,
+                          label: str, logger=None) -> odem_ocrd.ContainerPool:
+    """Pool of OCR-D containers as configured by [ocr]
+    options, for all page workspaces beneath mount_root"""
+
+    return odem_ocrd.ContainerPool(
+        max(n_slots, 1),
+        config.get(oc.CFG_SEC_OCR, 'ocrd_baseimage'),
+        mount_root,
+        label,
+        config.get(oc.CFG_SEC_OCR, 'docker_container_user', fallback=os.getuid()),
+        config.get(oc.CFG_SEC_OCR, 'docker_container_memory_limit', fallback=None),
+        config.getdict(oc.CFG_SEC_OCR, oc.CFG_SEC_OCR_OPT_RES_VOL, fallback={}),
+        logger,
+    )
+
 
 class OCRWorkflowRunner:
-    """Wrap actual ODEM process execution"""
+    """Wrap actual ODEM process execution
+
+    If several records run concurrently within one worker,
+    they share page_slots, which bound the total number of
+    inputs in flight, i.e. containers, across all records.
+    """
 
     def __init__(self, identifier, n_executors,
-                 internal_logger, odem_workflow) -> None:
+                 internal_logger, odem_workflow,
+                 page_slots: threading.Semaphore = None) -> None:
         self.process_identifier = identifier
         self.n_executors = n_executors
         self.logger: logging.Logger = internal_logger
         self.odem_workflow: OCRWorkflow = odem_workflow
+        self.page_slots = page_slots
+        self.slot_wait = 0.0
+        self._slot_lock = threading.Lock()
+        self.concurrency_peak = 0
+        self._concurrency_current = 0
+        self._concurrency_since = None
+        self._concurrency_area = 0.0
+        self._concurrency_duration = 0.0
 
     def run(self):
         """Actual run wrapper"""
+        odem_process = self.odem_workflow.odem_process
+        # only missing candidates make it into inputs
+        # but outputs still refer to all candidates
+        all_candidates = odem_process.ocr_candidates
+        restored = odem_process.resume_ocr()
         input_data = self.odem_workflow.get_inputs()
+        image_stream = None
+        try:
+            image_stream = odem_process.start_image_stream()
+        finally:
+            odem_process.ocr_candidates = all_candidates
         self.logger.info("[%s] run %d images with %d executors (%s)",
                          self.process_identifier, len(input_data), self.n_executors,
                          self.odem_workflow.__class__.__name__)
-        if self.n_executors > 1:
-            raw_returned = self.run_parallel(input_data)
-        else:
-            raw_returned = self.run_sequential(input_data)
+        scaler = odem_rm.scaler_from_configuration(self.odem_workflow.config, self.n_executors)
+        n_slots = self.n_executors if scaler is None else scaler.ceiling
+        n_warm = self.n_executors if scaler is None else scaler.clamp(self.n_executors)
+        try:
+            self.odem_workflow.start(n_slots, n_warm)
+            with odem_process.timed(oc.STAGE_OCR):
+                if image_stream is not None:
+                    raw_returned = self.run_streaming(input_data, image_stream)
+                elif n_slots > 1:
+                    raw_returned = self.run_parallel(input_data)
+                else:
+                    raw_returned = self.run_sequential(input_data)
+        finally:
+            if image_stream is not None:
+                image_stream.stop()
+            self.odem_workflow.stop()
+        the_stats = odem_process.process_statistics
+        the_stats[oc.STATS_KEY_N_EXECS_PEAK] = self.concurrency_peak
+        the_stats[oc.STATS_KEY_N_EXECS_MEAN] = round(self.concurrency_mean, 2)
+        if self.page_slots is not None:
+            the_stats[oc.STATS_KEY_SLOT_WAIT] = round(self.slot_wait, 2)
+        the_stats.update(self.odem_workflow.statistics)
+        if image_stream is not None and image_stream.failures:
+            # pages done so far are kept by manifest
+            # and spared if resumed
+            the_stats[oc.STATS_KEY_DOWNLOAD_FAILS] = {
+                Path(image_path).name: failure
+                for image_path, failure in image_stream.failures.items()}
+            raise oc.ODEMDownloadException(
+                f"download failed for {len(image_stream.failures)} "
+                f"images: {sorted(the_stats[oc.STATS_KEY_DOWNLOAD_FAILS])}")
+        # batched inputs yield a list of results each
+        raw_returned = [a_result
+                        for returned in raw_returned
+                        for a_result in (returned if isinstance(returned, list) else [returned])]
+        step_timings = odem_tess.aggregate_step_timings(raw_returned)
+        if step_timings:
+            the_stats[oc.STATS_KEY_OCR_STEPS] = step_timings
         n_processed = len(raw_returned)
         self.logger.info("[%s] processed %d candidates",
                          self.process_identifier, n_processed)
-        filter_set = [r for r in raw_returned
-                      if r.local_path != oc.UNSET]
-        the_unsets = n_processed - len(filter_set)
+        filter_set = restored + [r for r in raw_returned
+                                 if r.local_path != oc.UNSET]
+        the_unsets = n_processed + len(restored) - len(filter_set)
         self.logger.info("[%s] from %d candidates filtered %d unset",
                          self.process_identifier, len(raw_returned),
                          the_unsets)
-        self.odem_workflow.process_outputs(filter_set)
+        # pages converted while ocr runs are accounted to ocr
+        with odem_process.timed(oc.STAGE_PAGE_TO_ALTO):
+            self.odem_workflow.process_outputs(filter_set)
         self.logger.info("[%s] created %d ocr files for %d images",
                          self.process_identifier,
                          len(self.odem_workflow.ocr_results), len(input_data))
         return self.odem_workflow.ocr_results
 
     def run_parallel(self, input_data):
-        """Run workflow parallel with given executors"""
+        """Run workflow parallel with given executors.
+
+        If adaptive executors enabled, number of inputs
+        in flight is adjusted to actual system load
+        between configured floor and ceiling."""
 
         n_inputs = len(input_data)
+        scaler = odem_rm.scaler_from_configuration(self.odem_workflow.config, self.n_executors)
+        n_target = self.n_executors
+        n_workers = self.n_executors
+        interval = None
+        if scaler is not None:
+            n_target = scaler.clamp(self.n_executors)
+            n_workers = scaler.ceiling
+            interval = max(MIN_POLL_INTERVAL,
+                           self.odem_workflow.config.getfloat(oc.CFG_SEC_MONITOR,
+                                                              'polling_interval', fallback=1))
+            self.logger.info("[%s] adaptive executors between %d and %d",
+                             self.process_identifier, scaler.floor, scaler.ceiling)
         self.logger.info("[%s] %d inputs run_parallel with %d executors",
-                         self.process_identifier, n_inputs, self.n_executors)
+                         self.process_identifier, n_inputs, n_target)
+        dispatch_order = self.get_dispatch_order(input_data)
+        self.odem_workflow.prefetch([input_data[i] for i in dispatch_order])
         try:
-            outcomes = []
+            outcomes = [None] * n_inputs
+            pending = {}
+            next_input = 0
             with concurrent.futures.ThreadPoolExecutor(
-                    max_workers=self.n_executors,
-                    thread_name_prefix='odem.ocrd'
+                    max_workers=n_workers,
+                    thread_name_prefix=f'odem.ocrd.{self.process_identifier}'
             ) as executor:
-                outcomes = list(executor.map(self.odem_workflow.run, input_data))
-            self.logger.info("[%s] created %d results with %d executors",
+
+                def _dispatch():
+                    nonlocal next_input
+                    while next_input < n_inputs and len(pending) < n_target:
+                        i_input = dispatch_order[next_input]
+                        a_future = executor.submit(self._run_input, input_data[i_input])
+                        pending[a_future] = i_input
+                        next_input += 1
+                    self._track_concurrency(len(pending))
+
+                _dispatch()
+                while pending:
+                    done, _ = concurrent.futures.wait(
+                        pending, timeout=interval,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                    finished = []
+                    for a_future in done:
+                        i_input = pending.pop(a_future)
+                        outcomes[i_input] = a_future.result()
+                        finished.append(outcomes[i_input])
+                    if scaler is not None:
+                        n_proposed = scaler.propose(n_target)
+                        if n_proposed != n_target:
+                            self.logger.debug("[%s] adapt executors %d => %d",
+                                              self.process_identifier, n_target, n_proposed)
+                        n_target = n_proposed
+                    # keep executors busy before
+                    # turning to finished outcomes
+                    _dispatch()
+                    for an_outcome in finished:
+                        self._process_output(an_outcome)
+            self._track_concurrency(0)
+            self.logger.info("[%s] created %d results with %d executors (peak %d)",
                              self.process_identifier, len(outcomes),
-                             self.n_executors)
+                             n_target, self.concurrency_peak)
             return outcomes
         except (OSError, AttributeError) as err:
             self.logger.error("[%s] %s ", self.process_identifier, err)
@@ -92,6 +310,146 @@ class OCRWorkflowRunner:
             self.logger.error("[%s] %s ", self.process_identifier, last_exc)
             raise oc.ODEMException(f"ODEM parallel: {last_exc}")
 
+    def run_streaming(self, input_data, image_stream: odem_download.ImageStream):
+        """Run inputs in order their images arrive from
+        download in background, each as soon as all of
+        it's images are on disk and an executor is idle.
+        Images are only taken from stream if there's an
+        idle executor, which keeps download bounded.
+        Inputs with failed images are left out, batches
+        only lose their failed pages."""
+
+        n_inputs = len(input_data)
+        n_workers = self.n_executors
+        self.logger.info("[%s] %d inputs run_streaming with %d executors",
+                         self.process_identifier, n_inputs, n_workers)
+        input_of_image = {}
+        n_missing = [0] * n_inputs
+        for i, an_input in enumerate(input_data):
+            for image_path in self.odem_workflow.input_images(an_input):
+                input_of_image[str(image_path)] = i
+                n_missing[i] += 1
+        failed_images = set()
+        outcomes = [oc.OCRResult(oc.UNSET)] * n_inputs
+        ready = collections.deque(i for i in range(n_inputs) if n_missing[i] == 0)
+        pending = {}
+        stream_done = False
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=n_workers,
+                    thread_name_prefix=f'odem.ocrd.{self.process_identifier}'
+            ) as executor:
+                while True:
+                    while not stream_done and not ready and len(pending) < n_workers:
+                        try:
+                            announced = image_stream.get(timeout=STREAM_POLL_INTERVAL
+                                                         if pending else None)
+                        except queue.Empty:
+                            break
+                        if announced is None:
+                            stream_done = True
+                            break
+                        (image_path, is_loaded) = announced
+                        i_input = input_of_image.get(image_path)
+                        if i_input is None:
+                            continue
+                        if not is_loaded:
+                            failed_images.add(image_path)
+                        n_missing[i_input] -= 1
+                        if n_missing[i_input] == 0:
+                            ready.append(i_input)
+                    while ready and len(pending) < n_workers:
+                        i_input = ready.popleft()
+                        an_input = input_data[i_input]
+                        if isinstance(an_input, list):
+                            an_input = [pair for pair in an_input
+                                        if pair[0] not in failed_images]
+                        elif an_input[0] in failed_images:
+                            an_input = []
+                        if an_input:
+                            pending[executor.submit(self._run_input, an_input)] = i_input
+                    self._track_concurrency(len(pending))
+                    if not pending:
+                        if stream_done and not ready:
+                            break
+                        continue
+                    done, _ = concurrent.futures.wait(
+                        pending, timeout=STREAM_POLL_INTERVAL,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                    for a_future in done:
+                        i_input = pending.pop(a_future)
+                        outcomes[i_input] = a_future.result()
+                        self._process_output(outcomes[i_input])
+            self._track_concurrency(0)
+        except (OSError, AttributeError) as err:
+            self.logger.error("[%s] %s ", self.process_identifier, err)
+            raise oc.ODEMException(f"ODEM streaming: {err.args[0]}") from err
+        if image_stream.error is not None:
+            raise image_stream.error
+        n_lost = len([n for n in n_missing if n > 0])
+        if n_lost > 0:
+            raise oc.ODEMException(f"ODEM streaming: {n_lost} inputs lack images from METS")
+        return outcomes
+
+    def _run_input(self, an_input):
+        """Run input, within shared page slot if any"""
+
+        if self.page_slots is None:
+            return self.odem_workflow.run(an_input)
+        time_wait = time.time()
+        with self.page_slots:
+            with self._slot_lock:
+                self.slot_wait += time.time() - time_wait
+            return self.odem_workflow.run(an_input)
+
+    def _process_output(self, outcome):
+        """Pass outcome to workflow as soon as it's
+        available, batched inputs yield several"""
+
+        for an_outcome in (outcome if isinstance(outcome, list) else [outcome]):
+            self.odem_workflow.checkpoint(an_outcome)
+            self.odem_workflow.process_output(an_outcome)
+
+    def get_dispatch_order(self, input_data) -> typing.List[int]:
+        """Order of input indices to dispatch with respect to
+        configured scheduling policy and estimated costs.
+        Outcomes are kept in order of input data anyway."""
+
+        policy_name = self.odem_workflow.config.get(oc.CFG_SEC_OCR, 'scheduling_policy',
+                                                    fallback=SCHEDULING_METS_ORDER)
+        if policy_name not in SCHEDULING_POLICIES:
+            raise oc.ODEMException(f"unknown scheduling_policy '{policy_name}'!")
+        if policy_name == SCHEDULING_METS_ORDER:
+            # order doesn't depend on costs, spare estimating them
+            return schedule_mets_order([1.0] * len(input_data))
+        costs = [self.odem_workflow.estimate_cost(an_input) for an_input in input_data]
+        dispatch_order = SCHEDULING_POLICIES[policy_name](costs)
+        if sorted(dispatch_order) != list(range(len(input_data))):
+            raise oc.ODEMException(f"scheduling_policy '{policy_name}' lost inputs!")
+        self.logger.info("[%s] dispatch %d inputs %s (total cost %.1f)",
+                         self.process_identifier, len(input_data), policy_name, sum(costs))
+        return dispatch_order
+
+    def _track_concurrency(self, n_in_flight):
+        """Sum up time-weighted number of inputs in flight"""
+
+        time_now = time.time()
+        if self._concurrency_since is not None:
+            time_span = time_now - self._concurrency_since
+            self._concurrency_area += self._concurrency_current * time_span
+            self._concurrency_duration += time_span
+        self._concurrency_since = time_now
+        self._concurrency_current = n_in_flight
+        self.concurrency_peak = max(self.concurrency_peak, n_in_flight)
+
+    @property
+    def concurrency_mean(self) -> float:
+        """Time-weighted average of inputs in flight"""
+
+        if self._concurrency_duration > 0:
+            return self._concurrency_area / self._concurrency_duration
+        return float(self.concurrency_peak)
+
     def run_sequential(self, input_data):
         """run complete workflow plain sequential
         For debugging or small machines
@@ -101,9 +459,14 @@ class OCRWorkflowRunner:
         estm_min = len_img * DEFAULT_RUNTIME_PAGE
         self.logger.info("[%s] %d inputs run_sequential, estm. %dmin",
                          self.process_identifier, len_img, estm_min)
+        self.odem_workflow.prefetch(input_data)
         try:
-            outcomes = [self.odem_workflow.run(the_input)
-                        for the_input in input_data]
+            self._track_concurrency(1)
+            outcomes = []
+            for the_input in input_data:
+                outcomes.append(self._run_input(the_input))
+                self._process_output(outcomes[-1])
+            self._track_concurrency(0)
             return outcomes
         except (OSError, AttributeError) as err:
             self.logger.error(err)
@@ -128,14 +491,131 @@ class OCRWorkflow:
         self.config = odem_process.configuration
         self.logger = odem_process.logger
         self.ocr_results: typing.List[oc.OCRResult] = []
+        self._post_executor: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._post_lock = threading.Lock()
+        self.result_cache: typing.Optional[odem_cache.OCRResultCache] = None
+        if self.config.has_option(oc.CFG_SEC_OCR, 'result_cache_dir'):
+            cache_size = self.config.get(oc.CFG_SEC_OCR, 'result_cache_max_size',
+                                         fallback=DEFAULT_RESULT_CACHE_SIZE)
+            self.result_cache = odem_cache.OCRResultCache(
+                self.config.get(oc.CFG_SEC_OCR, 'result_cache_dir'),
+                odem_rm.parse_memory_limit(cache_size))
 
     def get_inputs(self) -> typing.List:
         """Collect all input data files to run for ocr-ing"""
 
+    @property
+    def statistics(self) -> typing.Dict:
+        """Workflow specific statistics for record"""
+        if self.result_cache is None:
+            return {}
+        return {oc.STATS_KEY_CACHE: dict(self.result_cache.statistics)}
+
+    def cache_key(self, image_path, *parts) -> typing.Optional[str]:
+        """Key for image result, if result cache is enabled"""
+
+        if self.result_cache is None:
+            return None
+        return self.result_cache.create_key(image_path, *parts)
+
+    def load_cached(self, key, dst_path) -> bool:
+        """Restore cached result to dst_path, if any"""
+
+        return key is not None and self.result_cache.get(key, dst_path)
+
+    def cached_metadata(self, key) -> typing.Dict:
+        """Metadata stored along with cached result"""
+
+        if key is None:
+            return {}
+        return self.result_cache.metadata(key)
+
+    def store_cached(self, key, result_path, metadata: typing.Dict = None):
+        """Keep result for later runs, but don't let
+        a troublesome cache spoil actual result"""
+
+        if key is None or result_path in (oc.UNSET, "") or not os.path.isfile(result_path):
+            return
+        try:
+            self.result_cache.put(key, result_path, metadata)
+        except OSError as os_err:
+            self.logger.warning("[%s] can't cache '%s': %s",
+                                self.odem_process.process_identifier, result_path, os_err)
+
+    def start(self, n_slots: int, n_warm: int = None):
+        """Acquire resources required by all runs
+        before first input is processed, at most
+        n_slots runs at once, n_warm at first"""
+
+    def stop(self):
+        """Release resources acquired by start
+        after last input has been processed"""
+
+    def estimate_cost(self, _) -> float:
+        """Estimate relative cost of running input
+        to schedule expensive inputs first"""
+        return 1.0
+
+    def input_images(self, an_input) -> typing.List[str]:
+        """Image paths an input depends on"""
+
+        if isinstance(an_input, list):
+            return [image_path for image_path, _ in an_input]
+        return [an_input[0]]
+
+    def page_cost(self, image_path) -> float:
+        """Estimate page cost from probed image features"""
+
+        try:
+            return estimate_page_cost(image_path, self.odem_process.get_image_info(image_path))
+        except OSError:
+            return estimate_page_cost(image_path)
+
+    def prefetch(self, upcoming: typing.List):
+        """Inputs in order they are going to be run,
+        to prepare them ahead while others still run"""
+
     def run(self, _: typing.List) -> oc.OCRResult:
         """Run actual implemented Workflow to generate
         single OCR Result"""
 
+    def checkpoint(self, an_outcome: oc.OCRResult):
+        """Record outcome as complete, so it's spared if
+        record gets resumed after a broken run"""
+
+        self.odem_process.checkpoint(an_outcome)
+
+    def process_output(self, an_outcome: oc.OCRResult):
+        """Work to do for single outcome as soon as it has
+        been created while others are still running"""
+
+    def submit_postprocessing(self, fct, *args) -> concurrent.futures.Future:
+        """Run CPU-bound post-OCR function with plain arguments,
+        in worker process if [ocr] n_postprocess_workers > 1,
+        otherwise right now"""
+
+        n_workers = self.config.getint(oc.CFG_SEC_OCR, 'n_postprocess_workers', fallback=1)
+        if n_workers > 1:
+            # pages may be submitted by several executors
+            with self._post_lock:
+                if self._post_executor is None:
+                    self._post_executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=n_workers)
+            return self._post_executor.submit(fct, *args)
+        a_future = concurrent.futures.Future()
+        try:
+            a_future.set_result(fct(*args))
+        except Exception as exc:
+            a_future.set_exception(exc)
+        return a_future
+
+    def shutdown_postprocessing(self):
+        """Release worker processes, if any"""
+
+        if self._post_executor is not None:
+            self._post_executor.shutdown()
+            self._post_executor = None
+
     def process_outputs(self, the_outcomes: typing.List[oc.OCRResult]):
         """Work to do after pipeline has been run successfully
         like additional format transformations or sanitizings
@@ -145,113 +625,473 @@ class OCRWorkflow:
 class OCRDPageParallel(OCRWorkflow):
     """Use page parallel workflow"""
 
+    def __init__(self, odem_process: odem_p.ODEMProcessImpl):
+        super().__init__(odem_process)
+        self.container_pool: typing.Optional[odem_ocrd.ContainerPool] = None
+        self._owns_pool = False
+        self.stream_outputs = self.config.getboolean(oc.CFG_SEC_OCR, 'stream_outputs',
+                                                     fallback=False)
+        self._streamed: typing.Dict[str, concurrent.futures.Future] = {}
+        self.retry_statistics: typing.Dict[str, int] = {}
+        self._retry_lock = threading.Lock()
+        self._oom_lane = threading.Semaphore(
+            self.config.getint(oc.CFG_SEC_OCR, 'ocrd_oom_lane_size', fallback=1))
+        self.native_formats = [f".{a_format.strip().lstrip('.').lower()}"
+                               for a_format in self.config.getlist(oc.CFG_SEC_OCR,
+                                                                   'ocrd_image_formats',
+                                                                   fallback=[])]
+        self.png_compress_level = self.config.getint(oc.CFG_SEC_OCR, 'ocrd_png_compress_level',
+                                                     fallback=odem_ocrd.DEFAULT_PNG_COMPRESS_LEVEL)
+        self._prefetch_executor: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._prefetch_queue: typing.Deque[str] = collections.deque()
+        self._prefetched: typing.Dict[str, concurrent.futures.Future] = {}
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_dir = Path(self.odem_process.work_dir_root) / PREFETCH_DIR
+
     def get_inputs(self):
-        return self.odem_process.ocr_candidates
+        """Page candidates, grouped into batches of pages
+        sharing a common OCR-D workspace if configured"""
+
+        candidates = self.odem_process.ocr_candidates
+        batch_size = self.config.getint(oc.CFG_SEC_OCR, 'ocrd_batch_size', fallback=1)
+        if batch_size < 2:
+            return candidates
+        return [list(candidates[i:i + batch_size])
+                for i in range(0, len(candidates), batch_size)]
+
+    def estimate_cost(self, input_data) -> float:
+        if isinstance(input_data, list):
+            return sum(self.page_cost(image_path) for image_path, _ in input_data)
+        return self.page_cost(input_data[0])
+
+    def start(self, n_slots, n_warm=None):
+        """If configured, start a warm container for each
+        executor slot in use at first, unless a pool already
+        was provided from outside, i.e. by a long running worker"""
+
+        if self.container_pool is not None:
+            return
+        if not self.config.getboolean(oc.CFG_SEC_OCR, 'docker_container_pool', fallback=False):
+            return
+        label = f'odem_{self.odem_process.process_identifier}'
+        self.container_pool = create_container_pool(self.config, n_slots,
+                                                    self.odem_process.work_dir_root,
+                                                    label, self.logger)
+        self._owns_pool = True
+        self.container_pool.start(n_warm)
+
+    def stop(self):
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(cancel_futures=True)
+            self._prefetch_executor = None
+            self._prefetch_queue.clear()
+            self._prefetched.clear()
+            shutil.rmtree(self._prefetch_dir, ignore_errors=True)
+        if self._owns_pool and self.container_pool is not None:
+            self.container_pool.stop()
+            self.container_pool = None
+            self._owns_pool = False
 
     def run(self, input_data):
+        if isinstance(input_data, list):
+            return self.run_batch(input_data)
+        image_path = input_data[0]
+        cache_key = self._page_cache_key(image_path)
+        cached = self._load_cached_page(cache_key, image_path)
+        if cached is not None:
+            return cached
+        result = self._run_page(input_data)
+        self.store_cached(cache_key, result.local_path)
+        return result
 
-        ocr_log_conf = os.path.join(
-            oc.PROJECT_ROOT, self.config.get(oc.CFG_SEC_OCR, 'ocrd_logging'))
+    def _page_cache_key(self, image_path) -> typing.Optional[str]:
+        """Page result depends on model config, models
+        read right-to-left, OCR-D processors and
+        container image"""
 
+        if self.result_cache is None:
+            return None
+        return self.cache_key(image_path,
+                              self.odem_process.map_language_to_modelconfig(image_path),
+                              self.config.getlist(oc.CFG_SEC_OCR, 'tesseract_model_rtl',
+                                                  fallback=oc.DEFAULT_RTL_MODELS),
+                              self.config.get(oc.CFG_SEC_OCR, 'ocrd_process_list', fallback=''),
+                              self.config.get(oc.CFG_SEC_OCR, 'ocrd_baseimage', fallback=''))
+
+    def _load_cached_page(self, cache_key, image_path) -> typing.Optional[oc.OCRResult]:
+        target_path = self._fulltext_target(_get_file_id(image_path), image_path)
+        if not self.load_cached(cache_key, target_path):
+            return None
+        self._discard_prefetched(image_path)
+        self.logger.info("[%s] use cached ocr result for '%s'",
+                         self._get_data_set_ident(), image_path)
+        image_info = self.odem_process.get_image_info(image_path)
+        result = oc.OCRResult(target_path)
+        result.images_fsize = image_info.filesize_mb
+        result.images_mps = image_info.mps
+        return result
+
+    def _run_page(self, input_data) -> oc.OCRResult:
         # Preprare workspace with makefile
         (image_path, ident) = input_data
-        os.chdir(self.odem_process.work_dir_root)
-        file_name = os.path.basename(image_path)
-        file_id = file_name.split('.')[0]
+        file_id = _get_file_id(image_path)
         page_workdir = os.path.join(self.odem_process.work_dir_root, file_id)
-        if os.path.exists(page_workdir):
-            shutil.rmtree(page_workdir, ignore_errors=True)
-        os.mkdir(page_workdir)
-        shutil.copy(ocr_log_conf, page_workdir)
-        # move and convert image data at once to new workspace
-        odem_ocrd.setup_workspace(page_workdir, image_path)
-        shutil.copy(ocr_log_conf, page_workdir)
-        os.chdir(page_workdir)
+        self._prepare_workspace(page_workdir, image_path)
 
         # find model config for tesseract
         model_config = self.odem_process.map_language_to_modelconfig(image_path)
 
         stored = oc.UNSET
-        mps = 0
-        filesize_mb = 0
-        # use original image rather than
-        # transformed one since PNG is
-        # usually 2-5 times larger than JPG
-        filestat = os.stat(image_path)
-        if filestat:
-            filesize_mb = filestat.st_size / 1048576
-        (mps, dpi) = odem_img.get_imageinfo(image_path)
-
-        # how to identify data set?
-        if self.odem_process.record:
-            _ident = self.odem_process.process_identifier
-        else:
-            _ident = os.path.basename(self.odem_process.work_dir_root)
-        # OCR Generation
-        profiling = ('n.a.', 0)
-
-        container_name: str = f'{self.odem_process.process_identifier}_{os.path.basename(page_workdir)}'
-        container_memory_limit: str = self.config.get(oc.CFG_SEC_OCR,
-                                                      'docker_container_memory_limit',
-                                                      fallback=None)
-        container_user = self.config.get(oc.CFG_SEC_OCR,
-                                         'docker_container_user', fallback=os.getuid())
-        container_timeout: int = self.config.getint(
-            oc.CFG_SEC_OCR,
-            'docker_container_timeout',
-            fallback=DEFAULT_DOCKER_CONTAINER_TIMEOUT
-        )
-        base_image = self.config.get(oc.CFG_SEC_OCR, 'ocrd_baseimage')
-        ocrd_process_list = self.config.getlist(oc.CFG_SEC_OCR, 'ocrd_process_list')
-        tesseract_model_rtl: typing.List[str] = self.config.getlist(oc.CFG_SEC_OCR,
-                                                                    'tesseract_model_rtl',
-                                                                    fallback=oc.DEFAULT_RTL_MODELS)
-        ocrd_resources_volumes: typing.Dict[str, str] = self.config.getdict(oc.CFG_SEC_OCR,
-                                                                            oc.CFG_SEC_OCR_OPT_RES_VOL,
-                                                                            fallback={})
-
-        if self.odem_process.local_mode:
-            container_name = os.path.basename(page_workdir)
+        image_info = self.odem_process.get_image_info(image_path)
+        _ident = self._get_data_set_ident()
         try:
-            profiling = odem_ocrd.run_ocr_page(
-                page_workdir,
-                base_image,
-                container_memory_limit,
-                container_timeout,
-                container_name,
-                container_user,
-                ocrd_process_list,
-                model_config,
-                ocrd_resources_volumes,
-                tesseract_model_rtl,
-            )
+            profiling = self._run_ocrd_retrying(page_workdir, image_path, model_config)
             # will be unset in case of magic mocking for test
             if profiling:
                 self.logger.info("[%s] '%s' in %s (%.1fMP, %dDPI, %.1fMB)",
-                                 _ident, profiling[1], profiling[0], mps, dpi, filesize_mb)
+                                 _ident, profiling[1], profiling[0], image_info.mps,
+                                 image_info.dpi, image_info.filesize_mb)
             self.logger.info("[%s] run ocr creation in '%s'",
                              _ident, page_workdir)
             stored = self._store_fulltext(page_workdir, image_path)
-            if stored:
+            if stored and stored != oc.UNSET:
                 self._preserve_log(page_workdir, ident)
         except subprocess.CalledProcessError as sub_exc:
             self.logger.error("[%s] image '%s' failed due to subprocess error: %s",
-                              _ident, base_image, sub_exc)
+                              _ident, image_path, sub_exc)
         except subprocess.TimeoutExpired as time_exc:
             self.logger.error("[%s] image '%s' failed due to subprocess timeout: %s",
-                              _ident, base_image, time_exc)
+                              _ident, image_path, time_exc)
         except Exception as gen_exc:
             self.logger.error("[%s] generic exc '%s' for image '%s'",
-                              _ident, gen_exc, base_image)
+                              _ident, gen_exc, image_path)
 
-        os.chdir(self.odem_process.work_dir_root)
         if self.config.getboolean(oc.CFG_SEC_OCR, 'keep_temp_orcd_data', fallback=False) is False:
             shutil.rmtree(page_workdir, ignore_errors=True)
         result = oc.OCRResult(stored)
-        result.images_fsize = filesize_mb
-        result.images_mps = mps
+        result.images_fsize = image_info.filesize_mb
+        result.images_mps = image_info.mps
         return result
 
+    def run_batch(self, batch) -> typing.List[oc.OCRResult]:
+        """Run several pages within one common OCR-D workspace
+        to spare container and workspace setup per page.
+
+        If a batch fails as a whole, it gets split in halves
+        and each half is run again, down to single pages,
+        so one troublesome page can't spoil it's neighbours.
+        Pages lacking results from an otherwise successful
+        run are re-run on their own account.
+
+        Results are returned in order of batch pages.
+        Cached pages are taken as they are."""
+
+        outcomes = {}
+        cache_keys = {}
+        for image_path, _ in batch:
+            cache_keys[image_path] = self._page_cache_key(image_path)
+            cached = self._load_cached_page(cache_keys[image_path], image_path)
+            if cached is not None:
+                outcomes[image_path] = cached
+        missing = [pair for pair in batch if pair[0] not in outcomes]
+        if missing:
+            for image_path, result in self._run_batch(missing).items():
+                self.store_cached(cache_keys[image_path], result.local_path)
+                outcomes[image_path] = result
+        return [outcomes[image_path] for image_path, _ in batch]
+
+    def _run_batch(self, batch) -> typing.Dict[str, oc.OCRResult]:
+        if len(batch) == 1:
+            return {batch[0][0]: self._run_page(batch[0])}
+
+        # pages requiring different models can't share
+        # a common 'ocrd process' call, therefore group them
+        model_configs = [self.odem_process.map_language_to_modelconfig(image_path)
+                         for image_path, _ in batch]
+        if len(set(model_configs)) > 1:
+            outcomes = {}
+            for model_config in dict.fromkeys(model_configs):
+                a_group = [pair for pair, pair_model in zip(batch, model_configs)
+                           if pair_model == model_config]
+                outcomes.update(self._run_batch(a_group))
+            return outcomes
+
+        _ident = self._get_data_set_ident()
+        batch_label = f'{_get_file_id(batch[0][0])}-{_get_file_id(batch[-1][0])}'
+        batch_workdir = os.path.join(self.odem_process.work_dir_root, batch_label)
+        self._prepare_workspace(batch_workdir, [image_path for image_path, _ in batch])
+
+        outcomes = {}
+        try:
+            profiling = self._run_ocrd(batch_workdir, model_configs[0], len(batch))
+            if profiling:
+                self.logger.info("[%s] '%s' in %s (%d pages)",
+                                 _ident, profiling[1], profiling[0], len(batch))
+            page_results = odem_ocrd.collect_page_results(batch_workdir,
+                                                          LOCAL_OCRD_RESULT_DIR)
+            for i, (image_path, _) in enumerate(batch, start=1):
+                page_result = page_results.get(odem_ocrd.WORKSPACE_PAGE_ID.format(i))
+                if page_result is None:
+                    continue
+                stored = self._export_fulltext(page_result, _get_file_id(image_path),
+                                               image_path)
+                image_info = self.odem_process.get_image_info(image_path)
+                result = oc.OCRResult(stored)
+                result.images_fsize = image_info.filesize_mb
+                result.images_mps = image_info.mps
+                outcomes[image_path] = result
+            if outcomes:
+                self._preserve_log(batch_workdir, batch_label)
+        except subprocess.CalledProcessError as sub_exc:
+            self.logger.error("[%s] batch '%s' failed due to subprocess error: %s",
+                              _ident, batch_label, sub_exc)
+        except subprocess.TimeoutExpired as time_exc:
+            self.logger.error("[%s] batch '%s' failed due to subprocess timeout: %s",
+                              _ident, batch_label, time_exc)
+        except Exception as gen_exc:
+            self.logger.error("[%s] generic exc '%s' for batch '%s'",
+                              _ident, gen_exc, batch_label)
+        finally:
+            if self.config.getboolean(oc.CFG_SEC_OCR, 'keep_temp_orcd_data', fallback=False) is False:
+                shutil.rmtree(batch_workdir, ignore_errors=True)
+
+        missing = [pair for pair in batch if pair[0] not in outcomes]
+        if len(missing) == len(batch):
+            half = len(batch) // 2
+            self.logger.warning("[%s] split failed batch '%s' into %d and %d pages",
+                                _ident, batch_label, half, len(batch) - half)
+            outcomes.update(self._run_batch(batch[:half]))
+            outcomes.update(self._run_batch(batch[half:]))
+        elif missing:
+            self.logger.warning("[%s] re-run %d pages without result from batch '%s'",
+                                _ident, len(missing), batch_label)
+            outcomes.update(self._run_batch(missing))
+        return outcomes
+
+    def _prepare_workspace(self, workdir, image_src):
+        """(Re-)create clean workspace and move
+        converted image data at once to it,
+        prefer images already converted ahead"""
+
+        ocr_log_conf = os.path.join(
+            oc.PROJECT_ROOT, self.config.get(oc.CFG_SEC_OCR, 'ocrd_logging'))
+        image_srcs = image_src if isinstance(image_src, list) else [image_src]
+        staged = [self._take_prefetched(an_image) for an_image in image_srcs]
+        try:
+            odem_ocrd.setup_workspace(workdir,
+                                      [a_stage or an_image
+                                       for a_stage, an_image in zip(staged, image_srcs)],
+                                      self.native_formats, self.png_compress_level,
+                                      self.odem_process.image_infos)
+        finally:
+            for a_stage in staged:
+                if a_stage is not None and a_stage.exists():
+                    a_stage.unlink()
+        shutil.copy(ocr_log_conf, workdir)
+
+    def prefetch(self, upcoming: typing.List):
+        """Convert images in background up to [ocr]
+        ocrd_prefetch_pages ahead of actual dispatch,
+        so executors don't wait for image encoding"""
+
+        n_ahead = self.config.getint(oc.CFG_SEC_OCR, 'ocrd_prefetch_pages', fallback=0)
+        if n_ahead < 1:
+            return
+        self._prefetch_dir.mkdir(parents=True, exist_ok=True)
+        self._prefetch_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.config.getint(oc.CFG_SEC_OCR, 'ocrd_prefetch_workers', fallback=1),
+            thread_name_prefix='odem.prefetch')
+        with self._prefetch_lock:
+            self._prefetch_queue = collections.deque(
+                str(image_path)
+                for an_input in upcoming
+                for image_path, _ in (an_input if isinstance(an_input, list) else [an_input]))
+            for _ in range(n_ahead):
+                self._prefetch_next()
+
+    def _prefetch_next(self):
+        if self._prefetch_queue and self._prefetch_executor is not None:
+            image_path = self._prefetch_queue.popleft()
+            self._prefetched[image_path] = self._prefetch_executor.submit(
+                self._stage_image, image_path)
+
+    def _stage_image(self, image_path) -> typing.Optional[Path]:
+        """Convert image into staging dir unless
+        workspace is able to take it as it is"""
+
+        the_suffix = Path(image_path).suffix.lower()
+        if the_suffix == odem_img.EXT_PNG:
+            return None
+        if the_suffix in self.native_formats and self.odem_process.get_image_info(image_path).dpi:
+            return None
+        return odem_img.ensure_format_png(image_path, self.png_compress_level,
+                                          self._prefetch_dir)
+
+    def _take_prefetched(self, image_path) -> typing.Optional[Path]:
+        """Staged image, if any, which is then owned by caller.
+        Pages not yet prefetched are dropped from queue"""
+
+        image_path = str(image_path)
+        with self._prefetch_lock:
+            a_future = self._prefetched.pop(image_path, None)
+            if a_future is None:
+                if image_path in self._prefetch_queue:
+                    self._prefetch_queue.remove(image_path)
+                return None
+            self._prefetch_next()
+        try:
+            return a_future.result()
+        except concurrent.futures.CancelledError:
+            return None
+        except Exception as exc:
+            self.logger.warning("[%s] prefetch '%s' failed: %s",
+                                self._get_data_set_ident(), image_path, exc)
+            return None
+
+    def _discard_prefetched(self, image_path):
+        staged = self._take_prefetched(image_path)
+        if staged is not None and staged.exists():
+            staged.unlink()
+
+    def _run_ocrd_retrying(self, page_workdir, image_path, model_config):
+        """Run page with up to [ocr] ocrd_page_retries retries
+        and exponential backoff, each on fresh workspace.
+
+        If container got killed due exceeding it's memory (OOM),
+        retry with escalated memory limit in a fresh container
+        within a narrow lane, so only a few such greedy pages
+        run at once, instead of repeating the same failure."""
+
+        n_retries = self.config.getint(oc.CFG_SEC_OCR, 'ocrd_page_retries', fallback=0)
+        backoff = self.config.getfloat(oc.CFG_SEC_OCR, 'ocrd_retry_backoff',
+                                       fallback=DEFAULT_RETRY_BACKOFF)
+        memory_limit = self.config.get(oc.CFG_SEC_OCR, 'docker_container_memory_limit',
+                                       fallback=None)
+        _ident = self._get_data_set_ident()
+        in_oom_lane = False
+        attempt = 0
+        while True:
+            try:
+                if in_oom_lane:
+                    with self._oom_lane:
+                        profiling = self._run_ocrd(page_workdir, model_config,
+                                                   memory_limit=memory_limit, attempt=attempt)
+                else:
+                    profiling = self._run_ocrd(page_workdir, model_config, attempt=attempt)
+                if attempt > 0:
+                    self._count_retry(RETRY_STATS_RECOVERED)
+                return profiling
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as sub_exc:
+                if attempt >= n_retries:
+                    if attempt > 0:
+                        self._count_retry(RETRY_STATS_FAILED)
+                    raise
+                attempt += 1
+                if attempt == 1:
+                    self._count_retry(RETRY_STATS_PAGES)
+                self._count_retry(RETRY_STATS_ATTEMPTS)
+                if isinstance(sub_exc, subprocess.TimeoutExpired):
+                    self._count_retry(RETRY_STATS_TIMEOUT)
+                elif sub_exc.returncode == odem_ocrd.EXIT_CODE_OOM:
+                    self._count_retry(RETRY_STATS_OOM)
+                    in_oom_lane = True
+                    memory_limit = self._escalate_memory_limit(memory_limit)
+                delay = backoff * 2 ** (attempt - 1)
+                self.logger.warning("[%s] retry %d/%d '%s' in %.1fs (memory: %s) due %s",
+                                    _ident, attempt, n_retries, image_path, delay,
+                                    memory_limit, sub_exc)
+                time.sleep(delay)
+                self._prepare_workspace(page_workdir, image_path)
+
+    def _escalate_memory_limit(self, memory_limit):
+        """Raise memory limit by configured factor, but
+        not beyond optional maximum. Keep it unset if
+        no limit has been set at all."""
+
+        if memory_limit is None:
+            return None
+        factor = self.config.getfloat(oc.CFG_SEC_OCR, 'docker_container_memory_escalation',
+                                      fallback=DEFAULT_MEMORY_ESCALATION)
+        n_bytes = int(odem_rm.parse_memory_limit(memory_limit) * factor)
+        limit_max = self.config.get(oc.CFG_SEC_OCR, 'docker_container_memory_limit_max',
+                                    fallback=None)
+        if limit_max is not None:
+            n_bytes = min(n_bytes, odem_rm.parse_memory_limit(limit_max))
+        return f"{n_bytes // 1048576}m"
+
+    def _count_retry(self, key):
+        with self._retry_lock:
+            self.retry_statistics[key] = self.retry_statistics.get(key, 0) + 1
+
+    @property
+    def statistics(self) -> typing.Dict:
+        the_stats = super().statistics
+        if self.retry_statistics:
+            the_stats[oc.STATS_KEY_RETRIES] = dict(self.retry_statistics)
+        return the_stats
+
+    def _get_data_set_ident(self):
+        """how to identify data set?"""
+
+        if self.odem_process.record:
+            return self.odem_process.process_identifier
+        return os.path.basename(self.odem_process.work_dir_root)
+
+    def _run_ocrd(self, ocr_dir, model_config, n_pages=1, memory_limit=None, attempt=0):
+        """Run configured OCR-D processors for workspace,
+        either with warm container from pool or by
+        fresh container on it's own, which is also
+        the case if explicit memory limit required.
+        Timeout scales with number of workspace pages."""
+
+        container_timeout: int = self.config.getint(
+            oc.CFG_SEC_OCR,
+            'docker_container_timeout',
+            fallback=DEFAULT_DOCKER_CONTAINER_TIMEOUT
+        ) * n_pages
+        ocrd_process_list = self.config.getlist(oc.CFG_SEC_OCR, 'ocrd_process_list')
+        tesseract_model_rtl: typing.List[str] = self.config.getlist(oc.CFG_SEC_OCR,
+                                                                    'tesseract_model_rtl',
+                                                                    fallback=oc.DEFAULT_RTL_MODELS)
+        if self.container_pool is not None and memory_limit is None:
+            return self.container_pool.run_ocr_page(
+                ocr_dir,
+                container_timeout,
+                ocrd_process_list,
+                model_config,
+                tesseract_model_rtl,
+            )
+
+        container_name: str = f'{self.odem_process.process_identifier}_{os.path.basename(ocr_dir)}'
+        if self.odem_process.local_mode:
+            container_name = os.path.basename(ocr_dir)
+        if attempt > 0:
+            # previous container might be still around
+            container_name = f'{container_name}_{attempt}'
+        container_memory_limit: str = memory_limit
+        if container_memory_limit is None:
+            container_memory_limit = self.config.get(oc.CFG_SEC_OCR,
+                                                     'docker_container_memory_limit',
+                                                     fallback=None)
+        container_user = self.config.get(oc.CFG_SEC_OCR,
+                                         'docker_container_user', fallback=os.getuid())
+        base_image = self.config.get(oc.CFG_SEC_OCR, 'ocrd_baseimage')
+        ocrd_resources_volumes: typing.Dict[str, str] = self.config.getdict(oc.CFG_SEC_OCR,
+                                                                            oc.CFG_SEC_OCR_OPT_RES_VOL,
+                                                                            fallback={})
+        return odem_ocrd.run_ocr_page(
+            ocr_dir,
+            base_image,
+            container_memory_limit,
+            container_timeout,
+            container_name,
+            container_user,
+            ocrd_process_list,
+            model_config,
+            ocrd_resources_volumes,
+            tesseract_model_rtl,
+        )
+
     def _preserve_log(self, work_subdir, image_ident):
         """preserve ocrd.log for later analyzis as
         sub directory identified by adopted local
@@ -291,48 +1131,83 @@ class OCRDPageParallel(OCRWorkflow):
         self.logger.debug("[%s] %s ocr files",
                           self.odem_process.process_identifier, ocrs)
         if ocrs and len(ocrs) == 1:
-            # propably need to rename
-            # since file now is like 'PAGE_01.xml'
-            renamed = os.path.join(ocr_result_dir, old_id + '.xml')
-            os.rename(ocrs[0], renamed)
-            # regular case: OAI Workflow
-            if not self.odem_process.local_mode:
-                # export to 'PAGE' dir
-                wd_fulltext = os.path.join(self.odem_process.work_dir_root, LOCAL_OCRD_RESULT_DIR)
-                if not os.path.exists(wd_fulltext):
-                    os.mkdir(wd_fulltext)
-
-            # special case: local runnings for straight evaluations
-            else:
-                wd_fulltext = os.path.dirname(original_image_path)
-
-            # final storage
-            target_path = os.path.join(wd_fulltext, old_id + '.xml')
-            shutil.copy(renamed, target_path)
+            return self._export_fulltext(ocrs[0], old_id, original_image_path)
+        self.logger.warning("[%s] expected single ocr file, got %s",
+                            self.odem_process.process_identifier, ocrs)
+        return oc.UNSET
+
+    def _export_fulltext(self, ocr_result_path, file_id, original_image_path) -> str:
+        """Rename OCR Result, which is like 'PAGE_01.xml',
+        by it's page and copy it to export folder"""
+
+        renamed = os.path.join(os.path.dirname(ocr_result_path), file_id + '.xml')
+        os.rename(ocr_result_path, renamed)
+        target_path = self._fulltext_target(file_id, original_image_path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.copy(renamed, target_path)
         return target_path
 
+    def _fulltext_target(self, file_id, original_image_path) -> str:
+        """Final storage of page fulltext"""
+
+        # regular case: OAI Workflow
+        # export to 'PAGE' dir
+        if not self.odem_process.local_mode:
+            wd_fulltext = os.path.join(self.odem_process.work_dir_root, LOCAL_OCRD_RESULT_DIR)
+        # special case: local runnings for straight evaluations
+        else:
+            wd_fulltext = os.path.dirname(original_image_path)
+        return os.path.join(wd_fulltext, file_id + '.xml')
+
+    def process_output(self, an_outcome: oc.OCRResult):
+        """If streaming enabled, convert and sanitize
+        each single page as soon as it's done"""
+
+        if not self.stream_outputs or an_outcome.local_path in (oc.UNSET, ""):
+            return
+        self._streamed[str(an_outcome.local_path)] = self._submit_conversion(an_outcome)
+
     def process_outputs(self, the_outcomes: typing.List[oc.OCRResult]):
         """In this case:
         * move files from dir PAGE to FULLTEXT
         * convert OCR format PAGE => ALTO
         * some additional tag stripping
+        Pages already streamed are not processed again.
+        Results keep order of outcomes.
         """
 
         n_candidates = len(self.odem_process.ocr_candidates)
         if len(the_outcomes) == 0 and n_candidates > 0:
             raise oc.ODEMException(f"No OCR result for {n_candidates} candidates created!")
+        n_streamed = len(self._streamed)
+        for an_outcome in the_outcomes:
+            if str(an_outcome.local_path) not in self._streamed:
+                self._streamed[str(an_outcome.local_path)] = self._submit_conversion(an_outcome)
+        try:
+            self.ocr_results = []
+            for an_outcome in the_outcomes:
+                alto_path = self._streamed[str(an_outcome.local_path)].result()
+                if alto_path is not None:
+                    self.ocr_results.append(oc.OCRResult(Path(alto_path),
+                                                         an_outcome.images_fsize,
+                                                         an_outcome.images_mps))
+        finally:
+            self.shutdown_postprocessing()
+        self.logger.info("[%s] converted %d ocr results to alto (%d streamed)",
+                         self.odem_process.process_identifier, len(self.ocr_results),
+                         n_streamed)
+
+    def _submit_conversion(self, an_outcome: oc.OCRResult) -> concurrent.futures.Future:
+        """Convert to ALTO and sanitize, yields path of
+        ALTO file or None if without textual content"""
+
         final_fulltext_dir = os.path.join(self.odem_process.work_dir_root,
                                           oc.FILEGROUP_FULLTEXT)
-        if not os.path.isdir(final_fulltext_dir):
-            os.makedirs(final_fulltext_dir, exist_ok=True)
-        self.ocr_results = odem_fmt.convert_to_output_format(the_outcomes, final_fulltext_dir)
-        self.logger.info("[%s] converted %d ocr results to alto",
-                         self.odem_process.process_identifier, len(self.ocr_results))
+        os.makedirs(final_fulltext_dir, exist_ok=True)
         strip_tags = self.config.getlist(oc.CFG_SEC_OCR, 'strip_tags')
-        for a_result in self.ocr_results:
-            odem_fmt.postprocess_ocr_file(a_result.local_path, strip_tags)
-        self.logger.info("[%s] postprocessed %d ocr files",
-                         self.odem_process.process_identifier, len(self.ocr_results))
+        return self.submit_postprocessing(odem_fmt.convert_and_postprocess,
+                                          str(an_outcome.local_path),
+                                          final_fulltext_dir, strip_tags)
 
 
 class ODEMTesseract(OCRWorkflow):
@@ -341,6 +1216,10 @@ class ODEMTesseract(OCRWorkflow):
     def __init__(self, odem_process: oc.ODEMProcess):
         super().__init__(odem_process)
         self.pipeline_configuration = None
+        # page results still postprocessed, by path
+        self._finalizing: typing.Dict[str, typing.Tuple[oc.OCRResult,
+                                                        concurrent.futures.Future]] = {}
+        self._finalizing_lock = threading.Lock()
 
     def get_inputs(self):
         images_4_ocr = self.odem_process.ocr_candidates
@@ -350,21 +1229,60 @@ class ODEMTesseract(OCRWorkflow):
                       for i, img in enumerate(self.odem_process.ocr_candidates, start=1)]
         return input_data
 
+    def estimate_cost(self, input_data) -> float:
+        return self.page_cost(input_data[0][0])
+
+    def input_images(self, an_input) -> typing.List[str]:
+        return [an_input[0][0]]
+
     def run(self, input_data):
 
         image_path = input_data[0][0]
-        a_result: oc.OCRResult = odem_tess.run_pipeline(input_data)
-        self.logger.debug("run_pipeline: '%s'", a_result)
-        mps = 0
-        filesize_mb = 0
-        filestat = os.stat(image_path)
-        if filestat:
-            filesize_mb = filestat.st_size / 1048576
-        (mps, _) = odem_img.get_imageinfo(image_path)
-        a_result.images_fsize = filesize_mb
-        a_result.images_mps = mps
+        cache_key = self._page_cache_key(image_path, input_data[4])
+        target_path = self._pipeline_target(image_path, input_data[4])
+        if self.load_cached(cache_key, target_path):
+            self.logger.info("[%s] use cached ocr result for '%s'",
+                             self.odem_process.process_identifier, image_path)
+            a_result = oc.OCRResult(Path(target_path))
+            cached_stats = self.cached_metadata(cache_key).get(CACHE_META_STATISTICS)
+            if cached_stats is not None:
+                a_result.statistics = tuple(cached_stats)
+        else:
+            a_result: oc.OCRResult = odem_tess.run_pipeline(input_data)
+            self.logger.debug("run_pipeline: '%s'", a_result)
+            the_meta = {}
+            if a_result.statistics:
+                the_meta[CACHE_META_STATISTICS] = list(a_result.statistics)
+            self.store_cached(cache_key, str(a_result.local_path), the_meta)
+        self._submit_finalize(a_result)
+        image_info = self.odem_process.get_image_info(image_path)
+        a_result.images_fsize = image_info.filesize_mb
+        a_result.images_mps = image_info.mps
         return a_result
 
+    def _page_cache_key(self, image_path, pipeline_cfg) -> typing.Optional[str]:
+        """Page result depends on all pipeline steps, except
+        record specific target dir of final move"""
+
+        if self.result_cache is None:
+            return None
+        steps = [f'{sect}:{key}={value}'
+                 for sect in pipeline_cfg.sections()
+                 for key, value in pipeline_cfg.items(sect)
+                 if key != odem_tess.STEP_MOVE_PATH_TARGET]
+        return self.cache_key(image_path, *steps)
+
+    @staticmethod
+    def _pipeline_target(image_path, pipeline_cfg) -> str:
+        """Pipeline ends with image's XML sibling,
+        if configured moved to target dir"""
+
+        target_dir = os.path.dirname(image_path)
+        for sect in pipeline_cfg.sections():
+            if pipeline_cfg.has_option(sect, odem_tess.STEP_MOVE_PATH_TARGET):
+                target_dir = pipeline_cfg.get(sect, odem_tess.STEP_MOVE_PATH_TARGET)
+        return os.path.join(target_dir, Path(image_path).with_suffix('.xml').name)
+
     def read_pipeline_config(self, path_config=None) -> configparser.ConfigParser:
         """Read pipeline configuration and replace
         model_configs with known language data"""
@@ -393,33 +1311,70 @@ class ODEMTesseract(OCRWorkflow):
             self.pipeline_configuration = pipe_cfg
         return self.pipeline_configuration
 
+    def _submit_finalize(self, a_result: oc.OCRResult):
+        """Postprocess page result without waiting for it,
+        moving and checkpointing follow once it's done"""
+
+        a_result.local_path = Path(a_result.local_path)
+        if not a_result.local_path.exists():
+            self.logger.warning("missing %s", a_result.local_path)
+            return
+        strip_tags = self.config.getlist(oc.CFG_SEC_OCR, 'strip_tags')
+        a_future = self.submit_postprocessing(odem_fmt.postprocess_ocr_file,
+                                              str(a_result.local_path), strip_tags)
+        with self._finalizing_lock:
+            self._finalizing[str(a_result.local_path)] = (a_result, a_future)
+
+    def _finalize_done(self, wait=False):
+        """Move page results postprocessed meanwhile to final
+        dir if configured and checkpoint them afterwards, so
+        manifest refers to final file. If wait, do so for all
+        pending ones."""
+
+        with self._finalizing_lock:
+            pending = list(self._finalizing.items())
+        for a_key, (a_result, a_future) in pending:
+            if not wait and not a_future.done():
+                continue
+            a_future.result()
+            if self.config.has_option(oc.CFG_SEC_OCR, "fulltext_subdir"):
+                a_result.local_path = a_result.move(self._final_dir())
+            self.odem_process.checkpoint(a_result)
+            with self._finalizing_lock:
+                del self._finalizing[a_key]
+
+    def _final_dir(self) -> Path:
+        pid = self.odem_process.process_identifier
+        sub_dir = self.config.get(oc.CFG_SEC_OCR, "fulltext_subdir")
+        final_dir = Path(self.odem_process.work_dir_root) / sub_dir
+        if not final_dir.is_dir():
+            self.logger.debug("[%s] create %s", pid, final_dir)
+            try:
+                final_dir.mkdir(mode=0o777, parents=True, exist_ok=True)
+            except OSError as exc:
+                self.logger.error("[%s] unable to create %s: %s", pid, final_dir, exc)
+                raise oc.ODEMException(f"unable to create {final_dir}: {exc}") from exc
+        return final_dir
+
+    def checkpoint(self, an_outcome: oc.OCRResult):
+        """Deferred until outcome has been postprocessed
+        and moved to its final location"""
+
+    def process_output(self, an_outcome: oc.OCRResult):
+        """Finalize page results whose postprocessing
+        completed while others are still running"""
+
+        self._finalize_done()
+
     def process_outputs(self, the_outcomes: typing.List[oc.OCRResult]):
-        """Additional processing to OCR results"""
+        """Wait for pending postprocessing and finalize
+        remaining results. Results restored from manifest
+        are final already."""
 
+        try:
+            self._finalize_done(wait=True)
+        finally:
+            self.shutdown_postprocessing()
         self.ocr_results = the_outcomes
-        pid = self.odem_process.process_identifier
-        strip_tags = self.config.getlist(oc.CFG_SEC_OCR, 'strip_tags')
-        self.logger.info("[%s] from %d results strip tags %s",
-                         pid, len(self.ocr_results), strip_tags)
-        for a_result in self.ocr_results:
-            if a_result.local_path.exists():
-                odem_fmt.postprocess_ocr_file(a_result.local_path, strip_tags)
-            else:
-                self.logger.warning("missing %s", a_result.local_path)
-        if self.config.has_option(oc.CFG_SEC_OCR, "fulltext_subdir"):
-            sub_dir = self.config.get(oc.CFG_SEC_OCR, "fulltext_subdir")
-            final_dir = Path(self.odem_process.work_dir_root) / sub_dir
-            self.logger.info("[%s] move %d ocr results to '%s'",
-                             pid, len(self.ocr_results), final_dir)
-            if not final_dir.is_dir():
-                self.logger.debug("[%s] create %s", pid, final_dir)
-                try:
-                    final_dir.mkdir(mode=0o777, parents=True, exist_ok=True)
-                except OSError as exc:
-                    self.logger.error("[%s] unable to create %s: %s", pid, final_dir, exc)
-                    raise oc.ODEMException(f"unable to create {final_dir}: {exc}") from exc
-            else:
-                self.logger.debug("[%s] directory %s already exists", pid, final_dir)
-            for result in self.ocr_results:
-                result.local_path = result.move(final_dir)
-        self.logger.info("[%s] postprocessed %d ocr files", pid, len(self.ocr_results))
+        self.logger.info("[%s] postprocessed %d ocr files",
+                         self.odem_process.process_identifier, len(self.ocr_results))
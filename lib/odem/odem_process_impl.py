@@ -25,7 +25,9 @@ import digiflow.digiflow_io as dfo
 import digiflow.record as df_r
 
 import lib.odem.commons as oc
+import lib.odem.processing.download as odem_download
 import lib.odem.processing.image as odem_image
+import lib.odem.processing.manifest as odem_manifest
 
 import lib.odem.processing.mets as odem_mets
 
@@ -72,8 +74,22 @@ class ODEMProcessImpl(oc.ODEMProcess):
         self.__mets_file_path: typing.Optional[Path] = None
         self.ocr_files = []
         self._process_start = time.time()
-
+        self._manifest: typing.Optional[odem_manifest.PageManifest] = None
+        self._candidate_images: typing.Dict[str, str] = {}
+        self.image_infos: typing.Dict[str, odem_image.ImageInfo] = {}
+        # images loaded in background while ocr runs
+        self.streaming = False
+        # images loaded after metadata inspection
+        self.images_deferred = False
+        # data already prefetched into work dir
+        self.preloaded = False
+        self.fct_check_disk: typing.Optional[typing.Callable[[int, int], None]] = None
+
+    @oc.timed_stage('load')
     def load(self):
+        if self.preloaded:
+            self.logger.info("[%s] use prefetched data", self.process_identifier)
+            return
         request_identifier = self.record.identifier
         local_identifier = self.record.local_identifier
         if not self.configuration.has_option(oc.CFG_SEC_FLOW,
@@ -89,24 +105,31 @@ class ODEMProcessImpl(oc.ODEMProcess):
         req_dst = self.mets_file_path
         self.logger.debug("[%s] download %s to %s",
                           self.process_identifier, request_identifier, req_dst)
+        # if streaming, images are loaded later on
+        # in background while ocr already runs
+        self.streaming = self.configuration.getboolean(oc.CFG_SEC_FLOW,
+                                                       oc.CFG_SEC_FLOW_OPT_STREAMING,
+                                                       fallback=False)
         try:
-            req_kwargs = {}
-            if self.configuration.has_option(oc.CFG_SEC_FLOW,
-                                             oc.CFG_SEC_FLOW_OPT_URL_KWARGS):
-                requests_kwargs = self.configuration.get(oc.CFG_SEC_FLOW,
-                                                         oc.CFG_SEC_FLOW_OPT_URL_KWARGS)
-                req_kwargs = {dfo.OAI_KWARG_REQUESTS: requests_kwargs}
-            load_fgroup = self.configuration.get(oc.CFG_SEC_METS,
-                                                 oc.CFG_SEC_METS_FGROUP,
-                                                 fallback=oc.DEFAULT_FGROUP)
-            req_kwargs[dfo.OAI_KWARG_FGROUP_IMG] = load_fgroup
-            loader = df.OAILoader(req_dst_dir, base_url=oai_base_url,
-                                  post_oai=dfm.extract_mets, **req_kwargs)
-            loader.store = self.store
+            loader = self._create_loader(req_dst_dir, oai_base_url)
             use_file_id = self.configuration.getboolean(oc.CFG_SEC_FLOW,
                                                         oc.CFG_SEC_FLOW_USE_FILEID,
                                                         fallback=False)
-            loader.load(request_identifier, local_dst=req_dst, use_file_id=use_file_id)
+            # if two-phase, only METS now and images
+            # of interest after metadata inspection
+            self.images_deferred = self.configuration.getboolean(
+                oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_TWO_PHASE, fallback=False)
+            # concurrent download replaces loader's own one
+            concurrent_load = self.configuration.has_option(
+                oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_DOWNLOAD_WORKERS)
+            skip_resources = self.streaming or self.images_deferred or concurrent_load
+            loader.load(request_identifier, local_dst=req_dst, use_file_id=use_file_id,
+                        skip_resources=skip_resources)
+            # loader skips existing OCR along with images
+            if skip_resources:
+                self.load_fulltext(loader, use_file_id)
+            if concurrent_load and not (self.streaming or self.images_deferred):
+                self.load_images(loader, self.image_resources())
         except df.ClientError as load_err:
             raise oc.ODEMException(load_err.args[0]) from load_err
         except df.LoadException as oai_err:
@@ -114,17 +137,179 @@ class ODEMProcessImpl(oc.ODEMProcess):
         except RuntimeError as _err:
             raise oc.ODEMException(_err.args[0]) from _err
 
-    def clear_mets_resources(self):
+    def prefetch(self):
+        """Load METS and all required images ahead of
+        processing, i.e. while worker still runs previous
+        record. Images otherwise streamed or deferred
+        are loaded as well, therefore metadata gets
+        inspected already."""
+
+        self.load()
+        if self.streaming or self.images_deferred:
+            self.inspect_metadata()
+            loader = self._create_loader(self.work_dir_root,
+                                         self.configuration.get(oc.CFG_SEC_FLOW,
+                                                                oc.CFG_SEC_FLOW_OPT_URL))
+            self.load_images(loader, self.required_image_resources())
+            self.images_deferred = False
+
+    def _create_loader(self, req_dst_dir, oai_base_url) -> df.OAILoader:
+        req_kwargs = {}
+        if self.configuration.has_option(oc.CFG_SEC_FLOW,
+                                         oc.CFG_SEC_FLOW_OPT_URL_KWARGS):
+            requests_kwargs = self.configuration.get(oc.CFG_SEC_FLOW,
+                                                     oc.CFG_SEC_FLOW_OPT_URL_KWARGS)
+            req_kwargs = {dfo.OAI_KWARG_REQUESTS: requests_kwargs}
+        load_fgroup = self.configuration.get(oc.CFG_SEC_METS,
+                                             oc.CFG_SEC_METS_FGROUP,
+                                             fallback=oc.DEFAULT_FGROUP)
+        req_kwargs[dfo.OAI_KWARG_FGROUP_IMG] = load_fgroup
+        loader = df.OAILoader(req_dst_dir, base_url=oai_base_url,
+                              post_oai=dfm.extract_mets, **req_kwargs)
+        loader.store = self.store
+        return loader
+
+    def load_fulltext(self, loader: df.OAILoader, use_file_id=False):
+        """Load files of loader's OCR file group, if any,
+        in same layout as loader does when it doesn't
+        skip resources"""
+
+        for mets_file in odem_mets.image_files(self.mets_file_path, loader.key_ocr):
+            local_path = odem_download.local_fulltext_path(
+                self.work_dir_root, loader.key_ocr, mets_file.url,
+                mets_file.file_id if use_file_id else None)
+            if self.store is not None and self.store.get(str(local_path)):
+                continue
+            loader.load_resource(mets_file.url, local_path, dfo.post_oai_store_ocr)
+            if self.store is not None:
+                self.store.put(str(local_path))
+
+    def image_resources(self) -> typing.List[odem_download.ImageResource]:
+        """Remote and local location together with size and
+        checksum, if any, of all images of configured file
+        group in METS order"""
+
+        load_fgroup = self.configuration.get(oc.CFG_SEC_METS,
+                                             oc.CFG_SEC_METS_FGROUP,
+                                             fallback=oc.DEFAULT_FGROUP)
+        use_file_id = self.configuration.getboolean(oc.CFG_SEC_FLOW,
+                                                    oc.CFG_SEC_FLOW_USE_FILEID,
+                                                    fallback=False)
+        resources = []
+        for mets_file in odem_mets.image_files(self.mets_file_path, load_fgroup):
+            local_path = odem_download.local_image_path(
+                self.work_dir_root, load_fgroup, mets_file.mime_type, mets_file.url,
+                mets_file.file_id if use_file_id else None)
+            resources.append(odem_download.ImageResource(
+                mets_file.url, str(local_path), mets_file.size,
+                mets_file.checksum, mets_file.checksum_type))
+        return resources
+
+    def _create_downloader(self, loader: df.OAILoader) -> odem_download.ConcurrentDownloader:
+        n_workers = self.configuration.getint(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_DOWNLOAD_WORKERS,
+                                              fallback=1)
+        n_per_host = self.configuration.getint(oc.CFG_SEC_FLOW,
+                                               oc.CFG_SEC_FLOW_OPT_DOWNLOAD_WORKERS_HOST,
+                                               fallback=n_workers)
+        return odem_download.ConcurrentDownloader(n_workers, n_per_host,
+                                                  loader.request_kwargs, self.logger)
+
+    def _load_image(self, downloader: odem_download.ConcurrentDownloader,
+                    resource: odem_download.ImageResource):
+        if self.store is not None and self.store.get(resource.local_path):
+            return
+        downloader.load(resource)
+        if self.store is not None:
+            self.store.put(resource.local_path)
+
+    def required_image_resources(self) -> typing.List[odem_download.ImageResource]:
+        """Images required after metadata inspection:
+        only ocr candidates or all, if Derivans needs
+        them for derivates later on"""
+
+        resources = self.image_resources()
+        if self.configuration.getboolean(oc.CFG_SEC_DERIVANS, oc.CFG_SEC_DERIVANS_ENABLED,
+                                         fallback=False):
+            return resources
+        candidate_names = {Path(image_path).name for image_path, _ in self.ocr_candidates}
+        return [a_resource for a_resource in resources
+                if Path(a_resource.local_path).name in candidate_names]
+
+    @oc.timed_stage('load')
+    def load_deferred_images(self):
+        """Second phase of two-phase load, done after
+        metadata inspection when images of interest are
+        known. Streamed images are loaded by workflow."""
+
+        if not self.images_deferred or self.streaming:
+            return
+        loader = self._create_loader(self.work_dir_root,
+                                     self.configuration.get(oc.CFG_SEC_FLOW,
+                                                            oc.CFG_SEC_FLOW_OPT_URL))
+        resources = self.required_image_resources()
+        self.logger.info("[%s] load %d of %d images", self.process_identifier,
+                         len(resources), self.process_statistics.get(oc.STATS_KEY_N_PAGES,
+                                                                      len(resources)))
+        self.load_images(loader, resources)
+        self.images_deferred = False
+
+    def load_images(self, loader: df.OAILoader,
+                    resources: typing.List[odem_download.ImageResource]):
+        """Load images concurrently, skip those
+        already matching METS SIZE or CHECKSUM"""
+
+        downloader = self._create_downloader(loader)
+        failures = downloader.load_all(resources,
+                                       lambda resource: self._load_image(downloader, resource))
+        downloader.close()
+        self.process_statistics[oc.STATS_KEY_DOWNLOAD] = downloader.statistics
+        if failures:
+            failed_names = {Path(a_path).name: a_msg for a_path, a_msg in failures.items()}
+            self.process_statistics[oc.STATS_KEY_DOWNLOAD_FAILS] = failed_names
+            raise oc.ODEMException(f"download failed for {len(failures)} images: "
+                                   f"{sorted(failed_names)}")
+
+    def start_image_stream(self) -> typing.Optional[odem_download.ImageStream]:
+        """If streaming, start loading images in background and
+        announce current ocr candidates as soon as they arrive"""
+
+        if not self.streaming:
+            return None
+        loader = self._create_loader(self.work_dir_root,
+                                     self.configuration.get(oc.CFG_SEC_FLOW,
+                                                            oc.CFG_SEC_FLOW_OPT_URL))
+        downloader = self._create_downloader(loader)
+        image_stream = odem_download.ImageStream(
+            self.required_image_resources(),
+            lambda resource: self._load_image(downloader, resource),
+            [image_path for image_path, _ in self.ocr_candidates],
+            self.configuration.getint(oc.CFG_SEC_FLOW, 'streaming_queue_size',
+                                      fallback=odem_download.DEFAULT_STREAM_QUEUE_SIZE),
+            self.fct_check_disk, self.logger, downloader.n_workers)
+        self.process_statistics[oc.STATS_KEY_DOWNLOAD] = downloader.statistics
+        image_stream.start()
+        return image_stream
+
+    def clear_mets_resources(self, keep_resumable=False):
         """Remove OAI-Resources from store or even
-        anything related to current process
+        anything related to current process.
+        If keep_resumable and resume enabled, keep
+        everything for next run to pick up completed
+        pages from manifest.
         """
 
+        if keep_resumable and self.configuration.getboolean(
+                oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_RESUME, fallback=False):
+            self.logger.info("[%s] keep %s to resume", self.process_identifier,
+                             self.work_dir_root)
+            return
         if self.store is not None:
             sweeper = df.OAIFileSweeper(self.store.dir_store_root, '.xml')
             sweeper.sweep()
         if os.path.exists(self.work_dir_root):
             shutil.rmtree(self.work_dir_root)
 
+    @oc.timed_stage('inspect_metadata')
     def inspect_metadata(self):
         insp = odem_mets.ODEMMetadataInspecteur(self.mets_file_path,
                                                 self.record.identifier,
@@ -152,6 +337,7 @@ class ODEMProcessImpl(oc.ODEMProcess):
                          insp.n_images_pages)
         self.process_statistics['host'] = socket.gethostname()
 
+    @oc.timed_stage('modify_mets_groups')
     def modify_mets_groups(self):
         """Clear METS/MODS of configured file groups"""
 
@@ -302,10 +488,91 @@ class ODEMProcessImpl(oc.ODEMProcess):
                           self.process_identifier, local_img_dir)
         for img, urn in self.ocr_candidates:
             the_file = os.path.join(local_img_dir, img)
-            if not os.path.exists(the_file):
+            # streamed images are about to come
+            if not self.streaming and not os.path.exists(the_file):
                 raise oc.ODEMException(f"[{self.process_identifier}] missing {the_file}!")
             images_of_interest.append((the_file, urn))
         self.ocr_candidates = images_of_interest
+        if not self.streaming:
+            self.probe_images()
+
+    def probe_images(self):
+        """Single pass over all candidates' image headers,
+        reused later on by scheduling, statistics and
+        workspace setup rather than opening images again"""
+
+        self.image_infos = {}
+        for image_path, _ in self.ocr_candidates:
+            try:
+                self.image_infos[str(image_path)] = odem_image.probe_image(image_path)
+            except OSError as os_err:
+                self.logger.warning("[%s] can't probe %s: %s",
+                                    self.process_identifier, image_path, os_err)
+        n_missing_dpi = len([i for i in self.image_infos.values() if i.dpi == 0])
+        self.logger.debug("[%s] probed %d images (%.1fMP total, %d without DPI)",
+                          self.process_identifier, len(self.image_infos),
+                          sum(i.mps for i in self.image_infos.values()), n_missing_dpi)
+
+    def get_image_info(self, image_path) -> odem_image.ImageInfo:
+        """Probed image features, images not probed
+        before are probed now and kept as well"""
+
+        image_info = self.image_infos.get(str(image_path))
+        if image_info is None:
+            image_info = odem_image.probe_image(image_path)
+            self.image_infos[str(image_path)] = image_info
+        return image_info
+
+    @property
+    def manifest(self) -> odem_manifest.PageManifest:
+        """Record of completed pages within work dir"""
+
+        if self._manifest is None:
+            self._manifest = odem_manifest.PageManifest(self.work_dir_root)
+        return self._manifest
+
+    def resume_ocr(self) -> typing.List[oc.OCRResult]:
+        """If resume enabled, restore results of candidates
+        completed and verified by a previous, broken run
+        and keep only the missing ones as candidates.
+        Otherwise start over with empty manifest."""
+
+        self._candidate_images = {Path(pair[0]).stem: pair[0]
+                                  for pair in self.ocr_candidates}
+        self.process_statistics[oc.STATS_KEY_N_RESUMED] = 0
+        if not self.configuration.getboolean(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_RESUME,
+                                             fallback=False):
+            self.manifest.reset()
+            return []
+        entries = self.manifest.read()
+        restored = []
+        missing = []
+        for pair in self.ocr_candidates:
+            entry = entries.get(Path(pair[0]).stem)
+            if entry is not None and self.manifest.verify(
+                    entry, self.map_language_to_modelconfig(pair[0])):
+                restored.append(oc.OCRResult(self.work_dir_root / entry.path,
+                                             entry.images_fsize, entry.images_mps))
+            else:
+                missing.append(pair)
+        self.logger.info("[%s] resume with %d completed, %d missing pages",
+                         self.process_identifier, len(restored), len(missing))
+        self.ocr_candidates = missing
+        self.process_statistics[oc.STATS_KEY_N_RESUMED] = len(restored)
+        return restored
+
+    def checkpoint(self, ocr_result: oc.OCRResult):
+        """Append completed page result to manifest"""
+
+        if ocr_result.local_path in (oc.UNSET, "") or not os.path.isfile(ocr_result.local_path):
+            return
+        page = Path(ocr_result.local_path).stem
+        image_path = self._candidate_images.get(page)
+        model_config = None
+        if image_path is not None:
+            model_config = self.map_language_to_modelconfig(image_path)
+        self.manifest.append(page, ocr_result.local_path, model_config,
+                             ocr_result.images_fsize, ocr_result.images_mps)
 
     def postprocess(self, ocr_results: typing.List[oc.OCRResult]):
         """Encapsulate after-OCR workflow"""
@@ -379,6 +646,7 @@ class ODEMProcessImpl(oc.ODEMProcess):
             if len(data_loss) > 0:
                 self.process_statistics[oc.STATS_KEY_OCR_LOSS] = list(data_loss)
 
+    @oc.timed_stage('link_ocr_files')
     def link_ocr_files(self) -> int:
         """Prepare and link OCR-data"""
 
@@ -399,6 +667,7 @@ class ODEMProcessImpl(oc.ODEMProcess):
             return 0
         return n_linked_ocr
 
+    @oc.timed_stage('create_text_bundle_data')
     def create_text_bundle_data(self):
         """create additional dspace bundle for indexing ocr text
         read ocr-file sequential according to their number label
@@ -429,6 +698,7 @@ class ODEMProcessImpl(oc.ODEMProcess):
             self.process_statistics['n_text_lines'] = len(txt_lines)
 
 
+    @oc.timed_stage('create_derivates')
     def create_derivates(self):
         """Forward PDF-creation to Derivans"""
 
@@ -518,6 +788,7 @@ class ODEMProcessImpl(oc.ODEMProcess):
             self.logger.error("[%s] permission error: can't alter derivans' mets:agents in %s",
                               self.process_identifier, self.mets_file_path)
 
+    @oc.timed_stage('validate_metadata')
     def validate_metadata(self):
         """Forward (optional) validation concerning
         METS/MODS XML-schema and/or current DDB-schematron
@@ -556,6 +827,7 @@ class ODEMProcessImpl(oc.ODEMProcess):
                                        ddb_ignores=ignore_ddb,
                                        ddb_min_level=ddb_min_level)
 
+    @oc.timed_stage('export_data')
     def export_data(self):
         """re-do metadata and transform into output format"""
 
@@ -641,13 +913,10 @@ class ODEMProcessImpl(oc.ODEMProcess):
     def compress_flat(cls, work_dir, archive_name):
         """Create flat ZIP file (instead of SAF with items)"""
         zip_file_path = os.path.join(os.path.dirname(work_dir), archive_name) + '.zip'
-        previous_dir = os.getcwd()
-        os.chdir(os.path.join(work_dir, archive_name))
         cmd = f'zip -q -r {zip_file_path} ./*'
-        subprocess.run(cmd, shell=True, check=True)
+        subprocess.run(cmd, shell=True, check=True, cwd=os.path.join(work_dir, archive_name))
         os.chmod(zip_file_path, 0o666)
         zip_size = int(os.path.getsize(zip_file_path) / 1024 / 1024)
-        os.chdir(previous_dir)
         return zip_file_path, f"{zip_size}MiB"
 
     @property
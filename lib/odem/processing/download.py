@@ -0,0 +1,337 @@
+"""Download of record resources"""
+
+import concurrent.futures
+import hashlib
+import logging
+import os
+import queue
+import threading
+import typing
+import urllib.parse
+
+from pathlib import Path
+
+import requests
+import requests.adapters
+
+import lib.odem.commons as oc
+
+# announcement of page image downloaded (True)
+# or failed (False)
+ImageAnnounce = typing.Tuple[str, bool]
+
+# max announced, but not yet consumed images
+DEFAULT_STREAM_QUEUE_SIZE = 16
+
+# seconds to wait for server
+DEFAULT_REQUEST_TIMEOUT = 20
+
+# suffix of files still being downloaded
+PARTIAL_SUFFIX = '.part'
+
+# METS CHECKSUMTYPE => hashlib
+CHECKSUM_TYPES = {
+    'MD5': 'md5',
+    'SHA-1': 'sha1',
+    'SHA-256': 'sha256',
+    'SHA-384': 'sha384',
+    'SHA-512': 'sha512',
+}
+
+DOWNLOAD_STATS_LOADED = 'loaded'
+DOWNLOAD_STATS_SKIPPED = 'skipped'
+DOWNLOAD_STATS_RESUMED = 'resumed'
+DOWNLOAD_STATS_BYTES = 'bytes'
+
+_CHUNK_SIZE = 1024 * 1024
+
+# file group name which digiflow always
+# stores with '.jpg' extension
+_FGROUP_MAX = 'MAX'
+_JPG_MIMES = ['image/jpg', 'image/jpeg']
+_EXT_JPG = '.jpg'
+_EXT_XML = '.xml'
+
+
+class ImageResource(typing.NamedTuple):
+    """Remote image with local destination and,
+    if provided by METS, it's expected size and checksum"""
+    url: str
+    local_path: str
+    size: typing.Optional[int] = None
+    checksum: typing.Optional[str] = None
+    checksum_type: typing.Optional[str] = None
+
+
+def is_complete(resource: ImageResource, local_path=None) -> bool:
+    """Local file matches expected size and checksum.
+    Files without any of them can't be verified"""
+
+    local_path = resource.local_path if local_path is None else local_path
+    if not os.path.isfile(local_path):
+        return False
+    hash_name = CHECKSUM_TYPES.get(str(resource.checksum_type).upper())
+    if resource.size is None and (resource.checksum is None or hash_name is None):
+        return False
+    if resource.size is not None and os.path.getsize(local_path) != resource.size:
+        return False
+    if resource.checksum is not None and hash_name is not None:
+        the_hash = hashlib.new(hash_name)
+        with open(local_path, 'rb') as reader:
+            for chunk in iter(lambda: reader.read(_CHUNK_SIZE), b''):
+                the_hash.update(chunk)
+        return the_hash.hexdigest().lower() == resource.checksum.lower()
+    return True
+
+
+class ConcurrentDownloader:
+    """Load images concurrently with pooled keep-alive
+    connections of a common session and at most
+    max_per_host concurrent requests per host.
+
+    Files already present matching METS SIZE and/or
+    CHECKSUM are skipped. Data is written to a partial
+    file first, which is moved into place when complete,
+    so broken downloads are resumed by HTTP range request
+    next time, if the server supports them.
+    """
+
+    def __init__(self, n_workers=4, max_per_host=None, request_kwargs=None,
+                 logger: logging.Logger = None):
+        self.n_workers = max(1, n_workers)
+        self.max_per_host = self.n_workers if max_per_host is None else max(1, max_per_host)
+        self.request_kwargs = dict(request_kwargs or {})
+        self.timeout = self.request_kwargs.pop('timeout', DEFAULT_REQUEST_TIMEOUT)
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.statistics: typing.Dict[str, int] = {
+            DOWNLOAD_STATS_LOADED: 0,
+            DOWNLOAD_STATS_SKIPPED: 0,
+            DOWNLOAD_STATS_RESUMED: 0,
+            DOWNLOAD_STATS_BYTES: 0,
+        }
+        self._session = requests.Session()
+        an_adapter = requests.adapters.HTTPAdapter(pool_connections=self.n_workers,
+                                                   pool_maxsize=self.n_workers)
+        self._session.mount('http://', an_adapter)
+        self._session.mount('https://', an_adapter)
+        self._host_slots: typing.Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.statistics[key] += value
+
+    def _host_slot(self, url) -> threading.Semaphore:
+        the_host = urllib.parse.urlparse(url).netloc
+        with self._lock:
+            if the_host not in self._host_slots:
+                self._host_slots[the_host] = threading.Semaphore(self.max_per_host)
+            return self._host_slots[the_host]
+
+    def load(self, resource: ImageResource) -> bool:
+        """Load single resource unless it's already
+        complete, which is signaled by False"""
+
+        if is_complete(resource):
+            self._count(DOWNLOAD_STATS_SKIPPED)
+            return False
+        local_path = str(resource.local_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        partial_path = local_path + PARTIAL_SUFFIX
+        n_present = os.path.getsize(partial_path) if os.path.isfile(partial_path) else 0
+        headers = dict(self.request_kwargs.get('headers', {}))
+        if n_present > 0:
+            headers['Range'] = f'bytes={n_present}-'
+        req_kwargs = {**self.request_kwargs, 'headers': headers}
+        with self._host_slot(resource.url):
+            with self._session.get(resource.url, stream=True, timeout=self.timeout,
+                                   **req_kwargs) as response:
+                if response.status_code == 416 and n_present > 0:
+                    # partial file is already complete
+                    response.close()
+                elif response.status_code >= 400:
+                    raise oc.ODEMException(f"{resource.url} status {response.status_code}")
+                else:
+                    content_type = response.headers.get('Content-Type', '')
+                    if 'text' in content_type or 'xml' in content_type:
+                        raise oc.ODEMException(f"{resource.url} unhandled content-type "
+                                               f"{content_type}")
+                    write_mode = 'wb'
+                    if response.status_code == 206 and n_present > 0:
+                        write_mode = 'ab'
+                        self._count(DOWNLOAD_STATS_RESUMED)
+                    with open(partial_path, write_mode) as writer:
+                        for chunk in response.iter_content(_CHUNK_SIZE):
+                            writer.write(chunk)
+                            self._count(DOWNLOAD_STATS_BYTES, len(chunk))
+        if (resource.size is not None or resource.checksum is not None) \
+                and not is_complete(resource, partial_path):
+            os.unlink(partial_path)
+            raise oc.ODEMException(f"{resource.url} doesn't match METS SIZE/CHECKSUM")
+        os.replace(partial_path, local_path)
+        self._count(DOWNLOAD_STATS_LOADED)
+        return True
+
+    def load_all(self, resources: typing.List[ImageResource],
+                 fct_load: typing.Callable[[ImageResource], typing.Any] = None
+                 ) -> typing.Dict[str, str]:
+        """Load all resources concurrently, optionally by
+        wrapping fct_load, return failures by local path"""
+
+        fct_load = self.load if fct_load is None else fct_load
+        failures = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.n_workers,
+                                                   thread_name_prefix='odem.download'
+                                                   ) as executor:
+            futures = {executor.submit(fct_load, a_resource): a_resource
+                       for a_resource in resources}
+            for a_future in concurrent.futures.as_completed(futures):
+                a_resource = futures[a_future]
+                try:
+                    a_future.result()
+                except Exception as load_exc:
+                    self.logger.error("download %s to %s failed: %s",
+                                      a_resource.url, a_resource.local_path, load_exc)
+                    failures[str(a_resource.local_path)] = str(load_exc)
+        return failures
+
+    def close(self):
+        """Release pooled connections"""
+
+        self._session.close()
+
+
+def local_image_path(dir_local, file_group, file_type, url, file_id=None) -> Path:
+    """Local path for image resource of given file group,
+    same layout as digiflow.OAILoader uses: final URL token
+    or file ID, if provided, with '.jpg' extension enforced
+    for JPEG mime types and file group 'MAX'"""
+
+    url_final_token = url.split('/')[-1]
+    if file_id is not None:
+        url_final_token = file_id
+    res_path = os.path.join(str(dir_local), file_group, url_final_token)
+    if (file_type in _JPG_MIMES or file_group == _FGROUP_MAX) \
+            and not res_path.endswith(_EXT_JPG):
+        res_path += _EXT_JPG
+    return Path(res_path)
+
+
+def local_fulltext_path(dir_local, file_group, url, file_id=None) -> Path:
+    """Local path for OCR resource of given file group,
+    same layout as digiflow.OAILoader uses: final URL token
+    or file ID, if provided, with '.xml' extension enforced"""
+
+    url_final_token = url.split('/')[-1]
+    if file_id is not None:
+        url_final_token = file_id
+    res_path = os.path.join(str(dir_local), file_group, url_final_token)
+    if not res_path.endswith(_EXT_XML):
+        res_path += _EXT_XML
+    return Path(res_path)
+
+
+class ImageStream:
+    """Download images in background, in order with
+    n_workers concurrent downloads, and announce each one
+    on a bounded queue as soon as it's on disk, so consumers
+    may start with first pages while the rest of the record
+    is still loading.
+
+    Only images of interest are announced, all others are
+    loaded anyway. Producer blocks as long as queue is full,
+    therefore download stays within queue size ahead of
+    consumption. Failures are kept per image and announced
+    as well. Exceptions raised by disk check are fatal,
+    stop all downloads and are kept as error. End of stream
+    is announced by None.
+    """
+
+    def __init__(self, resources: typing.List[ImageResource],
+                 fct_load: typing.Callable[[ImageResource], typing.Any],
+                 announce: typing.Iterable[str],
+                 queue_size=DEFAULT_STREAM_QUEUE_SIZE,
+                 fct_check_disk: typing.Callable[[int, int], None] = None,
+                 logger: logging.Logger = None,
+                 n_workers=1):
+        self.resources = resources
+        self.fct_load = fct_load
+        self.n_workers = max(1, n_workers)
+        self.announce = {str(a_path) for a_path in announce}
+        self.fct_check_disk = fct_check_disk
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.failures: typing.Dict[str, str] = {}
+        self.error: typing.Optional[BaseException] = None
+        self.n_loaded = 0
+        self.bytes_loaded = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._stopped = threading.Event()
+        self._aborted = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        """Start downloading in background"""
+
+        self._thread = threading.Thread(target=self._load_all, name='odem.download',
+                                        daemon=True)
+        self._thread.start()
+
+    def _load_all(self):
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.n_workers,
+                                                       thread_name_prefix='odem.download'
+                                                       ) as executor:
+                for a_resource in self.resources:
+                    executor.submit(self._load_one, a_resource)
+        finally:
+            self._put(None)
+
+    def _load_one(self, resource: ImageResource):
+        if self._stopped.is_set() or self._aborted.is_set():
+            return
+        local_path = str(resource.local_path)
+        try:
+            self.fct_load(resource)
+            with self._lock:
+                self.bytes_loaded += os.path.getsize(local_path)
+                self.n_loaded += 1
+        except Exception as load_exc:
+            self.logger.error("download %s to %s failed: %s",
+                              resource.url, local_path, load_exc)
+            with self._lock:
+                self.failures[local_path] = str(load_exc)
+        if local_path in self.announce:
+            self._put((local_path, local_path not in self.failures))
+        if self.fct_check_disk is not None:
+            with self._lock:
+                if self.n_loaded == 0 or self._aborted.is_set():
+                    return
+                bytes_projected = self.bytes_loaded * len(self.resources) // self.n_loaded
+                try:
+                    self.fct_check_disk(self.bytes_loaded, bytes_projected)
+                except Exception as exc:
+                    self.error = exc
+                    self._aborted.set()
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, timeout=None) -> typing.Optional[ImageAnnounce]:
+        """Next announced image or None at end of stream.
+        Raises queue.Empty if nothing arrived in time."""
+
+        return self._queue.get(timeout=timeout)
+
+    def stop(self):
+        """Stop downloads and wait for producer to quit"""
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,6 +1,7 @@
 """Image related processings"""
 
 import os
+import typing
 
 from pathlib import Path
 
@@ -12,12 +13,67 @@ EXT_JPEG = '.jpeg'
 EXT_PNG = '.png'
 EXT_TIF = '.tif'
 IMAGE_EXTS = [EXT_JPG, EXT_JPEG, EXT_PNG, EXT_TIF]
+MIME_TYPES = {
+    EXT_JPG: 'image/jpeg',
+    EXT_JPEG: 'image/jpeg',
+    EXT_PNG: 'image/png',
+    EXT_TIF: 'image/tiff',
+}
 
 # default resolution if not provided
 # for both dimensions
 DEFAULT_DPI = (300, 300)
 
 
+# bits per sample for PIL image modes
+# other than those with 8 bit samples
+MODE_BIT_DEPTHS = {
+    '1': 1,
+    'I': 32,
+    'F': 32,
+    'I;16': 16,
+    'I;16B': 16,
+    'I;16L': 16,
+    'I;16N': 16,
+}
+
+
+class ImageInfo(typing.NamedTuple):
+    """Image features as provided by header"""
+    file_size: int
+    width: int
+    height: int
+    dpi: int
+    mode: str
+    bit_depth: int
+
+    @property
+    def mps(self) -> float:
+        """Megapixels"""
+        return (self.width * self.height) / 1000000
+
+    @property
+    def filesize_mb(self) -> float:
+        """File size in MB"""
+        return self.file_size / 1048576
+
+
+def probe_image(path_image) -> ImageInfo:
+    """Read image features from JPEG/PNG/TIFF header
+    without decoding pixel data, since PIL opens
+    images lazy. Rounding avoids fraction values
+    like 299.xxx, missing resolution means 0 DPI"""
+
+    file_size = os.path.getsize(path_image)
+    with Image.open(path_image) as imag:
+        (width, height) = imag.size
+        dpi = 0
+        if 'dpi' in imag.info:
+            dpi = round(imag.info['dpi'][0])
+        mode = imag.mode
+    return ImageInfo(file_size, width, height, dpi, mode, MODE_BIT_DEPTHS.get(mode, 8))
+
+
 def get_imageinfo(path_img_dir):
     """Calculate image features and avoid
     fraction values like 299.xxx via rounding
@@ -26,18 +82,28 @@ def get_imageinfo(path_img_dir):
     mps = 0
     dpi = 0
     if os.path.exists(path_img_dir):
-        imag = Image.open(path_img_dir)
-        (width, height) = imag.size
-        mps = (width * height) / 1000000
-        if 'dpi' in imag.info:
-            dpi = round(imag.info['dpi'][0])
+        image_info = probe_image(path_img_dir)
+        mps = image_info.mps
+        dpi = image_info.dpi
     return mps, dpi
 
 
-def ensure_format_png(image_file_path ):
+def has_dpi(path_image) -> bool:
+    """Inspect image header only whether
+    resolution is provided at all"""
+
+    with Image.open(path_image) as imag:
+        return 'dpi' in imag.info
+
+
+def ensure_format_png(image_file_path, compress_level=None, output_dir=None):
     """Preprocess image data
     * sanitze file extension if missing due download
     * enforce png format with DPI set in both dimensions
+    * optional PNG zlib compress level 0-9, where lower
+      levels are way faster at the cost of larger files
+      (default: PIL default 6)
+    * optional output dir (default: image dir)
     """
 
     # sanitize
@@ -50,7 +116,12 @@ def ensure_format_png(image_file_path ):
     if 'dpi' in input_image.info:
         res_dpi = tuple(int(d) for d in input_image.info["dpi"])
     output_path = image_file_path.with_suffix(EXT_PNG) #.parent / image_file_path.name
-    input_image.save(output_path, format='png', dpi=res_dpi)
+    if output_dir is not None:
+        output_path = Path(output_dir) / output_path.name
+    save_kwargs = {}
+    if compress_level is not None:
+        save_kwargs['compress_level'] = compress_level
+    input_image.save(output_path, format='png', dpi=res_dpi, **save_kwargs)
     return output_path
 
 
@@ -0,0 +1,114 @@
+"""Crash-safe record of completed pages"""
+
+import hashlib
+import json
+import os
+import threading
+import typing
+
+from pathlib import Path
+
+MANIFEST_FILE_NAME = 'odem_manifest.jsonl'
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ManifestEntry(typing.NamedTuple):
+    """Completed page output"""
+    page: str
+    path: str
+    size: int
+    sha256: str
+    model_config: str
+    images_fsize: float
+    images_mps: float
+
+
+def hash_file(file_path, the_hash=None):
+    """Feed file contents chunk-wise into the_hash,
+    new sha256 if none given, and return it for
+    further updates"""
+
+    if the_hash is None:
+        the_hash = hashlib.sha256()
+    with open(file_path, 'rb') as reader:
+        for chunk in iter(lambda: reader.read(_HASH_CHUNK_SIZE), b''):
+            the_hash.update(chunk)
+    return the_hash
+
+
+def calculate_sha256(file_path) -> str:
+    """Hash file contents chunk-wise"""
+
+    return hash_file(file_path).hexdigest()
+
+
+class PageManifest:
+    """Append-only manifest of pages whose OCR output is
+    complete, stored as JSON lines within record work dir.
+
+    Each entry is flushed and synced to disk at once,
+    therefore at most the very last line is broken if
+    the worker dies, which is ignored on reading.
+    Paths are stored relative to work dir.
+    """
+
+    def __init__(self, work_dir, file_name=MANIFEST_FILE_NAME):
+        self.work_dir = Path(work_dir)
+        self.path = self.work_dir / file_name
+        self._lock = threading.Lock()
+
+    def append(self, page, output_path, model_config,
+               images_fsize=-1, images_mps=-1) -> ManifestEntry:
+        """Record output of page as completed"""
+
+        output_path = Path(output_path)
+        entry = ManifestEntry(
+            page=page,
+            path=os.path.relpath(output_path, self.work_dir),
+            size=output_path.stat().st_size,
+            sha256=calculate_sha256(output_path),
+            model_config=model_config,
+            images_fsize=images_fsize,
+            images_mps=images_mps,
+        )
+        line = json.dumps(entry._asdict()) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as writer:
+                writer.write(line)
+                writer.flush()
+                os.fsync(writer.fileno())
+        return entry
+
+    def read(self) -> typing.Dict[str, ManifestEntry]:
+        """Latest entry for each page, broken lines skipped"""
+
+        entries = {}
+        if not self.path.is_file():
+            return entries
+        with open(self.path, encoding='utf-8') as reader:
+            for line in reader:
+                try:
+                    entry = ManifestEntry(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                entries[entry.page] = entry
+        return entries
+
+    def verify(self, entry: ManifestEntry, model_config) -> bool:
+        """Output still exists unchanged and has been
+        created with same model configuration"""
+
+        output_path = self.work_dir / entry.path
+        if entry.model_config != model_config or not output_path.is_file():
+            return False
+        if output_path.stat().st_size != entry.size:
+            return False
+        return calculate_sha256(output_path) == entry.sha256
+
+    def reset(self):
+        """Drop all entries"""
+
+        with self._lock:
+            if self.path.exists():
+                self.path.unlink()
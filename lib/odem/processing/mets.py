@@ -318,6 +318,40 @@ def _log_types_for_page(phys_id, structmap_links, log_conts):
     return _log_linked_types
 
 
+class METSImageFile(typing.NamedTuple):
+    """Image file entry of METS fileSec with
+    optional SIZE and CHECKSUM attributes"""
+    file_id: str
+    mime_type: str
+    url: str
+    size: typing.Optional[int] = None
+    checksum: typing.Optional[str] = None
+    checksum_type: typing.Optional[str] = None
+
+
+def image_files(mets_file, use_fgroup) -> typing.List[METSImageFile]:
+    """Gather image files of file group in METS order,
+    missing MIMETYPE defaults to JPG like digiflow does.
+    Works for any other file group, i.e. OCR, as well"""
+
+    mets_root = ET.parse(str(mets_file)).getroot()
+    files = []
+    for a_file in mets_root.findall(f'.//mets:fileGrp[@USE="{use_fgroup}"]/mets:file', df.XMLNS):
+        flocat = a_file.find('mets:FLocat', df.XMLNS)
+        if flocat is None:
+            continue
+        size = a_file.get('SIZE')
+        files.append(METSImageFile(
+            file_id=a_file.get('ID'),
+            mime_type=a_file.get('MIMETYPE', 'image/jpg'),
+            url=flocat.get(Q_XLINK_HREF),
+            size=int(size) if size is not None and size.isdigit() else None,
+            checksum=a_file.get('CHECKSUM'),
+            checksum_type=a_file.get('CHECKSUMTYPE'),
+        ))
+    return files
+
+
 def clear_filegroups(xml_file, removals):
     """Drop existing file group entries
     and unlink them properly like
@@ -11,8 +11,6 @@ import lxml.etree as ET
 import digiflow as df
 import ocrd_page_to_alto.convert as opta_c
 
-import lib.odem.commons as oc
-
 # very common separator '⸗'
 DOUBLE_OBLIQUE_HYPHEN = '\u2E17'
 # "Geviertstrich": '—'
@@ -91,23 +89,23 @@ def postprocess_ocr_file(ocr_file, strip_tags):
     xml_proc.write()
 
 
-def convert_to_output_format(ocr_results: typing.List[oc.OCRResult], dst_dir):
-    """Convert created OCR-Files to required presentation
-    format (i.e. ALTO)
-    """
+def convert_and_postprocess(ocr_file, dst_dir, strip_tags) -> typing.Optional[str]:
+    """Convert single OCR-File to ALTO within dst_dir and
+    sanitize it afterwards. Return path of converted file
+    or None if no textual content at all.
+
+    Plain arguments and return value only, since it's meant
+    to run in worker processes."""
 
-    converted_files = []
-    for a_result in ocr_results:
-        the_id = os.path.basename(a_result.local_path)
-        output_file = os.path.join(dst_dir, the_id)
-        converted = opta_c.OcrdPageAltoConverter(page_filename=a_result.local_path).convert()
-        conv_str = str(converted)
-        if conv_str.count(_ALTO_CONTENT) == 0:
-            continue # file contains no content, skip it
-        with open(output_file, 'w', encoding='utf-8') as output:
-            output.write(conv_str)
-        converted_files.append(a_result)
-    return converted_files
+    the_id = os.path.basename(ocr_file)
+    output_file = os.path.join(dst_dir, the_id)
+    conv_str = str(opta_c.OcrdPageAltoConverter(page_filename=ocr_file).convert())
+    if conv_str.count(_ALTO_CONTENT) == 0:
+        return None
+    with open(output_file, 'w', encoding='utf-8') as output:
+        output.write(conv_str)
+    postprocess_ocr_file(output_file, strip_tags)
+    return output_file
 
 
 def _is_completely_punctuated(a_string):
@@ -0,0 +1,171 @@
+"""Content-addressed cache of OCR results"""
+
+import collections
+import json
+import os
+import shutil
+import tempfile
+import threading
+import typing
+
+from pathlib import Path
+
+import lib.odem.processing.manifest as odem_manifest
+
+CACHE_STATS_HITS = 'hits'
+CACHE_STATS_MISSES = 'misses'
+CACHE_STATS_STORED = 'stored'
+CACHE_STATS_EVICTED = 'evicted'
+
+_TMP_PREFIX = '.tmp_'
+_META_SUFFIX = '.json'
+
+
+class OCRResultCache:
+    """Size-bounded cache of OCR output files, addressed by
+    hash of image bytes together with everything else which
+    determines the result, i.e. model configuration, OCR-D
+    processors or pipeline steps and container image.
+
+    Entries are evicted least recently used first, where
+    usage is tracked by file modification time, therefore
+    the order persists for following processes sharing
+    the same cache directory. Entries are written to a
+    temporary file first and then moved into place, so
+    readers never see partial results. Entries may carry
+    metadata, i.e. statistics of the run creating them,
+    kept next to them and evicted along with them.
+    """
+
+    def __init__(self, cache_dir, max_size: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.statistics: typing.Dict[str, int] = {
+            CACHE_STATS_HITS: 0,
+            CACHE_STATS_MISSES: 0,
+            CACHE_STATS_STORED: 0,
+            CACHE_STATS_EVICTED: 0,
+        }
+        self._lock = threading.Lock()
+        self._entries: typing.OrderedDict[str, int] = collections.OrderedDict()
+        self._total_size = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for a_file in self.cache_dir.glob('*/*'):
+            if a_file.name.startswith(_TMP_PREFIX) or a_file.name.endswith(_META_SUFFIX) \
+                    or not a_file.is_file():
+                continue
+            a_stat = a_file.stat()
+            found.append((a_stat.st_mtime, a_file.name, a_stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_size += size
+
+    @property
+    def total_size(self) -> int:
+        """Sum of entries' sizes in bytes"""
+        return self._total_size
+
+    def _entry_path(self, key) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _meta_path(self, key) -> Path:
+        return self.cache_dir / key[:2] / f'{key}{_META_SUFFIX}'
+
+    @staticmethod
+    def create_key(image_path, *parts) -> str:
+        """Hash image contents with additional
+        parts determining the OCR result"""
+
+        the_hash = odem_manifest.hash_file(image_path)
+        for a_part in parts:
+            the_hash.update(b'\0')
+            the_hash.update(str(a_part).encode('utf-8'))
+        return the_hash.hexdigest()
+
+    def get(self, key, dst_path) -> bool:
+        """Copy cached entry to dst_path if present"""
+
+        entry_path = self._entry_path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.statistics[CACHE_STATS_MISSES] += 1
+                return False
+            self._entries.move_to_end(key)
+        try:
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            shutil.copyfile(entry_path, dst_path)
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # removed by another process sharing the cache
+            with self._lock:
+                self._drop(key)
+                self.statistics[CACHE_STATS_MISSES] += 1
+            return False
+        with self._lock:
+            self.statistics[CACHE_STATS_HITS] += 1
+        return True
+
+    def metadata(self, key) -> typing.Dict:
+        """Metadata stored along with entry, if any"""
+
+        try:
+            with open(self._meta_path(key), encoding='utf-8') as reader:
+                return json.load(reader)
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, key, src_path, metadata: typing.Dict = None):
+        """Store copy of src_path, evicting least recently
+        used entries if cache exceeds it's size limit.
+        Files larger than the limit itself are skipped."""
+
+        size = os.path.getsize(src_path)
+        if size > self.max_size:
+            return
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(exist_ok=True)
+        # metadata first, entry must not be seen without it
+        if metadata:
+            self._write_atomic(self._meta_path(key),
+                               lambda tmp_path: Path(tmp_path).write_text(
+                                   json.dumps(metadata), encoding='utf-8'))
+        self._write_atomic(entry_path,
+                           lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = size
+            self._total_size += size
+            self.statistics[CACHE_STATS_STORED] += 1
+            self._evict()
+
+    @staticmethod
+    def _write_atomic(dst_path: Path, fct_write):
+        tmp_fd, tmp_path = tempfile.mkstemp(prefix=_TMP_PREFIX, dir=dst_path.parent)
+        os.close(tmp_fd)
+        try:
+            fct_write(tmp_path)
+            os.replace(tmp_path, dst_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _drop(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_size -= size
+
+    def _evict(self):
+        while self._total_size > self.max_size and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_size -= size
+            for a_path in (self._entry_path(key), self._meta_path(key)):
+                try:
+                    a_path.unlink()
+                except FileNotFoundError:
+                    pass
+            self.statistics[CACHE_STATS_EVICTED] += 1
@@ -0,0 +1,1013 @@
+"""Record store backed by SQLite with the same API as
+digiflow's file based record list handler"""
+
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import http.server
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import typing
+
+from pathlib import Path
+
+import requests
+
+import digiflow.record as df_r
+
+import lib.odem.commons as oc
+import lib.odem.monitoring.datatypes as odem_mdt
+import lib.odem.monitoring.metrics as odem_metrics
+
+# record lists with these suffixes are SQLite stores,
+# any other is considered to be a plain list file
+SQLITE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+
+# plain record list files reported by metrics
+LIST_SUFFIXES = ('.csv', '.tsv')
+
+# seconds to wait for lock held by other process
+DEFAULT_BUSY_TIMEOUT = 30
+
+# max writes coalesced into single commit
+DEFAULT_BATCH_SIZE = 256
+
+# seconds leased records remain with client
+# without heartbeat before they are reclaimed
+DEFAULT_LEASE_SECONDS = 600
+
+COMMAND_LEASE = 'lease'
+COMMAND_HEARTBEAT = 'heartbeat'
+COMMAND_METRICS = 'metrics'
+X_HEADER_LEASE_COUNT = 'X-LEASE-COUNT'
+X_HEADER_LEASE_SECONDS = 'X-LEASE-SECONDS'
+X_HEADER_LEASE_OWNER = 'X-LEASE-OWNER'
+X_HEADER_WORKER_CORES = 'X-WORKER-CORES'
+X_HEADER_WORKER_MEMORY = 'X-WORKER-MEMORY'
+X_HEADER_WORKER_DISK = 'X-WORKER-DISK'
+
+# order in which records fitting worker's
+# capacity are assigned: list order, least
+# megapixels first or earliest deadline first
+POLICY_FIFO = 'fifo'
+POLICY_SMALLEST = 'smallest'
+POLICY_DEADLINE = 'deadline'
+POLICIES = (POLICY_FIFO, POLICY_SMALLEST, POLICY_DEADLINE)
+
+# estimates of record's needs from size hints:
+# disk for images and derivates per image byte,
+# memory per megapixel of page in flight and
+# megapixels or image bytes of page if only page
+# count known, pages of record without any hints
+DISK_PER_IMAGE_BYTE = 2
+MEMORY_PER_MEGAPIXEL = 64 * 1024 * 1024
+MEGAPIXELS_PER_PAGE = 10
+IMAGE_BYTES_PER_PAGE = 8 * 1024 * 1024
+PAGES_PER_RECORD = 300
+
+# size hints columns of record list file
+HINT_PAGES = 'PAGES'
+HINT_BYTES = 'BYTES'
+HINT_MEGAPIXELS = 'MEGAPIXELS'
+HINT_DEADLINE = 'DEADLINE'
+
+_SQL_CREATE = (
+    "CREATE TABLE IF NOT EXISTS schema_fields ("
+    " position INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+    # position keeps order of record list
+    "CREATE TABLE IF NOT EXISTS records ("
+    " position INTEGER PRIMARY KEY,"
+    " identifier TEXT NOT NULL UNIQUE,"
+    " state TEXT NOT NULL,"
+    " state_time TEXT NOT NULL,"
+    " data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_records_state ON records (state, position)",
+)
+
+# lease and size hint columns,
+# added to stores created without
+_EXTRA_COLUMNS = {
+    'lease_owner': 'TEXT',
+    'lease_until': 'REAL',
+    'leased_from': 'TEXT',
+    'n_pages': 'INTEGER',
+    'image_bytes': 'INTEGER',
+    'megapixels': 'REAL',
+    'deadline': 'TEXT',
+}
+# records without hints are assigned last
+_SQL_COST = f"COALESCE(megapixels, n_pages * {MEGAPIXELS_PER_PAGE}, 1e18)"
+_SQL_DEADLINE = "COALESCE(deadline, '~')"
+_SQL_ORDER = {
+    POLICY_FIFO: "position",
+    POLICY_SMALLEST: f"{_SQL_COST}, position",
+    POLICY_DEADLINE: f"{_SQL_DEADLINE}, position",
+}
+_SQL_CREATE_EXTRA_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_records_lease ON records (lease_until)",
+    f"CREATE INDEX IF NOT EXISTS idx_records_cost ON records (state, {_SQL_COST}, position)",
+    "CREATE INDEX IF NOT EXISTS idx_records_deadline"
+    f" ON records (state, {_SQL_DEADLINE}, position)",
+)
+# records must fit worker's capacity, missing
+# hints are assumed conservatively, i.e. as many
+# pages in flight as cores if page count unknown
+_SQL_FITS = (
+    f" AND COALESCE(image_bytes, COALESCE(n_pages, {PAGES_PER_RECORD}) * {IMAGE_BYTES_PER_PAGE})"
+    " * :disk_factor <= :disk_free"
+    f" AND COALESCE(megapixels / NULLIF(n_pages, 0), {MEGAPIXELS_PER_PAGE})"
+    " * :memory_factor * MIN(COALESCE(n_pages, :cores), :cores) <= :memory_available"
+)
+
+
+def size_hints_from_info(info) -> typing.Dict:
+    """Size hints from statistics reported by
+    worker for record processed before. Sizes of
+    pages OCR'd are extrapolated to all images
+    of record found by METS inspection."""
+
+    hints = {}
+    if not isinstance(info, dict):
+        return hints
+    n_pages = None
+    if oc.STATS_KEY_N_PAGES in info:
+        n_pages = hints['n_pages'] = int(info[oc.STATS_KEY_N_PAGES])
+    ocr_mps = info.get(oc.STATS_KEY_MPS)
+    if not isinstance(ocr_mps, (list, tuple)):
+        ocr_mps = []
+    n_ocr = sum(int(n) for _, n in ocr_mps)
+    scale = n_pages / n_ocr if n_pages and n_ocr else 1.0
+    downloaded = info.get(oc.STATS_KEY_DOWNLOAD)
+    if isinstance(downloaded, dict) and downloaded.get('bytes'):
+        hints['image_bytes'] = int(downloaded['bytes'])
+    elif oc.STATS_KEY_MB in info:
+        hints['image_bytes'] = int(float(info[oc.STATS_KEY_MB]) * 1024 * 1024 * scale)
+    if ocr_mps:
+        hints['megapixels'] = sum(float(mps) * int(n) for mps, n in ocr_mps) * scale
+    return hints
+
+
+def is_record_store(data_path) -> bool:
+    """Record list is SQLite store"""
+
+    return Path(data_path).suffix.lower() in SQLITE_SUFFIXES
+
+
+def open_record_handler(data_path, **kwargs):
+    """Handler for record list at data_path, either
+    SQLite store or digiflow's file based handler"""
+
+    if is_record_store(data_path):
+        return SQLiteRecordHandler(data_path, **kwargs)
+    return df_r.RecordHandler(data_path, **kwargs)
+
+
+class SQLiteRecordHandler:
+    """Record list kept in SQLite database with identifier
+    and state indexed, so looking up next open record and
+    saving states stays cheap for huge lists, unlike plain
+    list files, which are scanned and completely rewritten.
+
+    Taking next record and marking it with new state is a
+    single transaction, therefore concurrent threads and
+    processes sharing the store never get the same record.
+    Records may also be leased in batches, then they return
+    to their previous state when lease expires, unless it's
+    renewed by heartbeat or record's state is saved.
+
+    If worker's capacity is given, records are picked by
+    policy among those with size hints fitting into it,
+    where missing hints are assumed conservatively from
+    defaults. Each record must fit alone,
+    since records of a batch are processed one by one.
+
+    With batch_writes, writes of concurrent threads are
+    queued and coalesced into a single fsync'd commit by
+    a writer thread, each one within it's own savepoint.
+    Callers return only after their write is committed.
+    Provides same API as digiflow.record.RecordHandler,
+    except for merges and frames, which remain with list
+    files to be imported and exported.
+    """
+
+    def __init__(self, data_path, data_fields=None,
+                 ident_col=0,
+                 mark_open=df_r.UNSET_LABEL, mark_lock='busy',
+                 transform_func=df_r.row_to_record,
+                 create=False, batch_writes=False, batch_size=DEFAULT_BATCH_SIZE):
+        self.data_path = str(data_path)
+        if not create and not os.path.isfile(self.data_path):
+            raise FileNotFoundError(f"no record store {self.data_path}")
+        self.mark = {'open': mark_open, 'lock': mark_lock}
+        self.transform_func = transform_func
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.data_path, timeout=DEFAULT_BUSY_TIMEOUT,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # fsync each commit, even in WAL mode
+        self._conn.execute("PRAGMA synchronous=FULL")
+        for a_statement in _SQL_CREATE:
+            self._conn.execute(a_statement)
+        self._add_columns()
+        self.schema = [r[0] for r in self._conn.execute(
+            "SELECT name FROM schema_fields ORDER BY position")]
+        if data_fields:
+            if not self.schema:
+                self._set_schema(data_fields)
+            elif self.schema != list(data_fields):
+                msg = f"invalid fields: '{self.schema}', expect: '{data_fields}'"
+                raise df_r.RecordHandlerException(msg)
+        if not self.schema:
+            raise df_r.RecordHandlerException("Cant set valid schema")
+        self.ident_col = ident_col
+        self._set_fields()
+        self.batch_size = max(1, batch_size)
+        self.n_writes = 0
+        self.n_commits = 0
+        self._pending: queue.Queue = queue.Queue()
+        self._writer: typing.Optional[threading.Thread] = None
+        if batch_writes:
+            self._writer = threading.Thread(target=self._write_batches,
+                                            name='odem.store.writer', daemon=True)
+            self._writer.start()
+
+    def _add_columns(self):
+        present = {r[1] for r in self._conn.execute("PRAGMA table_info(records)")}
+        for a_column, a_type in _EXTRA_COLUMNS.items():
+            if a_column not in present:
+                self._conn.execute(f"ALTER TABLE records ADD COLUMN {a_column} {a_type}")
+        for a_statement in _SQL_CREATE_EXTRA_INDEXES:
+            self._conn.execute(a_statement)
+
+    def _set_schema(self, data_fields):
+        with self._transaction() as conn:
+            conn.executemany("INSERT INTO schema_fields (position, name) VALUES (?, ?)",
+                             enumerate(data_fields))
+        self.schema = list(data_fields)
+
+    def _set_fields(self):
+        self.ident_field = self.schema[self.ident_col]
+        self.state_field = self.schema[-2]
+        self.state_ts_field = self.schema[-1]
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Write lock store right from the start, so
+        nobody else reads state about to be changed"""
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _write(self, fct_write: typing.Callable[[sqlite3.Connection], typing.Any]):
+        """Run fct_write within transaction, queued for
+        next batch commit, if writes are batched"""
+
+        if self._writer is None:
+            with self._transaction() as conn:
+                result = fct_write(conn)
+            self.n_writes += 1
+            self.n_commits += 1
+            return result
+        a_future = concurrent.futures.Future()
+        self._pending.put((fct_write, a_future))
+        return a_future.result()
+
+    def _write_batches(self):
+        stopped = False
+        while not stopped:
+            a_write = self._pending.get()
+            if a_write is None:
+                break
+            batch = [a_write]
+            while len(batch) < self.batch_size:
+                try:
+                    a_write = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if a_write is None:
+                    stopped = True
+                    break
+                batch.append(a_write)
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        outcomes = []
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                for fct_write, a_future in batch:
+                    self._conn.execute("SAVEPOINT batch_write")
+                    try:
+                        outcomes.append((a_future, fct_write(self._conn), None))
+                    except Exception as write_exc:  # pylint:disable=broad-exception-caught
+                        self._conn.execute("ROLLBACK TO batch_write")
+                        outcomes.append((a_future, None, write_exc))
+                    self._conn.execute("RELEASE batch_write")
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as commit_exc:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                outcomes = [(a_future, None, commit_exc) for _, a_future in batch]
+            self.n_writes += len(batch)
+            self.n_commits += 1
+        for a_future, result, an_exc in outcomes:
+            if an_exc is not None:
+                a_future.set_exception(an_exc)
+            else:
+                a_future.set_result(result)
+
+    @property
+    def total_len(self):
+        """Number of records"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _to_row(self, data, state, state_time) -> typing.Dict:
+        row = json.loads(data)
+        row[self.state_field] = state
+        row[self.state_ts_field] = state_time
+        return row
+
+    def _to_record(self, position, row) -> df_r.Record:
+        record: df_r.Record = self.transform_func(row)
+        record.context = df_r.Context(position, self.total_len, self.data_path)
+        return record
+
+    @staticmethod
+    def _select_next(conn, state, n_records=1,
+                     capacity: odem_mdt.RmCapacity = None, policy=POLICY_FIFO):
+        if policy not in _SQL_ORDER:
+            raise df_r.RecordHandlerException(f"unknown policy '{policy}'")
+        query = "SELECT position, data, state, state_time FROM records WHERE state = :state"
+        params = {'state': state, 'n_records': n_records}
+        if capacity is not None:
+            query += _SQL_FITS
+            params.update(disk_factor=DISK_PER_IMAGE_BYTE, disk_free=capacity.disk_free,
+                          memory_factor=MEMORY_PER_MEGAPIXEL, cores=max(1, capacity.cores),
+                          memory_available=capacity.memory_available)
+        query += f" ORDER BY {_SQL_ORDER[policy]} LIMIT :n_records"
+        return conn.execute(query, params).fetchall()
+
+    def next_record(self, state=None, new_state=None,
+                    capacity: odem_mdt.RmCapacity = None,
+                    policy=POLICY_FIFO, info=None, reclaim=False,
+                    on_reclaimed: typing.Callable[[typing.List[str]], typing.Any] = None
+                    ) -> typing.Optional[df_r.Record]:
+        """
+        Get *NEXT* Record with given state
+        if any exist, otherwise None.
+        Optional info replaces record's info
+        along with new state. If reclaim, expired
+        leases are reclaimed first within same
+        transaction and passed to on_reclaimed.
+        """
+
+        if not state:
+            state = self.mark['open']
+
+        def _take(conn):
+            reclaimed = self._reclaim_expired(conn) if reclaim else []
+            found = self._select_next(conn, state, 1, capacity, policy)
+            if not found:
+                return reclaimed, None
+            position, data, prev_state, state_time = found[0]
+            row = self._to_row(data, prev_state, state_time)
+            if info:
+                row[df_r.FIELD_INFO] = f"{info}"
+            if new_state is not None:
+                self._update(conn, position, dict(row), new_state)
+            return reclaimed, (position, row)
+
+        reclaimed, taken = self._write(_take)
+        if reclaimed and on_reclaimed is not None:
+            on_reclaimed(reclaimed)
+        if taken is None:
+            return None
+        record = self._to_record(*taken)
+        if info:
+            record.info = info
+        return record
+
+    def get(self, identifier, exact_match=True) -> typing.Optional[df_r.Record]:
+        """Read data to get *first* Record with
+        given identifier *without* changing state
+
+        Args:
+            identifier (string): record URN
+            exact_match (bool) : identifier might just be contained or
+                                 must match exaclty (default: True)
+        """
+
+        query = "SELECT position, data, state, state_time FROM records WHERE identifier = ?"
+        if not exact_match:
+            query = ("SELECT position, data, state, state_time FROM records"
+                     " WHERE instr(identifier, ?) > 0 ORDER BY position LIMIT 1")
+        with self._lock:
+            found = self._conn.execute(query, (identifier,)).fetchone()
+        if found is None:
+            return None
+        return self.transform_func(self._to_row(*found[1:]))
+
+    def save_record_state(self, identifier, state=None, **kwargs):
+        """Mark Record state"""
+
+        if not state:
+            state = self.mark['lock']
+
+        def _save(conn):
+            found = conn.execute("SELECT position, data FROM records WHERE identifier = ?",
+                                 (identifier,)).fetchone()
+            if found is None:
+                raise RuntimeError(f'No Record for {identifier} in {self.data_path}! '
+                                   'Cant save state!')
+            position, data = found
+            row = json.loads(data)
+            for k, v in kwargs.items():
+                row[k] = str(v)
+            self._update(conn, position, row, state)
+
+        self._write(_save)
+
+    def _update(self, conn, position, row, state):
+        """Set state, which ends any lease"""
+
+        right_now = time.strftime(df_r.STATETIME_FORMAT)
+        row[self.state_field] = state
+        row[self.state_ts_field] = right_now
+        conn.execute("UPDATE records SET state = ?, state_time = ?, data = ?,"
+                     " lease_owner = NULL, lease_until = NULL, leased_from = NULL"
+                     " WHERE position = ?", (state, right_now, json.dumps(row), position))
+
+    def lease_records(self, n_records, state=None, new_state=None, owner=None,
+                      lease_seconds=DEFAULT_LEASE_SECONDS,
+                      info=None, capacity: odem_mdt.RmCapacity = None,
+                      policy=POLICY_FIFO,
+                      on_reclaimed: typing.Callable[[typing.List[str]], typing.Any] = None
+                      ) -> typing.List[df_r.Record]:
+        """Take up to n_records with given state at once and
+        mark them with new state until lease expires.
+        Optional info is merged into each record's info.
+        Expired leases are reclaimed first within same
+        transaction and passed to on_reclaimed."""
+
+        if not state:
+            state = self.mark['open']
+        if not new_state:
+            new_state = self.mark['lock']
+
+        def _lease(conn):
+            reclaimed = self._reclaim_expired(conn)
+            leased = []
+            found = self._select_next(conn, state, n_records, capacity, policy)
+            lease_until = time.time() + lease_seconds
+            for position, data, prev_state, state_time in found:
+                row = self._to_row(data, prev_state, state_time)
+                record: df_r.Record = self.transform_func(row)
+                if info:
+                    record.info = info
+                    row[df_r.FIELD_INFO] = f"{record.info}"
+                leased.append((position, record))
+                self._update(conn, position, dict(row), new_state)
+                conn.execute("UPDATE records SET lease_owner = ?, lease_until = ?,"
+                             " leased_from = ? WHERE position = ?",
+                             (owner, lease_until, prev_state, position))
+            return reclaimed, leased
+
+        reclaimed, leased = self._write(_lease)
+        if reclaimed and on_reclaimed is not None:
+            on_reclaimed(reclaimed)
+        total_len = self.total_len
+        for position, record in leased:
+            record.context = df_r.Context(position, total_len, self.data_path)
+        return [record for _, record in leased]
+
+    def renew_leases(self, identifiers, owner=None,
+                     lease_seconds=DEFAULT_LEASE_SECONDS) -> typing.List[str]:
+        """Extend leases still held by owner,
+        return identifiers actually renewed"""
+
+        def _renew(conn):
+            renewed = []
+            lease_until = time.time() + lease_seconds
+            for an_ident in identifiers:
+                a_cursor = conn.execute(
+                    "UPDATE records SET lease_until = ? WHERE identifier = ?"
+                    " AND lease_until IS NOT NULL AND lease_owner IS ?",
+                    (lease_until, an_ident, owner))
+                if a_cursor.rowcount > 0:
+                    renewed.append(an_ident)
+            return renewed
+
+        return self._write(_renew)
+
+    def reclaim_expired(self) -> typing.List[str]:
+        """Return records with expired lease to the
+        state they had been leased from"""
+
+        return self._write(self._reclaim_expired)
+
+    def _reclaim_expired(self, conn) -> typing.List[str]:
+        """Reclaim within caller's transaction"""
+
+        reclaimed = []
+        for position, identifier, data, leased_from in conn.execute(
+                "SELECT position, identifier, data, leased_from FROM records"
+                " WHERE lease_until < ?", (time.time(),)).fetchall():
+            self._update(conn, position, json.loads(data), leased_from)
+            reclaimed.append(identifier)
+        return reclaimed
+
+    def set_size_hints(self, identifier, n_pages=None, image_bytes=None,
+                       megapixels=None, deadline=None) -> bool:
+        """Cache hints given for record, keep others"""
+
+        hints = {'n_pages': n_pages, 'image_bytes': image_bytes,
+                 'megapixels': megapixels, 'deadline': deadline}
+        hints = {k: v for k, v in hints.items() if v is not None}
+        if not hints:
+            return False
+        assignments = ', '.join(f"{k} = :{k}" for k in hints)
+        return self._write(lambda conn: conn.execute(
+            f"UPDATE records SET {assignments} WHERE identifier = :identifier",
+            {**hints, 'identifier': identifier}).rowcount > 0)
+
+    def import_size_hints(self, hints_path) -> int:
+        """Cache hints from tab separated file with header
+        IDENTIFIER and any of PAGES, BYTES, MEGAPIXELS, DEADLINE"""
+
+        columns = {HINT_PAGES: ('n_pages', int), HINT_BYTES: ('image_bytes', int),
+                   HINT_MEGAPIXELS: ('megapixels', float), HINT_DEADLINE: ('deadline', str)}
+        n_hints = 0
+        with open(hints_path, encoding='utf-8') as reader:
+            header = reader.readline().strip().split('\t')
+            for a_line in reader:
+                if not a_line.strip() or a_line.startswith(df_r.COMMENT_MARK):
+                    continue
+                row = dict(zip(header, a_line.rstrip('\n').split('\t')))
+                hints = {columns[k][0]: columns[k][1](v) for k, v in row.items()
+                         if k in columns and v.strip() and v != df_r.UNSET_LABEL}
+                if self.set_size_hints(row[df_r.FIELD_IDENTIFIER], **hints):
+                    n_hints += 1
+        return n_hints
+
+    def count_states(self) -> typing.Dict[str, int]:
+        """Number of records by state"""
+
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM records GROUP BY state").fetchall())
+
+    def states(self, criterias, set_state=df_r.UNSET_LABEL, dry_run=True, verbose=False):
+        """Process record states according certain criterias,
+        see digiflow.record.RecordHandler.states"""
+
+        if criterias is None or len(criterias) == 0:
+            criterias = [df_r.State(df_r.UNSET_LABEL)]
+
+        def _match(conn):
+            matches = []
+            for position, data, state, state_time in conn.execute(
+                    "SELECT position, data, state, state_time FROM records"
+                    " ORDER BY position").fetchall():
+                row = self._to_row(data, state, state_time)
+                if all(c.matched(row) for c in criterias):
+                    matches.append(row)
+                    if not dry_run:
+                        row[self.state_field] = set_state
+                        conn.execute("UPDATE records SET state = ?, data = ?"
+                                     " WHERE position = ?",
+                                     (set_state, json.dumps(row), position))
+            return matches
+
+        total_matches = self._write(_match)
+        if verbose:
+            for a_row in total_matches:
+                print('\t'.join(a_row.values()))
+        return len(total_matches)
+
+    def import_list(self, list_path) -> int:
+        """Add records from plain record list file, records
+        already known are updated at their position"""
+
+        the_list = df_r.RecordHandler(list_path, data_fields=self.schema)
+        rows = [(a_row[self.ident_field], a_row[self.state_field],
+                 a_row[self.state_ts_field], json.dumps(a_row))
+                for a_row in the_list.data]
+        self._write(lambda conn: conn.executemany(
+            "INSERT INTO records (identifier, state, state_time, data)"
+            " VALUES (?, ?, ?, ?) ON CONFLICT(identifier) DO UPDATE SET"
+            " state = excluded.state, state_time = excluded.state_time,"
+            " data = excluded.data", rows))
+        return len(rows)
+
+    def export_list(self, list_path) -> int:
+        """Write all records into plain record list file"""
+
+        n_rows = 0
+        tmp_path = f"{list_path}.tmp"
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT data, state, state_time FROM records ORDER BY position")
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as writer:
+                writer.write('\t'.join(self.schema) + '\n')
+                for a_row in cursor:
+                    row = self._to_row(*a_row)
+                    writer.write('\t'.join(row.get(f, df_r.UNSET_LABEL)
+                                           for f in self.schema) + '\n')
+                    n_rows += 1
+        os.replace(tmp_path, list_path)
+        return n_rows
+
+    def close(self):
+        """Commit pending writes and
+        close database connection"""
+
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            self._conn.close()
+
+
+def import_record_list(list_path, store_path, data_fields=None) -> SQLiteRecordHandler:
+    """Create store from plain record list file, using
+    it's header as schema unless data_fields given"""
+
+    if not data_fields:
+        data_fields = df_r.RecordHandler(list_path).schema
+    store = SQLiteRecordHandler(store_path, data_fields=data_fields, create=True)
+    store.import_list(list_path)
+    return store
+
+
+# make pylint accept digiflow's argument names
+# pylint:disable=invalid-name
+class RecordStoreRequestHandler(df_r.RecordRequestHandler):
+    """Serve records from SQLite stores, which take
+    precedence over list files with same name, while
+    plain list files are still served by digiflow.
+
+    Stores additionally support leasing batches of
+    records by GET /<file>/lease and renewing leases
+    by POST /<file>/heartbeat. Expired leases are
+    reclaimed whenever records are requested.
+
+    Workers reporting their capacity by headers get
+    records fitting into it according to assignment
+    policy of start_info. Statistics reported along
+    with record's state are cached as size hints.
+
+    If served by several threads, writes to stores
+    are batched and plain list files, which digiflow
+    rewrites completely, are accessed one at a time.
+
+    With metrics of start_info, statistics of records
+    finished are aggregated and exposed by GET /metrics
+    along with number of records by state of each list.
+    """
+
+    stores: typing.Dict[str, SQLiteRecordHandler] = {}
+    _stores_lock = threading.Lock()
+    _lists_lock = threading.Lock()
+
+    def __init__(self, start_info: df_r.HandlerInformation, *args, **kwargs):
+        self.policy = getattr(start_info, 'assignment_policy', POLICY_FIFO)
+        self.batch_writes = getattr(start_info, 'server_threads', 1) > 1
+        self.metrics: typing.Optional[odem_metrics.RecordMetrics] = getattr(
+            start_info, 'metrics', None)
+        super().__init__(start_info, *args, **kwargs)
+
+    @classmethod
+    def get_store(cls, data_path, batch_writes=False) -> SQLiteRecordHandler:
+        """Shared store, opened once per server"""
+
+        with cls._stores_lock:
+            if str(data_path) not in cls.stores:
+                cls.stores[str(data_path)] = SQLiteRecordHandler(data_path,
+                                                                 batch_writes=batch_writes)
+            return cls.stores[str(data_path)]
+
+    def _capacity(self) -> typing.Optional[odem_mdt.RmCapacity]:
+        """Worker's capacity if reported completely"""
+
+        try:
+            return odem_mdt.RmCapacity(int(self.headers[X_HEADER_WORKER_CORES]),
+                                       int(self.headers[X_HEADER_WORKER_MEMORY]),
+                                       int(self.headers[X_HEADER_WORKER_DISK]))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def get_data_file(self, file_name: str):
+        if isinstance(file_name, str):
+            file_name = Path(file_name).stem
+        for a_suffix in SQLITE_SUFFIXES:
+            store_path = self.record_list_directory / f"{file_name}{a_suffix}"
+            if store_path.is_file():
+                return store_path
+        return super().get_data_file(file_name)
+
+    def get_next_record(self, file_name, client_name, requested_state, set_state) -> tuple:
+        data_file_path = self.get_data_file(file_name)
+        if data_file_path is None or not is_record_store(data_file_path):
+            with self._lists_lock:
+                return super().get_next_record(file_name, client_name,
+                                               requested_state, set_state)
+        store = self.get_store(data_file_path, self.batch_writes)
+        # store information which client got the package delivered
+        next_record = store.next_record(requested_state, new_state=set_state,
+                                        capacity=self._capacity(), policy=self.policy,
+                                        info={'client': client_name}, reclaim=True,
+                                        on_reclaimed=functools.partial(self._log_reclaimed,
+                                                                       store))
+        if next_record is None:
+            the_msg = df_r.record_service.DATA_EXHAUSTED_MARK.format(requested_state,
+                                                                     data_file_path)
+            self.log(the_msg)
+            return (404, the_msg)
+        return (200, next_record)
+
+    def _log_reclaimed(self, store: SQLiteRecordHandler, reclaimed: typing.List[str]):
+        self.log("reclaimed %d records with expired lease from %s: %s",
+                 len(reclaimed), store.data_path, reclaimed, level=logging.WARNING)
+
+    def _parse_store_command(self, commands):
+        """Store file and command, if request path
+        targets store with one of given commands"""
+
+        try:
+            _, file_name, command = self.path.split('/')
+        except ValueError:
+            return None
+        if command not in commands:
+            return None
+        data_file_path = self.get_data_file(file_name)
+        if data_file_path is None or not is_record_store(data_file_path):
+            self._respond(501, df_r.record_service.TEXT_HEADER)
+            self.wfile.write(f"'{command}' requires record store".encode('utf-8'))
+            return False
+        return data_file_path, command
+
+    def _queue_depths(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        """Number of records by state for each list"""
+
+        depths = {}
+        for a_file in sorted(self.record_list_directory.iterdir()):
+            if is_record_store(a_file):
+                depths[a_file.stem] = self.get_store(a_file, self.batch_writes).count_states()
+            elif a_file.suffix.lower() in LIST_SUFFIXES:
+                with self._lists_lock:
+                    the_list = df_r.RecordHandler(a_file)
+                depths[a_file.stem] = dict(collections.Counter(
+                    a_row[the_list.state_field] for a_row in the_list.data))
+        return depths
+
+    def _respond_metrics(self):
+        if self.metrics is None:
+            self._respond(404, df_r.record_service.TEXT_HEADER)
+            self.wfile.write(b"no metrics collected")
+            return
+        the_metrics = self.metrics.render(self._queue_depths())
+        self._respond(200, {'Content-Type': odem_metrics.CONTENT_TYPE})
+        self.wfile.write(the_metrics.encode('utf-8'))
+
+    def do_GET(self):
+        """handle GET request, lease records from
+        store or expose metrics"""
+
+        if not self._client_allowed():
+            self.log("request from %s rejected", self.address_string(), level=logging.WARNING)
+            return
+        if self.path == f'/{COMMAND_METRICS}':
+            self._respond_metrics()
+            return
+        parsed = self._parse_store_command([COMMAND_LEASE])
+        if parsed is None:
+            super().do_GET()
+            return
+        if parsed is False:
+            return
+        client_name = self.address_string()
+        store = self.get_store(parsed[0], self.batch_writes)
+        requested_state = self.headers.get(df_r.record_service.X_HEADER_GET_STATE,
+                                           failobj=df_r.UNSET_LABEL)
+        leased = store.lease_records(
+            int(self.headers.get(X_HEADER_LEASE_COUNT, failobj=1)),
+            state=requested_state,
+            new_state=self.headers.get(df_r.record_service.X_HEADER_SET_STATE),
+            owner=self.headers.get(X_HEADER_LEASE_OWNER, failobj=client_name),
+            lease_seconds=float(self.headers.get(X_HEADER_LEASE_SECONDS,
+                                                 failobj=DEFAULT_LEASE_SECONDS)),
+            info={'client': client_name},
+            capacity=self._capacity(), policy=self.policy,
+            on_reclaimed=functools.partial(self._log_reclaimed, store))
+        if not leased:
+            the_msg = df_r.record_service.DATA_EXHAUSTED_MARK.format(requested_state,
+                                                                     parsed[0])
+            self.log(the_msg)
+            self._respond(404, df_r.record_service.TEXT_HEADER)
+            self.wfile.write(the_msg.encode('utf-8'))
+            return
+        self.log("lease %d records in %s to %s: %s", len(leased), self.path, client_name,
+                 [r.identifier for r in leased])
+        self._respond(200)
+        self.wfile.write(json.dumps([r.dict() for r in leased]).encode('utf-8'))
+
+    def do_POST(self):
+        """handle POST request, renew leases of store"""
+
+        if not self._client_allowed():
+            self.log("request from %s rejected", self.address_string(), level=logging.WARNING)
+            return
+        parsed = self._parse_store_command([COMMAND_HEARTBEAT])
+        if parsed is None:
+            super().do_POST()
+            return
+        if parsed is False:
+            return
+        content_length = int(self.headers['Content-Length'])
+        data_dict = json.loads(self.rfile.read(content_length))
+        renewed = self.get_store(parsed[0], self.batch_writes).renew_leases(
+            data_dict.get('identifiers', []),
+            owner=data_dict.get('owner', self.address_string()),
+            lease_seconds=float(data_dict.get('lease_seconds', DEFAULT_LEASE_SECONDS)))
+        self._respond(200)
+        self.wfile.write(json.dumps({'renewed': renewed}).encode('utf-8'))
+
+    def update_record(self, data_file, in_data) -> tuple:
+        if isinstance(in_data, dict):
+            in_data = df_r.Record.parse(in_data)
+        status, msg = self._update_record(data_file, in_data)
+        if status == 200 and self.metrics is not None:
+            self.metrics.observe(in_data.info, in_data.state, self.address_string())
+        return (status, msg)
+
+    def _update_record(self, data_file, in_data: df_r.Record) -> tuple:
+        data_file_path = self.get_data_file(data_file)
+        if data_file_path is None or not is_record_store(data_file_path):
+            with self._lists_lock:
+                return super().update_record(data_file, in_data)
+        in_ident = in_data.identifier
+        in_state = in_data.state
+        store = self.get_store(data_file_path, self.batch_writes)
+        prev_record = store.get(in_ident)
+        if prev_record is None:
+            msg = f"set {in_ident} to {in_state} in {data_file_path} failed: unknown"
+            self.log(msg)
+            return (500, msg)
+        prev_record.info = in_data.info
+        store.save_record_state(in_ident, state=in_state,
+                                **{df_r.FIELD_INFO: f"{prev_record.info}"})
+        store.set_size_hints(in_ident, **size_hints_from_info(in_data.info))
+        msg = f"set {in_ident} to {in_state} in {data_file_path}"
+        self.log(msg)
+        return (200, msg)
+
+
+class LeaseClient(df_r.Client):
+    """Record service client, which additionally leases
+    batches of records and keeps them by heartbeats"""
+
+    def __init__(self, oai_record_list_label, host, port, logger=None,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, owner=None,
+                 fct_capacity: typing.Callable[[], odem_mdt.RmCapacity] = None):
+        super().__init__(oai_record_list_label, host, port, logger=logger)
+        self.lease_seconds = lease_seconds
+        self.owner = owner if owner is not None else f"{socket.gethostname()}:{os.getpid()}"
+        self.fct_capacity = fct_capacity
+
+    def _capacity_headers(self) -> typing.Dict[str, str]:
+        if self.fct_capacity is None:
+            return {}
+        capacity = self.fct_capacity()
+        return {X_HEADER_WORKER_CORES: str(capacity.cores),
+                X_HEADER_WORKER_MEMORY: str(capacity.memory_available),
+                X_HEADER_WORKER_DISK: str(capacity.disk_free)}
+
+    def _get(self, command, the_headers) -> requests.Response:
+        try:
+            response = requests.get(f'{self.oai_server_url}/{command}',
+                                    timeout=self.timeout_secs,
+                                    headers={**the_headers, **self._capacity_headers()})
+        except requests.exceptions.RequestException as err:
+            raise df_r.RecordsServiceException(f"Connection failure: {err}") from err
+        if response.status_code == 404 \
+                and df_r.record_service.DATA_EXHAUSTED_PREFIX in response.text:
+            raise df_r.RecordsExhaustedException(response.text)
+        if response.status_code != 200:
+            raise df_r.RecordsServiceException(
+                f"Record service error {response.status_code} - {response.text}")
+        return response
+
+    def get_record(self, get_record_state, set_record_state):
+        """Request next record like digiflow's
+        client, but report capacity, if any"""
+
+        the_headers = {df_r.record_service.X_HEADER_GET_STATE: get_record_state,
+                       df_r.record_service.X_HEADER_SET_STATE: set_record_state}
+        self.record = df_r.Record.parse(
+            self._get(df_r.record_service.DEFAULT_COMMAND_NEXT, the_headers).json())
+        return self.record
+
+    def lease_records(self, get_record_state, set_record_state,
+                      n_records=1) -> typing.List[df_r.Record]:
+        """Lease up to n_records, raise RecordsExhaustedException
+        if none left in requested state"""
+
+        the_headers = {df_r.record_service.X_HEADER_GET_STATE: get_record_state,
+                       df_r.record_service.X_HEADER_SET_STATE: set_record_state,
+                       X_HEADER_LEASE_COUNT: str(n_records),
+                       X_HEADER_LEASE_SECONDS: str(self.lease_seconds),
+                       X_HEADER_LEASE_OWNER: self.owner}
+        response = self._get(COMMAND_LEASE, the_headers)
+        return [df_r.Record.parse(a_row) for a_row in response.json()]
+
+    def heartbeat(self, identifiers) -> typing.List[str]:
+        """Renew leases, return identifiers still held"""
+
+        the_data = {'identifiers': list(identifiers), 'owner': self.owner,
+                    'lease_seconds': self.lease_seconds}
+        try:
+            response = requests.post(f'{self.oai_server_url}/{COMMAND_HEARTBEAT}',
+                                     json=the_data, timeout=self.timeout_secs)
+        except requests.exceptions.RequestException as err:
+            raise df_r.RecordsServiceException(f"Connection failure: {err}") from err
+        if response.status_code != 200:
+            raise df_r.RecordsServiceException(
+                f"Record service error {response.status_code} - {response.text}")
+        return response.json()['renewed']
+
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """HTTP server handling requests by fixed pool of
+    threads, so slow clients don't block each other"""
+
+    def __init__(self, server_address, handler_class, n_threads):
+        super().__init__(server_address, handler_class)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=n_threads, thread_name_prefix='odem.server')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_pooled, request, client_address)
+
+    def _process_pooled(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint:disable=broad-exception-caught
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def create_server(host, port, start_data: df_r.HandlerInformation) -> http.server.HTTPServer:
+    """Server for requests concerning records, pooled
+    if start_data.server_threads is greater than 1"""
+
+    if getattr(start_data, 'metrics', None) is None:
+        start_data.metrics = odem_metrics.RecordMetrics()
+    the_handler = functools.partial(RecordStoreRequestHandler, start_data)
+    n_threads = getattr(start_data, 'server_threads', 1)
+    if n_threads > 1:
+        return PooledHTTPServer((host, int(port)), the_handler, n_threads)
+    return http.server.HTTPServer((host, int(port)), the_handler)
+
+
+def run_server(host, port, start_data: df_r.HandlerInformation):
+    """Start server to process requests for record
+    stores and list files, like digiflow.record.run_server.
+    Optional start_data.assignment_policy picks records
+    for workers reporting their capacity, optional
+    start_data.server_threads handles requests by
+    that many threads with batched store writes."""
+
+    the_logger = start_data.logger
+    the_logger.info("listen at: %s:%s for records from %s", host, port, start_data.data_path)
+    if start_data.client_ips and len(start_data.client_ips) > 0:
+        the_logger.info("accept requests only from %s", start_data.client_ips)
+    the_logger.info("assign records by policy '%s'",
+                    getattr(start_data, 'assignment_policy', POLICY_FIFO))
+    the_logger.info("handle requests by %d threads",
+                    getattr(start_data, 'server_threads', 1))
+    with create_server(host, port, start_data) as the_server:
+        try:
+            the_server.serve_forever(5.0)
+        except KeyboardInterrupt:
+            the_server.shutdown()
+    the_logger.info("shutdown record server (%s:%s)", host, port)
@@ -0,0 +1,404 @@
+"""Long-running worker processing records one after another"""
+
+import concurrent.futures
+import logging
+import os
+import shutil
+import signal
+import threading
+import typing
+
+import digiflow as df
+import digiflow.record as df_r
+
+import lib.odem.commons as oc
+import lib.odem.monitoring.resource as odem_rm
+import lib.odem.odem_process_impl as odem_impl
+
+# seconds to wait for new open records
+# if none left, 0 means quit instead
+DEFAULT_POLL_INTERVAL = 60
+
+SHUTDOWN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+# sub dir of local work root for records
+# prefetched while another one is processed
+STAGING_DIR = '.staging'
+
+
+def staging_dir(work_root, local_identifier) -> str:
+    """Work dir of prefetched record"""
+
+    return os.path.join(str(work_root), STAGING_DIR, local_identifier)
+
+
+def claim_staged(work_root, local_identifier, work_dir) -> bool:
+    """Move prefetched record data into it's work dir,
+    unless there's already data, i.e. to be resumed"""
+
+    staged = staging_dir(work_root, local_identifier)
+    if not os.path.isdir(staged):
+        return False
+    if os.path.exists(work_dir):
+        shutil.rmtree(staged)
+        return False
+    os.replace(staged, work_dir)
+    return True
+
+
+def discard_staged(work_root, local_identifier):
+    """Remove prefetched record data"""
+
+    staged = staging_dir(work_root, local_identifier)
+    if os.path.isdir(staged):
+        shutil.rmtree(staged)
+
+
+def stage_record(record: df_r.Record, configuration, work_root, logger: logging.Logger):
+    """Prefetch record's data into staging dir, obeying
+    disk limits of resource monitoring. Staging dir is
+    removed if anything goes wrong."""
+
+    local_ident = record.local_identifier
+    staged = staging_dir(work_root, local_ident)
+    discard_staged(work_root, local_ident)
+    os.makedirs(staged)
+    record_cfg = oc.copy_configparser(configuration)
+    odem_process = odem_impl.ODEMProcessImpl(record, record_cfg, work_dir=staged,
+                                             logger=logger)
+    local_store_root = record_cfg.get(oc.CFG_SEC_FLOW, 'local_store_root', fallback=None)
+    if local_store_root is not None:
+        odem_process.store = df.LocalStore(os.path.join(local_store_root, local_ident), staged)
+    pr_monitor = odem_rm.ProcessResourceMonitor(
+        odem_rm.from_configuration(record_cfg), logger.error, None, None,
+        odem_process.process_identifier, record.identifier)
+    try:
+        pr_monitor.monit_disk_space(odem_process.prefetch)
+    except Exception:
+        discard_staged(work_root, local_ident)
+        raise
+    logger.info("[%s] prefetched into %s", local_ident, staged)
+
+
+class WorkerShutdown:
+    """Turn termination signals into request for
+    graceful shutdown: record currently processed
+    gets completed, but no further one is taken"""
+
+    def __init__(self, logger: logging.Logger = None):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self._requested = threading.Event()
+
+    def install(self, signals=SHUTDOWN_SIGNALS):
+        """Register handler for signals,
+        must be called from main thread"""
+
+        for a_signal in signals:
+            signal.signal(a_signal, self._handle)
+
+    def _handle(self, signum, _frame):
+        self.logger.warning("received %s, shutdown after current record",
+                            signal.Signals(signum).name)
+        self._requested.set()
+
+    def request(self):
+        """Request shutdown programmatically"""
+
+        self._requested.set()
+
+    @property
+    def requested(self) -> bool:
+        """Shutdown has been requested"""
+        return self._requested.is_set()
+
+    def wait(self, timeout) -> bool:
+        """Sleep for timeout seconds unless
+        shutdown requested meanwhile"""
+
+        return self._requested.wait(timeout)
+
+
+class RecordPrefetcher:
+    """Lease next record and stage it's data in background
+    while current record is processed.
+
+    fct_stage loads record's data into staging dir and
+    must clean up itself if this fails, in which case the
+    record is processed without any prefetched data later
+    on. Records prefetched but not taken over when worker
+    quits are handed back by fct_release.
+    """
+
+    def __init__(self, fct_stage: typing.Callable[[df_r.Record], typing.Any],
+                 fct_release: typing.Callable[[df_r.Record], typing.Any],
+                 logger: logging.Logger = None):
+        self.fct_stage = fct_stage
+        self.fct_release = fct_release
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.record: typing.Optional[df_r.Record] = None
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self, record: df_r.Record):
+        """Start staging record in background"""
+
+        self.record = record
+        self._thread = threading.Thread(target=self._stage, name='odem.prefetch',
+                                        daemon=True)
+        self._thread.start()
+
+    def _stage(self):
+        try:
+            self.fct_stage(self.record)
+        except Exception as stage_exc:  # pylint:disable=broad-exception-caught
+            self.logger.warning("[%s] prefetch failed: %s",
+                                self.record.local_identifier, stage_exc)
+
+    def _join(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def take(self) -> typing.Optional[df_r.Record]:
+        """Wait for staging to complete and
+        hand over prefetched record, if any"""
+
+        self._join()
+        record, self.record = self.record, None
+        return record
+
+    def release(self):
+        """Hand back record not taken over"""
+
+        self._join()
+        if self.record is not None:
+            self.logger.info("[%s] hand back prefetched record",
+                             self.record.local_identifier)
+            self.fct_release(self.record)
+            self.record = None
+
+
+class RecordLeases:
+    """Lease records in batches of n_records and keep
+    leases of all records held alive by heartbeats
+    every heartbeat_interval seconds in background.
+
+    Records are held from being leased until they're
+    done, i.e. their final state has been saved, which
+    ends lease anyway. Records leased but not taken
+    when worker quits are handed back by fct_release.
+    """
+
+    def __init__(self, fct_lease: typing.Callable[[int], typing.List[df_r.Record]],
+                 fct_heartbeat: typing.Callable[[typing.List[str]], typing.List[str]],
+                 fct_release: typing.Callable[[df_r.Record], typing.Any],
+                 n_records=1, heartbeat_interval=DEFAULT_POLL_INTERVAL,
+                 logger: logging.Logger = None):
+        self.fct_lease = fct_lease
+        self.fct_heartbeat = fct_heartbeat
+        self.fct_release = fct_release
+        self.n_records = max(1, n_records)
+        self.heartbeat_interval = heartbeat_interval
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.leased: typing.List[df_r.Record] = []
+        self.held: typing.Set[str] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        """Start heartbeats in background"""
+
+        self._thread = threading.Thread(target=self._beat, name='odem.heartbeat',
+                                        daemon=True)
+        self._thread.start()
+
+    def _beat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            with self._lock:
+                held = sorted(self.held)
+            if not held:
+                continue
+            try:
+                renewed = self.fct_heartbeat(held)
+            except Exception as beat_exc:  # pylint:disable=broad-exception-caught
+                self.logger.warning("heartbeat for %d records failed: %s",
+                                    len(held), beat_exc)
+                continue
+            lost = set(held) - set(renewed)
+            with self._lock:
+                lost &= self.held
+            if lost:
+                self.logger.warning("lost lease for %s", sorted(lost))
+
+    def next_record(self) -> typing.Optional[df_r.Record]:
+        """Next leased record, lease next
+        batch if none left, None if exhausted"""
+
+        with self._lock:
+            if not self.leased:
+                batch = self.fct_lease(self.n_records)
+                self.leased.extend(batch)
+                self.held.update(r.identifier for r in batch)
+            if not self.leased:
+                return None
+            return self.leased.pop(0)
+
+    def done(self, record: df_r.Record):
+        """Record is not to be held anymore"""
+
+        with self._lock:
+            self.held.discard(record.identifier)
+
+    def release(self):
+        """Stop heartbeats and hand back
+        records leased but not taken"""
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            leased, self.leased = self.leased, []
+        for a_record in leased:
+            self.logger.info("[%s] hand back leased record", a_record.local_identifier)
+            self.fct_release(a_record)
+            self.done(a_record)
+
+
+class RecordWorker:
+    """Loop over records until shutdown is requested,
+    configuration, logger and clients are created just
+    once and kept for all records of worker's lifetime.
+
+    fct_next_record yields next record or None if
+    there is no open one at the moment, in which case
+    worker waits poll_interval seconds before asking
+    again or quits, if poll_interval is not positive.
+    fct_process_record returns False if worker must
+    not continue, i.e. human interaction is required.
+    With prefetcher, next record is leased and staged
+    while current one is processed. With n_concurrent
+    greater than 1, that many records are processed at
+    once, each in a thread named after the record, so
+    log lines remain attributable; prefetcher is not
+    used then, since concurrent records overlap anyway.
+    Unexpected errors of a concurrent record are logged
+    and handed to fct_fail_record, if any, so it can
+    store a fail state, while other records go on.
+    """
+
+    def __init__(self, fct_next_record: typing.Callable[[], typing.Optional[df_r.Record]],
+                 fct_process_record: typing.Callable[[df_r.Record], bool],
+                 shutdown: WorkerShutdown = None,
+                 poll_interval=DEFAULT_POLL_INTERVAL,
+                 max_records=0,
+                 logger: logging.Logger = None,
+                 prefetcher: RecordPrefetcher = None,
+                 n_concurrent=1,
+                 fct_fail_record: typing.Callable[[df_r.Record, Exception], None] = None):
+        self.fct_next_record = fct_next_record
+        self.fct_fail_record = fct_fail_record
+        self.n_concurrent = max(1, n_concurrent)
+        self.prefetcher = prefetcher if self.n_concurrent == 1 else None
+        self.fct_process_record = fct_process_record
+        self.shutdown = shutdown if shutdown is not None else WorkerShutdown(logger)
+        self.poll_interval = poll_interval
+        self.max_records = max_records
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.n_processed = 0
+        self.failed = False
+
+    def run(self) -> int:
+        """Process records, return how many"""
+
+        try:
+            if self.n_concurrent > 1:
+                self._run_concurrent()
+            else:
+                self._run()
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.release()
+        return self.n_processed
+
+    def _run(self):
+        while not self.shutdown.requested:
+            record = self.prefetcher.take() if self.prefetcher is not None else None
+            if record is None:
+                record = self.fct_next_record()
+            if record is None:
+                if self.poll_interval <= 0:
+                    self.logger.info("no open records, quit worker")
+                    break
+                self.logger.debug("no open records, wait %ss", self.poll_interval)
+                self.shutdown.wait(self.poll_interval)
+                continue
+            if self.prefetcher is not None and not self._is_last():
+                next_record = self.fct_next_record()
+                if next_record is not None:
+                    self.prefetcher.start(next_record)
+            proceed = self.fct_process_record(record)
+            self.n_processed += 1
+            if proceed is False:
+                self.logger.error("[%s] worker halted, human interaction required",
+                                  record.local_identifier)
+                self.failed = True
+                break
+            if 0 < self.max_records <= self.n_processed:
+                self.logger.info("processed %d records, quit worker", self.n_processed)
+                break
+
+    def _run_concurrent(self):
+        running = {}
+        exhausted = False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.n_concurrent,
+                                                   thread_name_prefix='odem.record'
+                                                   ) as executor:
+            while True:
+                while self._may_take(len(running), exhausted):
+                    record = self.fct_next_record()
+                    if record is None:
+                        exhausted = self.poll_interval <= 0
+                        break
+                    running[executor.submit(self._process_named, record)] = record
+                if not running:
+                    if not self._may_take(0, exhausted):
+                        break
+                    self.logger.debug("no open records, wait %ss", self.poll_interval)
+                    self.shutdown.wait(self.poll_interval)
+                    continue
+                done, _ = concurrent.futures.wait(
+                    running, timeout=self.poll_interval if self.poll_interval > 0 else None,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for a_future in done:
+                    record = running.pop(a_future)
+                    self.n_processed += 1
+                    try:
+                        proceed = a_future.result()
+                    except Exception as exc:  # pylint:disable=broad-exception-caught
+                        self._record_failed(record, exc)
+                        continue
+                    if proceed is False:
+                        self.logger.error("[%s] worker halted, human interaction required",
+                                          record.local_identifier)
+                        self.failed = True
+
+    def _record_failed(self, record: df_r.Record, exc: Exception):
+        self.logger.error("[%s] record fails with %s: %s", record.local_identifier,
+                          type(exc).__name__, exc, exc_info=exc)
+        if self.fct_fail_record is not None:
+            self.fct_fail_record(record, exc)
+
+    def _may_take(self, n_running, exhausted) -> bool:
+        if self.shutdown.requested or self.failed or exhausted:
+            return False
+        if n_running >= self.n_concurrent:
+            return False
+        return self.max_records <= 0 or self.n_processed + n_running < self.max_records
+
+    def _process_named(self, record: df_r.Record):
+        threading.current_thread().name = f'odem.record.{record.local_identifier}'
+        return self.fct_process_record(record)
+
+    def _is_last(self) -> bool:
+        return 0 < self.max_records <= self.n_processed + 1
@@ -0,0 +1,104 @@
+"""
+Compare record makespan for page dispatch policies.
+
+Replays estimated page costs, either from the images of a
+local record directory or from a synthetic record with some
+huge foldout plates at the end, on a given number of executors
+the way OCRWorkflowRunner dispatches them: next page goes to
+the first executor getting idle.
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import typing
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+import lib.odem.ocr.ocr_workflow as odem_wf
+import lib.odem.processing.image as odem_img
+
+# observed OCR-D runtime per megapixel (seconds)
+DEFAULT_SECONDS_PER_MPS = 12.0
+
+
+def simulate_makespan(costs: typing.List[float], dispatch_order: typing.List[int],
+                      n_executors: int) -> typing.Tuple[float, float]:
+    """Replay dispatch of page costs onto executors and
+    return makespan and share of idle executor time"""
+
+    executors = [0.0] * n_executors
+    heapq.heapify(executors)
+    for i in dispatch_order:
+        heapq.heappush(executors, heapq.heappop(executors) + costs[i])
+    makespan = max(executors)
+    if makespan == 0:
+        return 0.0, 0.0
+    idle_share = 1 - sum(costs) / (makespan * n_executors)
+    return makespan, idle_share
+
+
+def costs_from_dir(image_dir) -> typing.List[float]:
+    """Estimate costs of images in (METS) order of their names"""
+
+    images = sorted(a_file for a_file in os.listdir(image_dir)
+                    if odem_img.has_image_ext(a_file))
+    return [odem_wf.estimate_page_cost(os.path.join(image_dir, an_image))
+            for an_image in images]
+
+
+def costs_synthetic(n_pages, n_plates, seed) -> typing.List[float]:
+    """Regular A4 pages (~4-9 MP) with large plates
+    (~30-45 MP) at the end of the record"""
+
+    rnd = random.Random(seed)
+    pages = [rnd.uniform(4.0, 9.0) for _ in range(n_pages - n_plates)]
+    plates = [rnd.uniform(30.0, 45.0) for _ in range(n_plates)]
+    return pages + plates
+
+
+def main():
+    """Print makespan for each known scheduling policy"""
+
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("image_dir", nargs='?', default=None,
+                            help="local record image dir (optional; default: synthetic record)")
+    arg_parser.add_argument("-e", "--executors", type=int, default=8,
+                            help="number of executors (optional; default: 8)")
+    arg_parser.add_argument("-n", "--pages", type=int, default=400,
+                            help="synthetic record pages (optional; default: 400)")
+    arg_parser.add_argument("-p", "--plates", type=int, default=6,
+                            help="synthetic record trailing plates (optional; default: 6)")
+    arg_parser.add_argument("-s", "--seed", type=int, default=1,
+                            help="synthetic record random seed (optional; default: 1)")
+    arg_parser.add_argument("--seconds-per-mps", type=float, default=DEFAULT_SECONDS_PER_MPS,
+                            help=f"runtime per megapixel (optional; default: {DEFAULT_SECONDS_PER_MPS})")
+    args = arg_parser.parse_args()
+
+    if args.image_dir:
+        costs = costs_from_dir(args.image_dir)
+        label = args.image_dir
+    else:
+        costs = costs_synthetic(args.pages, args.plates, args.seed)
+        label = f"synthetic ({args.pages} pages, {args.plates} trailing plates)"
+    costs = [c * args.seconds_per_mps for c in costs]
+    print(f"{label}: {len(costs)} pages, {args.executors} executors, "
+          f"total {sum(costs) / 60:.1f}min of work")
+    baseline = None
+    for name, policy in odem_wf.SCHEDULING_POLICIES.items():
+        makespan, idle_share = simulate_makespan(costs, policy(costs), args.executors)
+        if baseline is None:
+            baseline = makespan
+        gain = (1 - makespan / baseline) * 100 if baseline else 0
+        print(f"{name:>16}: makespan {makespan / 60:7.1f}min, "
+              f"idle {idle_share * 100:5.1f}%, gain {gain:5.1f}%")
+
+
+if __name__ == '__main__':
+    main()
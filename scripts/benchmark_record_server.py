@@ -0,0 +1,123 @@
+"""
+Measure throughput and latency of the record server.
+
+Serves a temporary record list or store with n records by
+an in-process record server and lets concurrent clients
+take records and report their final state as fast as they
+can, like a fleet of workers would, only much faster.
+Reports requests per second, p50/p99 latency and for
+stores how many state writes shared a single commit.
+"""
+
+import argparse
+import concurrent.futures
+import logging
+import math
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import typing
+
+from pathlib import Path
+
+import digiflow.record as df_r
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+import lib.odem.record_store as odem_rs
+
+LIST_LABEL = 'benchmark'
+
+_HEADER = [df_r.FIELD_IDENTIFIER, df_r.FIELD_INFO, df_r.FIELD_STATE, df_r.FIELD_STATETIME]
+
+
+def write_records(data_dir: Path, n_records, use_store) -> Path:
+    """Record list (or store) with n open records"""
+
+    list_path = data_dir / f"{LIST_LABEL}.csv"
+    lines = ['\t'.join(_HEADER)]
+    lines.extend(f"oai:benchmark:{i}\tn.a.\t{df_r.UNSET_LABEL}\tn.a."
+                 for i in range(1, n_records + 1))
+    list_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    if not use_store:
+        return list_path
+    store_path = data_dir / f"{LIST_LABEL}.sqlite"
+    odem_rs.import_record_list(list_path, store_path).close()
+    list_path.unlink()
+    return store_path
+
+
+def run_client(port, latencies: typing.List[float]):
+    """Take records and report them done until exhausted"""
+
+    client = df_r.Client(LIST_LABEL, '127.0.0.1', port, logger=logging.getLogger(__name__))
+    while True:
+        started = time.perf_counter()
+        try:
+            record = client.get_record(df_r.UNSET_LABEL, 'ocr_busy')
+        except df_r.RecordsExhaustedException:
+            return
+        latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        client.update(status='ocr_done', oai_urn=record.identifier, client='benchmark')
+        latencies.append(time.perf_counter() - started)
+
+
+def percentile(values: typing.List[float], share: float) -> float:
+    """Value below which given share of values lies"""
+
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def main():
+    """Run clients against server and print figures"""
+
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("-n", "--records", type=int, default=2000,
+                            help="records to serve (optional; default: 2000)")
+    arg_parser.add_argument("-c", "--clients", type=int, default=16,
+                            help="concurrent clients (optional; default: 16)")
+    arg_parser.add_argument("-t", "--threads", type=int, default=8,
+                            help="server threads (optional; default: 8)")
+    arg_parser.add_argument("--list", action='store_true',
+                            help="serve plain record list instead of store")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as data_dir:
+        data_path = write_records(Path(data_dir), args.records, not args.list)
+        start_data = df_r.HandlerInformation(data_dir, logging.getLogger('record-server'))
+        start_data.server_threads = args.threads
+        server = odem_rs.create_server('127.0.0.1', 0, start_data)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        latencies: typing.List[float] = []
+        started = time.perf_counter()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=args.clients) as executor:
+                for a_future in [executor.submit(run_client, server.server_address[1],
+                                                 latencies)
+                                 for _ in range(args.clients)]:
+                    a_future.result()
+        finally:
+            server.shutdown()
+            server.server_close()
+        elapsed = time.perf_counter() - started
+        print(f"{data_path.name}: {args.records} records, {args.clients} clients, "
+              f"{args.threads} server threads")
+        print(f"requests: {len(latencies)} in {elapsed:.2f}s = "
+              f"{len(latencies) / elapsed:.1f} rps")
+        print(f"latency : p50 {statistics.median(latencies) * 1000:.1f}ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+        store = odem_rs.RecordStoreRequestHandler.stores.pop(str(data_path), None)
+        if store is not None:
+            print(f"writes  : {store.n_writes} in {store.n_commits} commits")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Convert between plain record list files and SQLite
+record stores, which keep lookups of next open record
+and state updates cheap for lists with millions of rows.
+
+    python scripts/record_store.py import <list-file> <store.sqlite>
+    python scripts/record_store.py export <store.sqlite> <list-file>
+    python scripts/record_store.py states <store.sqlite>
+    python scripts/record_store.py hints <store.sqlite> <hints-file>
+
+Hints files are tab separated with header IDENTIFIER
+and any of PAGES, BYTES, MEGAPIXELS, DEADLINE
+"""
+
+import argparse
+import sys
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+import lib.odem.record_store as odem_rs
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description="manage SQLite record stores")
+    COMMANDS = PARSER.add_subparsers(dest="command", required=True)
+    IMPORT = COMMANDS.add_parser("import", help="add records from list file to store")
+    IMPORT.add_argument("list_file")
+    IMPORT.add_argument("store")
+    IMPORT.add_argument("--data-fields", nargs='+', required=False,
+                        help="schema of list file (default: it's header)")
+    EXPORT = COMMANDS.add_parser("export", help="write records from store to list file")
+    EXPORT.add_argument("store")
+    EXPORT.add_argument("list_file")
+    STATES = COMMANDS.add_parser("states", help="count records by state")
+    STATES.add_argument("store")
+    HINTS = COMMANDS.add_parser("hints", help="cache size hints for records")
+    HINTS.add_argument("store")
+    HINTS.add_argument("hints_file")
+    ARGS = PARSER.parse_args()
+
+    if ARGS.command == "import":
+        STORE = odem_rs.import_record_list(ARGS.list_file, ARGS.store, ARGS.data_fields)
+        print(f"{STORE.total_len} records in {ARGS.store}")
+    elif ARGS.command == "export":
+        STORE = odem_rs.SQLiteRecordHandler(ARGS.store)
+        print(f"exported {STORE.export_list(ARGS.list_file)} records to {ARGS.list_file}")
+    elif ARGS.command == "hints":
+        STORE = odem_rs.SQLiteRecordHandler(ARGS.store)
+        print(f"size hints for {STORE.import_size_hints(ARGS.hints_file)} records")
+    else:
+        STORE = odem_rs.SQLiteRecordHandler(ARGS.store)
+        for STATE, N_RECORDS in sorted(STORE.count_states().items()):
+            print(f"{STATE}\t{N_RECORDS}")
+    STORE.close()
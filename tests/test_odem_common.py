@@ -127,3 +127,41 @@ def test_work_dir_record_input(tmp_path):
 
     # assert
     assert proc.local_mode is False
+
+
+def test_copy_configparser_independent():
+    """Changes to copy don't leak into origin,
+    interpolated values stay intact"""
+
+    origin = fixture_configuration()
+    origin.set(odem.CFG_SEC_EXP, odem.CFG_SEC_EXP_OPT_NAME, '//mods:identifier')
+
+    the_copy = odem.copy_configparser(origin)
+    the_copy.set(odem.CFG_SEC_EXP, odem.CFG_SEC_EXP_OPT_NAME, 'foo+bar')
+
+    assert origin.get(odem.CFG_SEC_EXP, odem.CFG_SEC_EXP_OPT_NAME) == '//mods:identifier'
+    for a_section in origin.sections():
+        assert dict(the_copy.items(a_section, raw=True)).keys() == \
+            dict(origin.items(a_section, raw=True)).keys()
+    assert the_copy.getlist(odem.CFG_SEC_FLOW, 'data_fields') == \
+        origin.getlist(odem.CFG_SEC_FLOW, 'data_fields')
+
+
+def test_timed_stages_sum_up(tmp_path):
+    """Stages running several times are summed up,
+    also if they fail, bytes written are counted"""
+
+    the_cfg = fixture_configuration()
+    proc = odem.ODEMProcessImpl(configuration=the_cfg, work_dir=tmp_path, record=None)
+
+    for _ in range(2):
+        with proc.timed('export_data'):
+            (tmp_path / "export.bin").write_bytes(b'0' * 4096)
+    with pytest.raises(ValueError):
+        with proc.timed('load'):
+            raise ValueError("load failed")
+
+    stages = proc.statistics[odem.STATS_KEY_STAGES]
+    assert sorted(stages) == ['export_data', 'load']
+    assert sorted(stages['load']) == ['cpu', 'read', 'wall', 'written']
+    assert stages['export_data']['written'] >= 8192
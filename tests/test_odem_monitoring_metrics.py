@@ -0,0 +1,75 @@
+"""Specification record metrics"""
+
+import pytest
+
+import lib.odem.monitoring.metrics as odem_metrics
+
+
+@pytest.mark.parametrize("the_timedelta,seconds",
+                         [("0:00:42", 42.0),
+                          ("1:02:03", 3723.0),
+                          ("2 days, 0:00:01", 172801.0),
+                          ("n.a.", None),
+                          (None, None)])
+def test_timedelta_seconds(the_timedelta, seconds):
+    """Durations as formatted by datetime.timedelta"""
+
+    assert odem_metrics.timedelta_seconds(the_timedelta) == seconds
+
+
+@pytest.mark.parametrize("info,exc_class",
+                         [({'ODEMException': 'no images', 'exception': 'ODEMDerivateException'},
+                           'ODEMDerivateException'),
+                          ({'ODEMNoImagesForOCRException': 'no images'},
+                           'ODEMNoImagesForOCRException'),
+                          ({'client': '127.0.0.1',
+                            'info': {'NotEnoughDiskSpaceException': 'full'}},
+                           'NotEnoughDiskSpaceException'),
+                          ({'n_ocr': 12, 'host': 'worker01'}, None),
+                          ('n.a.', None)])
+def test_exception_class(info, exc_class):
+    """Exception class reported either way by worker"""
+
+    assert odem_metrics.exception_class(info) == exc_class
+
+
+def test_render_throughput_and_failures():
+    """Pages and MB relate to processing time per host,
+    failures to all records finished"""
+
+    metrics = odem_metrics.RecordMetrics()
+    metrics.observe({'n_ocr': 100, 'mb': 30.0, 'timedelta': '0:30:00', 'host': 'worker01'},
+                    'ocr_done')
+    metrics.observe({'n_ocr': 20, 'mb': 6.0, 'timedelta': '0:30:00', 'host': 'worker01'},
+                    'ocr_done')
+    metrics.observe({'n_ocr': 10, 'mb': 1.5, 'timedelta': '0:15:00'}, 'ocr_done', '10.0.0.2')
+    metrics.observe({'PermissionError': '13', 'exception': 'PermissionError'}, 'ocr_fail')
+    metrics.observe({'client': '10.0.0.2'}, 'ocr_busy')
+
+    lines = metrics.render({'records': {'n.a.': 3, 'ocr_busy': 1}}).splitlines()
+
+    assert 'odem_pages_total{host="worker01"} 120' in lines
+    assert 'odem_pages_per_hour{host="worker01"} 120' in lines
+    assert 'odem_pages_per_hour{host="10.0.0.2"} 40' in lines
+    assert 'odem_megabytes_per_minute{host="worker01"} 0.6' in lines
+    assert 'odem_record_failures_total{exception="PermissionError"} 1' in lines
+    assert 'odem_record_failure_ratio{exception="PermissionError"} 0.25' in lines
+    assert 'odem_records{list="records",state="ocr_busy"} 1' in lines
+    assert '# TYPE odem_records gauge' in lines
+
+
+def test_skips_are_no_failures():
+    """Records skipped by exception of their own
+    count as skipped, not as failed"""
+
+    metrics = odem_metrics.RecordMetrics()
+    metrics.observe({'ODEMNoTypeForOCRException': 'no type'}, 'ocr_skip_type')
+    metrics.observe({'ODEMModelMissingException': 'no model'}, 'ocr_skip_model')
+    metrics.observe({'ODEMException': 'bad', 'exception': 'ODEMDataException'}, 'ocr_fail')
+
+    lines = metrics.render().splitlines()
+
+    assert sum(metrics.failures.values()) == 1
+    assert metrics.skips['ODEMNoTypeForOCRException'] == 1
+    assert 'odem_records_skipped_total{reason="ODEMModelMissingException"} 1' in lines
+    assert 'odem_record_failure_ratio{exception="ODEMDataException"} 0.333333' in lines
@@ -0,0 +1,97 @@
+"""Specification for resource monitoring"""
+
+import pytest
+
+import lib.odem as odem
+import lib.odem.monitoring.datatypes as odem_mdt
+import lib.odem.monitoring.resource as odem_rm
+
+from .conftest import fixture_configuration
+
+GIB = 1024 ** 3
+
+
+@pytest.mark.parametrize("limit,n_bytes",
+                         [
+                             ('4GiB', 4 * GIB),
+                             ('4g', 4 * GIB),
+                             ('512m', 512 * 1024 ** 2),
+                             ('1.5GB', int(1.5 * GIB)),
+                             ('2048', 2048),
+                         ])
+def test_parse_memory_limit(limit, n_bytes):
+    """Docker-like memory limits are binary"""
+
+    assert odem_rm.parse_memory_limit(limit) == n_bytes
+
+
+def test_parse_memory_limit_invalid():
+    """Reject gibberish"""
+
+    with pytest.raises(ValueError):
+        odem_rm.parse_memory_limit('plenty')
+
+
+def test_cpu_pressure_from_psi(tmp_path):
+    """Read avg10 of 'some' line from PSI"""
+
+    psi_file = tmp_path / "cpu"
+    psi_file.write_text("some avg10=12.34 avg60=2.70 avg300=2.05 total=25390182\n"
+                        "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+
+    assert odem_rm.ResourceMonitor.get_cpu_pressure(str(psi_file)) == 12.34
+    assert odem_rm.ResourceMonitor.get_cpu_pressure(str(tmp_path / "missing")) is None
+
+
+def test_capacity_of_work_root(tmp_path):
+    """Capacity reported to record server"""
+
+    capacity = odem_rm.ResourceMonitor.get_capacity(str(tmp_path))
+
+    assert capacity.cores >= 1
+    assert capacity.memory_available > 0
+    assert capacity.disk_free > 0
+
+
+def _scaler(load_per_cpu, cpu_pressure, memory_available):
+    config = odem_mdt.ExecutorScalerConfig(floor=2, ceiling=4,
+                                           memory_per_executor=4 * GIB,
+                                           interval=0)
+    return odem_rm.ExecutorScaler(
+        config, lambda: odem_mdt.RmLoad(load_per_cpu, cpu_pressure, memory_available))
+
+
+@pytest.mark.parametrize("load,pressure,memory,n_current,n_proposed",
+                         [
+                             (0.2, 1.0, 64 * GIB, 3, 4),
+                             (0.2, 1.0, 64 * GIB, 4, 4),
+                             (0.2, None, 64 * GIB, 3, 4),
+                             (1.5, 1.0, 64 * GIB, 3, 2),
+                             (0.2, 40.0, 64 * GIB, 3, 2),
+                             (0.2, 1.0, 2 * GIB, 3, 2),
+                             (0.2, 1.0, 2 * GIB, 2, 2),
+                             (0.2, 1.0, 6 * GIB, 3, 3),
+                             (0.2, 20.0, 64 * GIB, 3, 3),
+                         ])
+def test_executor_scaler_propose(load, pressure, memory, n_current, n_proposed):
+    """Grow with spare CPU and memory, shrink
+    with overloaded CPU or memory shortage,
+    but always stay between floor and ceiling"""
+
+    assert _scaler(load, pressure, memory).propose(n_current) == n_proposed
+
+
+def test_executor_scaler_from_configuration():
+    """Adaptive executors disabled by default, if enabled
+    respect container memory limit per executor"""
+
+    config = fixture_configuration()
+    assert odem_rm.scaler_from_configuration(config, 8) is None
+
+    config.set(odem.CFG_SEC_OCR, 'n_executors_adaptive', 'True')
+    config.set(odem.CFG_SEC_OCR, 'n_executors_min', '2')
+    config.set(odem.CFG_SEC_OCR, 'n_executors_max', '32')
+    the_scaler = odem_rm.scaler_from_configuration(config, 8)
+
+    assert (the_scaler.floor, the_scaler.ceiling) == (2, 32)
+    assert the_scaler.clamp(64) == 32
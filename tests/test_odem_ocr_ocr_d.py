@@ -1,9 +1,17 @@
 """Specification for OCR-D related functionalities"""
 
+import concurrent.futures
+import subprocess
+import threading
+import time
+import unittest
+import unittest.mock
+
 from pathlib import Path
 
 import digiflow as df
 import lxml.etree as ET
+import PIL.Image
 
 import pytest
 
@@ -75,3 +83,235 @@ def test_create_workspace_mets(tmp_path):
 
     assert (path_workspace / "MAX" / "00000001.png").exists()
     assert not (tmp_path / "00000001.png").exists()
+
+
+def test_create_workspace_mets_dated(tmp_path, monkeypatch):
+    """Each workspace dated when it's created,
+    though rendered from the same template"""
+
+    path_image: Path = tmp_path / "00000001.tif"
+    create_test_tif(path_image)
+    monkeypatch.setattr(o3o_ocrd.time, "strftime", lambda _: "2024-01-31T23:59:59")
+    o3o_ocrd.setup_workspace(tmp_path / "ws_01", path_image)
+    monkeypatch.setattr(o3o_ocrd.time, "strftime", lambda _: "2024-02-01T00:00:01")
+    o3o_ocrd.setup_workspace(tmp_path / "ws_02", path_image)
+
+    created = [ET.parse(tmp_path / ws / "mets.xml").getroot().find(".//mets:metsHdr", df.XMLNS)
+               for ws in ("ws_01", "ws_02")]
+    assert created[0].get("CREATEDATE") == "2024-01-31T23:59:59"
+    assert created[1].get("CREATEDATE") == "2024-02-01T00:00:01"
+    assert created[1].findtext("mets:agent/mets:name", namespaces=df.XMLNS) == "OCR-D"
+
+
+def test_create_workspace_mets_multiple_pages(tmp_path):
+    """Each image gets it's own physical page
+    in common workspace in given order"""
+
+    images = []
+    for i in range(1, 4):
+        path_image = tmp_path / f"{i:08d}.tif"
+        create_test_tif(path_image)
+        images.append(path_image)
+
+    o3o_ocrd.setup_workspace(tmp_path / "batch", images)
+
+    ws_root = ET.parse(tmp_path / "batch" / "mets.xml").getroot()
+    pages = ws_root.findall(".//mets:div[@TYPE='page']", df.XMLNS)
+    assert [p.get("ID") for p in pages] == ["PHYS_01", "PHYS_02", "PHYS_03"]
+    assert [p.find("mets:fptr", df.XMLNS).get("FILEID") for p in pages] == \
+        ["MAX_01", "MAX_02", "MAX_03"]
+    assert (tmp_path / "batch" / "MAX" / "00000003.png").exists()
+
+
+@unittest.mock.patch("subprocess.run")
+def test_container_pool_dispatch_by_exec(mock_run, tmp_path):
+    """Ensure pool starts one container per slot
+    and pages are dispatched via 'docker exec'
+    into their absolute workspace path"""
+
+    page_dir = tmp_path / "00000001"
+    page_dir.mkdir()
+    the_pool = o3o_ocrd.ContainerPool(2, "ocrd/all:2023-02-07", tmp_path,
+                                      "odem_1981185920+44046", 1000,
+                                      container_memory_limit="4GiB")
+
+    # act
+    the_pool.start()
+    the_pool.run_ocr_page(page_dir, 600, ["tesserocr-recognize -I MAX -O PAGE"],
+                          "ger.traineddata", odem.DEFAULT_RTL_MODELS)
+
+    # assert
+    cmds = [a_call.args[0] for a_call in mock_run.call_args_list]
+    assert len(cmds) == 3
+    assert cmds[0].startswith("docker run -d --rm -u 1000 --name odem_1981185920-44046_slot01")
+    assert f"-v {tmp_path}:{tmp_path}" in cmds[0]
+    assert "--memory 4GiB" in cmds[0]
+    assert cmds[0].endswith("sleep infinity")
+    assert cmds[2].startswith(f"docker exec -w {page_dir} odem_1981185920-44046_slot01")
+    assert cmds[2].endswith('ocrd process "tesserocr-recognize -I MAX -O PAGE"')
+
+
+@unittest.mock.patch("subprocess.run")
+def test_container_pool_replace_on_timeout(mock_run, tmp_path):
+    """Ensure timed out page raises as before but
+    it's container gets replaced and slot is
+    available for next page afterwards"""
+
+    page_dir = tmp_path / "00000001"
+    page_dir.mkdir()
+    the_pool = o3o_ocrd.ContainerPool(1, "ocrd/all", tmp_path, "odem_test", 1000)
+    the_pool.start()
+
+    def _exec_times_out(cmd, **_):
+        if cmd.startswith("docker exec"):
+            raise subprocess.TimeoutExpired(cmd, 600)
+        return unittest.mock.DEFAULT
+    mock_run.side_effect = _exec_times_out
+
+    # act
+    with pytest.raises(subprocess.TimeoutExpired):
+        the_pool.run_ocr_page(page_dir, 600, ["tesserocr-recognize -I MAX -O PAGE"],
+                              "ger.traineddata", odem.DEFAULT_RTL_MODELS)
+
+    # assert
+    cmds = [a_call.args[0] for a_call in mock_run.call_args_list]
+    assert "docker rm -f odem_test_slot01" in cmds
+    assert cmds[-1].startswith("docker run -d --rm -u 1000 --name odem_test_slot01")
+    assert the_pool.n_replaced == 1
+    assert the_pool._idle.qsize() == 1
+
+
+@unittest.mock.patch("subprocess.run")
+def test_container_pool_drops_slot_if_replace_fails(mock_run, tmp_path):
+    """Container which can't be replaced isn't used
+    anymore, page fails with original timeout and
+    next page gets a fresh container"""
+
+    page_dir = tmp_path / "00000001"
+    page_dir.mkdir()
+    the_pool = o3o_ocrd.ContainerPool(1, "ocrd/all", tmp_path, "odem_test", 1000)
+    the_pool.start()
+    docker_down = [True]
+
+    def _replace_fails(cmd, **_):
+        if cmd.startswith("docker exec") and docker_down[0]:
+            raise subprocess.TimeoutExpired(cmd, 600)
+        if cmd.startswith("docker run") and docker_down[0]:
+            raise subprocess.CalledProcessError(125, cmd)
+        return unittest.mock.DEFAULT
+    mock_run.side_effect = _replace_fails
+
+    # act
+    with pytest.raises(subprocess.TimeoutExpired) as timeout_exc:
+        the_pool.run_ocr_page(page_dir, 600, [], "ger", [])
+
+    assert isinstance(timeout_exc.value.__cause__, subprocess.CalledProcessError)
+    assert the_pool._containers == []  # pylint:disable=protected-access
+    assert the_pool.n_replaced == 0
+    docker_down[0] = False
+    the_pool.run_ocr_page(page_dir, 600, [], "ger", [])
+    cmds = [a_call.args[0] for a_call in mock_run.call_args_list]
+    assert cmds[-2].startswith("docker run -d --rm -u 1000 --name odem_test_slot01")
+    assert cmds[-1].startswith(f"docker exec -w {page_dir} odem_test_slot01")
+
+
+@unittest.mock.patch("subprocess.run")
+def test_container_pool_grows_on_demand(mock_run, tmp_path):
+    """Pool started with fewer warm containers than
+    slots starts further ones only if all are busy"""
+
+    page_dir = tmp_path / "00000001"
+    page_dir.mkdir()
+    the_pool = o3o_ocrd.ContainerPool(3, "ocrd/all", tmp_path, "odem_test", 1000)
+    the_pool.start(1)
+    the_pool.run_ocr_page(page_dir, 600, [], "ger", [])
+    n_started = len(the_pool._containers)  # pylint:disable=protected-access
+
+    busy = the_pool._idle.get()  # pylint:disable=protected-access
+    the_pool.run_ocr_page(page_dir, 600, [], "ger", [])
+
+    cmds = [a_call.args[0] for a_call in mock_run.call_args_list]
+    assert n_started == 1
+    assert busy == "odem_test_slot01"
+    assert cmds[-2].startswith("docker run -d --rm -u 1000 --name odem_test_slot02")
+    assert cmds[-1].startswith(f"docker exec -w {page_dir} odem_test_slot02")
+
+
+@unittest.mock.patch("subprocess.run")
+def test_container_pool_bounds_concurrent_records(mock_run, tmp_path):
+    """Pages of several records processed at once by
+    worker's pool never run more containers than slots"""
+
+    the_pool = o3o_ocrd.ContainerPool(2, "ocrd/all", tmp_path, "odem_worker", 1000)
+    the_pool.start(1)
+    in_exec = []
+    peak = []
+    exec_lock = threading.Lock()
+
+    def _slow_exec(cmd, **_):
+        if cmd.startswith("docker exec"):
+            with exec_lock:
+                in_exec.append(cmd)
+                peak.append(len(in_exec))
+            time.sleep(0.02)
+            with exec_lock:
+                in_exec.remove(cmd)
+        return unittest.mock.DEFAULT
+    mock_run.side_effect = _slow_exec
+    page_dirs = []
+    for record in ("record_01", "record_02", "record_03"):
+        for page in ("00000001", "00000002"):
+            page_dirs.append(tmp_path / record / page)
+            page_dirs[-1].mkdir(parents=True)
+
+    # act
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(page_dirs)) as executor:
+        list(executor.map(lambda d: the_pool.run_ocr_page(d, 600, [], "ger", []), page_dirs))
+
+    cmds = [a_call.args[0] for a_call in mock_run.call_args_list]
+    assert len([c for c in cmds if c.startswith("docker run")]) == 2
+    assert max(peak) <= 2
+    assert len(the_pool._containers) == 2  # pylint:disable=protected-access
+
+
+def test_container_pool_rejects_foreign_workspace(tmp_path):
+    """Page workspaces outside pool mount can't be
+    seen from within pool containers"""
+
+    the_pool = o3o_ocrd.ContainerPool(1, "ocrd/all", tmp_path / "record", "odem_test", 1000)
+
+    with pytest.raises(odem.ODEMException):
+        the_pool.run_ocr_page(tmp_path / "other", 600, [], "ger", [])
+
+
+def _create_test_jpg(path_image, dpi=None):
+    the_img = PIL.Image.new('L', (60, 100), 255)
+    if dpi is None:
+        the_img.save(path_image)
+    else:
+        the_img.save(path_image, dpi=dpi)
+
+
+def test_create_workspace_native_jpg(tmp_path):
+    """JPG accepted by processors and carrying
+    resolution enters workspace as it is,
+    without resolution it's converted anyway"""
+
+    _create_test_jpg(tmp_path / "00000001.jpg", (300, 300))
+    _create_test_jpg(tmp_path / "00000002.jpg")
+
+    o3o_ocrd.setup_workspace(tmp_path / "batch",
+                             [tmp_path / "00000001.jpg", tmp_path / "00000002.jpg"],
+                             native_formats=['.jpg', '.tif'])
+
+    ws_root = ET.parse(tmp_path / "batch" / "mets.xml").getroot()
+    ws_files = ws_root.findall(".//mets:fileGrp[@USE='MAX']/mets:file", df.XMLNS)
+    assert [f.get("MIMETYPE") for f in ws_files] == ["image/jpeg", "image/png"]
+    assert [f.find("mets:FLocat", df.XMLNS).get("{http://www.w3.org/1999/xlink}href")
+            for f in ws_files] == ["MAX/00000001.jpg", "MAX/00000002.png"]
+    assert (tmp_path / "batch" / "MAX" / "00000001.jpg").exists()
+    assert (tmp_path / "00000001.jpg").exists()
+    assert o3o_ocrd.collect_page_results(tmp_path / "batch", "MAX") == {
+        "PHYS_01": tmp_path / "batch" / "MAX" / "00000001.jpg",
+        "PHYS_02": tmp_path / "batch" / "MAX" / "00000002.png",
+    }
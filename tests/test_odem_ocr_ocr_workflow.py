@@ -0,0 +1,712 @@
+"""Specification for OCR workflow implementations"""
+
+import concurrent.futures
+import configparser
+import random
+import re
+import shutil
+import subprocess
+import threading
+import time
+import unittest
+import unittest.mock
+
+from pathlib import Path
+
+import digiflow as df
+import digiflow.record as df_r
+import lxml.etree as ET
+
+import pytest
+
+import lib.odem as odem
+import lib.odem.monitoring.datatypes as odem_mdt
+import lib.odem.monitoring.resource as odem_rm
+import lib.odem.ocr.ocr_workflow as odem_wf
+import lib.odem.processing.download as odem_download
+
+from .conftest import TEST_RES, create_test_tif, fixture_configuration
+
+# pylint:disable=c-extension-no-member
+
+_METS_NS = "{http://www.loc.gov/METS/}"
+
+
+def _fake_ocrd_run(poisoned_pages, called_workspaces):
+    """Mimic 'ocrd process' run: register a PAGE result for
+    each workspace page, unless it contains poisoned page"""
+
+    def _run_ocrd(_, ocr_dir, __, n_pages=1, **___):
+        ws_mets = Path(ocr_dir) / "mets.xml"
+        mets_tree = ET.parse(ws_mets)
+        hrefs = [l.get("{http://www.w3.org/1999/xlink}href")
+                 for l in mets_tree.getroot().iterfind(".//mets:FLocat", df.XMLNS)]
+        called_workspaces.append([Path(h).stem for h in hrefs])
+        assert len(hrefs) == n_pages
+        if any(Path(h).stem in poisoned_pages for h in hrefs):
+            raise subprocess.CalledProcessError(1, "ocrd process")
+        file_sec = mets_tree.getroot().find(".//mets:fileSec", df.XMLNS)
+        page_group = ET.SubElement(file_sec, f"{_METS_NS}fileGrp", {"USE": "PAGE"})
+        (Path(ocr_dir) / "PAGE").mkdir()
+        for i, a_page in enumerate(mets_tree.getroot().iterfind(".//mets:div[@TYPE='page']",
+                                                                 df.XMLNS), start=1):
+            a_file = ET.SubElement(page_group, f"{_METS_NS}file", {"ID": f"PAGE_{i:04d}"})
+            ET.SubElement(a_file, f"{_METS_NS}FLocat",
+                          {"{http://www.w3.org/1999/xlink}href": f"PAGE/PAGE_{i:04d}.xml",
+                           "LOCTYPE": "OTHER", "OTHERLOCTYPE": "FILE"})
+            ET.SubElement(a_page, f"{_METS_NS}fptr", {"FILEID": f"PAGE_{i:04d}"})
+            (Path(ocr_dir) / "PAGE" / f"PAGE_{i:04d}.xml").write_text(hrefs[i - 1])
+        mets_tree.write(str(ws_mets))
+        return ('0.1', 'run_ocr_page')
+
+    return _run_ocrd
+
+
+@pytest.fixture(name="page_parallel")
+def _fixture_page_parallel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    work_dir = tmp_path / "1981185920_44046"
+    (work_dir / "MAX").mkdir(parents=True)
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    record = df_r.Record('oai:opendata.uni-halle.de:1981185920/44046')
+    odem_proc = odem.ODEMProcessImpl(record, fixture_configuration(), work_dir,
+                                     str(log_dir), odem.get_worker_logger(str(log_dir)))
+    odem_proc.configuration.set(odem.CFG_SEC_FLOW, 'local_log_dir', str(log_dir))
+    candidates = []
+    for i in range(1, 8):
+        image_path = work_dir / "MAX" / f"{i:08d}.tif"
+        create_test_tif(image_path)
+        candidates.append((str(image_path), f"PHYS_{i:04d}"))
+    odem_proc.ocr_candidates = candidates
+    monkeypatch.setattr(odem.ODEMProcessImpl, "map_language_to_modelconfig",
+                        lambda *_: "ger.traineddata")
+    yield odem.OCRDPageParallel(odem_proc)
+
+
+def test_batch_inputs_by_configured_size(page_parallel):
+    """Candidates grouped into batches, remainder batch smaller"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'ocrd_batch_size', '3')
+
+    batches = page_parallel.get_inputs()
+
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert batches[0][0] == page_parallel.odem_process.ocr_candidates[0]
+
+
+def test_batch_results_per_page(page_parallel, monkeypatch):
+    """Results of common workspace mapped back
+    onto the very page they belong to"""
+
+    called = []
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd", _fake_ocrd_run([], called))
+    batch = page_parallel.odem_process.ocr_candidates[:4]
+
+    results = page_parallel.run(batch)
+
+    assert len(called) == 1
+    assert [Path(r.local_path).name for r in results] == \
+        ["00000001.xml", "00000002.xml", "00000003.xml", "00000004.xml"]
+    assert Path(results[2].local_path).read_text() == "MAX/00000003.png"
+    assert Path(results[2].local_path).parent.name == "PAGE"
+
+
+def test_batch_split_on_failure(page_parallel, monkeypatch):
+    """Failing batch gets split in halves until
+    the bad page is isolated, others succeed"""
+
+    called = []
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd",
+                        _fake_ocrd_run(["00000003"], called))
+    batch = page_parallel.odem_process.ocr_candidates[:4]
+
+    results = page_parallel.run(batch)
+
+    assert called == [["00000001", "00000002", "00000003", "00000004"],
+                      ["00000001", "00000002"],
+                      ["00000003", "00000004"],
+                      ["00000003"],
+                      ["00000004"]]
+    assert [r.local_path == odem.UNSET for r in results] == [False, False, True, False]
+
+
+def test_page_parallel_stress_no_shared_cwd(tmp_path, monkeypatch):
+    """Run many fake pages with as many executors and
+    ensure each page only ever touches it's very own
+    workspace and nobody changes process working dir"""
+
+    monkeypatch.chdir(tmp_path)
+    work_dir = tmp_path / "1981185920_44046"
+    (work_dir / "MAX").mkdir(parents=True)
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    record = df_r.Record('oai:opendata.uni-halle.de:1981185920/44046')
+    odem_proc = odem.ODEMProcessImpl(record, fixture_configuration(), work_dir,
+                                     str(log_dir), odem.get_worker_logger(str(log_dir)))
+    odem_proc.configuration.set(odem.CFG_SEC_FLOW, 'local_log_dir', str(log_dir))
+    n_pages = 40
+    candidates = []
+    for i in range(1, n_pages + 1):
+        image_path = work_dir / "MAX" / f"{i:08d}.tif"
+        create_test_tif(image_path)
+        candidates.append((str(image_path), f"PHYS_{i:04d}"))
+    odem_proc.ocr_candidates = candidates
+    monkeypatch.setattr(odem.ODEMProcessImpl, "map_language_to_modelconfig",
+                        lambda *_: "ger.traineddata")
+
+    def _forbidden_chdir(path):
+        raise AssertionError(f"chdir to {path}")
+    monkeypatch.setattr("os.chdir", _forbidden_chdir)
+
+    touched = {}
+    lock = threading.Lock()
+
+    def _fake_container_run(cmd, **kwargs):
+        # 'ocrd process' writes into container workdir
+        # which is the mounted page workspace
+        ocr_dir = Path(re.search(r"-v (\S+):/data", cmd).group(1))
+        assert Path(kwargs["cwd"]) == ocr_dir
+        images = [p.name for p in (ocr_dir / "MAX").iterdir()]
+        with lock:
+            touched.setdefault(ocr_dir.name, []).extend(images)
+        time.sleep(random.uniform(0.001, 0.02))
+        (ocr_dir / "PAGE").mkdir()
+        (ocr_dir / "PAGE" / "PAGE_01.xml").write_text(images[0])
+        return subprocess.CompletedProcess(cmd, 0)
+
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 32, odem_proc.logger,
+                                    odem.OCRDPageParallel(odem_proc))
+    with unittest.mock.patch("subprocess.run", side_effect=_fake_container_run):
+        results = runner.run_parallel(odem_proc.ocr_candidates)
+
+    assert len(results) == n_pages
+    assert touched == {f"{i:08d}": [f"{i:08d}.png"] for i in range(1, n_pages + 1)}
+    for i, a_result in enumerate(results, start=1):
+        assert Path(a_result.local_path).name == f"{i:08d}.xml"
+        assert Path(a_result.local_path).read_text() == f"{i:08d}.png"
+    assert Path.cwd() == tmp_path
+
+
+def test_adaptive_executors_report_concurrency(page_parallel, monkeypatch):
+    """Adaptive runner grows in flight pages up to
+    ceiling, keeps results in input order and
+    reports peak and mean concurrency"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'n_executors_adaptive', 'True')
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'n_executors_min', '1')
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'n_executors_max', '3')
+    page_parallel.config.set(odem.CFG_SEC_MONITOR, 'polling_interval', '0')
+    monkeypatch.setattr(odem_rm.ResourceMonitor, "get_load",
+                        lambda: odem_mdt.RmLoad(0.1, 0.0, 1024 ** 4))
+    monkeypatch.setattr(odem.OCRDPageParallel, "process_outputs", lambda *_: None)
+    in_flight = []
+    lock = threading.Lock()
+
+    def _fake_run(_, input_data):
+        with lock:
+            in_flight.append(input_data)
+        time.sleep(0.02)
+        with lock:
+            in_flight.remove(input_data)
+        return odem.OCRResult(input_data[0])
+    monkeypatch.setattr(odem.OCRDPageParallel, "run", _fake_run)
+    timeouts = []
+    the_wait = concurrent.futures.wait
+
+    def _wait(futures, timeout=None, return_when=concurrent.futures.ALL_COMPLETED):
+        timeouts.append(timeout)
+        return the_wait(futures, timeout=timeout, return_when=return_when)
+    monkeypatch.setattr(concurrent.futures, "wait", _wait)
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 1, page_parallel.logger,
+                                    page_parallel)
+
+    runner.run()
+
+    assert runner.concurrency_peak == 3
+    # zero polling interval must not busy wait
+    assert min(timeouts) == odem_wf.MIN_POLL_INTERVAL
+    the_stats = page_parallel.odem_process.process_statistics
+    assert the_stats[odem.STATS_KEY_N_EXECS_PEAK] == 3
+    assert 1 <= the_stats[odem.STATS_KEY_N_EXECS_MEAN] <= 3
+    assert the_stats[odem.STATS_KEY_STAGES][odem.STAGE_OCR]['wall'] >= 0.02
+    assert odem.STAGE_PAGE_TO_ALTO in the_stats[odem.STATS_KEY_STAGES]
+
+
+def test_page_slots_shared_by_records(page_parallel, monkeypatch):
+    """Runners of concurrent records share page slots,
+    which bound total pages in flight, and report the
+    time spent waiting for a free slot"""
+
+    monkeypatch.setattr(odem.OCRDPageParallel, "process_outputs", lambda *_: None)
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def _fake_run(_, input_data):
+        with lock:
+            in_flight.append(input_data)
+            peak.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.remove(input_data)
+        return odem.OCRResult(input_data[0])
+    monkeypatch.setattr(odem.OCRDPageParallel, "run", _fake_run)
+    page_slots = threading.BoundedSemaphore(2)
+    runners = [odem.OCRWorkflowRunner(f"record_{i}", 4, page_parallel.logger,
+                                      page_parallel, page_slots=page_slots)
+               for i in range(2)]
+    threads = [threading.Thread(target=r.run) for r in runners]
+
+    for a_thread in threads:
+        a_thread.start()
+    for a_thread in threads:
+        a_thread.join()
+
+    assert max(peak) == 2
+    assert sum(r.slot_wait for r in runners) > 0
+    assert odem.STATS_KEY_SLOT_WAIT in page_parallel.odem_process.process_statistics
+
+
+def test_schedule_largest_first():
+    """Most expensive first, ties keep order"""
+
+    assert odem_wf.schedule_largest_first([1.0, 40.0, 2.0, 2.0, 12.5]) == [1, 4, 2, 3, 0]
+
+
+def test_largest_first_keeps_mets_order(page_parallel, monkeypatch):
+    """Huge plate at the very end dispatched first,
+    nevertheless outcomes stay in METS order"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'scheduling_policy', 'largest_first')
+    foldout = page_parallel.odem_process.ocr_candidates[-1][0]
+    create_test_tif(Path(foldout), 600, 1000)
+    dispatched = []
+
+    def _fake_run(_, input_data):
+        dispatched.append(input_data[0])
+        return odem.OCRResult(input_data[0])
+    monkeypatch.setattr(odem.OCRDPageParallel, "run", _fake_run)
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 1, page_parallel.logger,
+                                    page_parallel)
+
+    outcomes = runner.run_parallel(page_parallel.odem_process.ocr_candidates)
+
+    assert dispatched[0] == foldout
+    assert [o.local_path for o in outcomes] == \
+        [c[0] for c in page_parallel.odem_process.ocr_candidates]
+
+
+def test_stream_outputs_while_ocr_running(page_parallel, monkeypatch):
+    """With streaming enabled, first page gets converted to
+    ALTO while last page is still running, final results
+    refer to ALTO files in METS order"""
+
+    page_parallel.stream_outputs = True
+    work_dir = Path(page_parallel.odem_process.work_dir_root)
+    (work_dir / "PAGE").mkdir()
+    candidates = page_parallel.odem_process.ocr_candidates[:3]
+    page_parallel.odem_process.ocr_candidates = candidates
+
+    def _fake_run(_, input_data):
+        file_id = Path(input_data[0]).stem
+        if file_id == "00000003":
+            # 'ocr' last page until first one converted
+            for _ in range(200):
+                if (work_dir / "FULLTEXT" / "00000001.xml").is_file():
+                    break
+                time.sleep(0.01)
+            else:
+                return odem.OCRResult(odem.UNSET)
+        page_file = work_dir / "PAGE" / f"{file_id}.xml"
+        shutil.copy(TEST_RES / "OCR-RESULT_0001.xml", page_file)
+        return odem.OCRResult(str(page_file))
+    monkeypatch.setattr(odem.OCRDPageParallel, "run", _fake_run)
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 2, page_parallel.logger,
+                                    page_parallel)
+
+    results = runner.run()
+
+    assert [r.local_path for r in results] == \
+        [work_dir / "FULLTEXT" / f"0000000{i}.xml" for i in range(1, 4)]
+    assert "alto" in (work_dir / "FULLTEXT" / "00000003.xml").read_text()
+
+
+@pytest.mark.parametrize("n_workers", ['1', '3'])
+def test_postprocessing_process_pool_deterministic(page_parallel, n_workers):
+    """Same ALTO output in same order, no matter
+    how many post-OCR worker processes"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'n_postprocess_workers', n_workers)
+    work_dir = Path(page_parallel.odem_process.work_dir_root)
+    (work_dir / "PAGE").mkdir()
+    outcomes = []
+    for i in range(1, 5):
+        page_file = work_dir / "PAGE" / f"{i:08d}.xml"
+        shutil.copy(TEST_RES / "OCR-RESULT_0001.xml", page_file)
+        outcomes.append(odem.OCRResult(str(page_file), 1.0, float(i)))
+
+    page_parallel.process_outputs(outcomes)
+
+    assert [r.local_path.name for r in page_parallel.ocr_results] == \
+        [f"{i:08d}.xml" for i in range(1, 5)]
+    assert [r.images_mps for r in page_parallel.ocr_results] == [1.0, 2.0, 3.0, 4.0]
+    altos = {(work_dir / "FULLTEXT" / f"{i:08d}.xml").read_text() for i in range(1, 5)}
+    assert len(altos) == 1
+
+
+def test_retry_oom_with_escalated_memory(page_parallel):
+    """Page killed due OOM is retried in fresh container
+    with doubled memory limit and counted as recovered"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'ocrd_page_retries', '2')
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'ocrd_retry_backoff', '0')
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'docker_container_memory_limit', '4GiB')
+    cmds = []
+
+    def _fake_container_run(cmd, **kwargs):
+        cmds.append(cmd)
+        if len(cmds) == 1:
+            raise subprocess.CalledProcessError(137, cmd)
+        ocr_dir = Path(kwargs["cwd"])
+        (ocr_dir / "PAGE").mkdir()
+        (ocr_dir / "PAGE" / "PAGE_01.xml").write_text("<PcGts/>")
+        return subprocess.CompletedProcess(cmd, 0)
+
+    with unittest.mock.patch("subprocess.run", side_effect=_fake_container_run):
+        result = page_parallel.run(page_parallel.odem_process.ocr_candidates[0])
+
+    assert Path(result.local_path).name == "00000001.xml"
+    assert "--memory 4GiB" in cmds[0]
+    assert "--memory 8192m" in cmds[1]
+    assert "--name 1981185920_44046_00000001_1 " in cmds[1]
+    assert page_parallel.statistics == {
+        odem.STATS_KEY_RETRIES: {'pages': 1, 'attempts': 1, 'oom': 1, 'recovered': 1}}
+
+
+def test_retry_exhausted(page_parallel):
+    """Page timing out each time gets lost after
+    configured retries, which is recorded"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'ocrd_page_retries', '2')
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'ocrd_retry_backoff', '0')
+
+    with unittest.mock.patch("subprocess.run",
+                             side_effect=subprocess.TimeoutExpired("docker run", 600)) as mock_run:
+        result = page_parallel.run(page_parallel.odem_process.ocr_candidates[0])
+
+    assert result.local_path == odem.UNSET
+    assert mock_run.call_count == 3
+    assert page_parallel.statistics == {
+        odem.STATS_KEY_RETRIES: {'pages': 1, 'attempts': 2, 'timeout': 2, 'failed': 1}}
+
+
+def test_resume_only_missing_pages(page_parallel, monkeypatch):
+    """Broken run leaves manifest with completed pages,
+    resumed run only ocrs missing or corrupted pages"""
+
+    work_dir = Path(page_parallel.odem_process.work_dir_root)
+    (work_dir / "PAGE").mkdir()
+    monkeypatch.setattr(odem.OCRDPageParallel, "process_outputs",
+                        lambda wf, outcomes: setattr(wf, "ocr_results", outcomes))
+    ocred = []
+    crashes = ["00000005"]
+
+    def _fake_run(_, input_data):
+        file_id = Path(input_data[0]).stem
+        ocred.append(file_id)
+        if file_id in crashes:
+            crashes.remove(file_id)
+            raise OSError("worker died")
+        page_file = work_dir / "PAGE" / f"{file_id}.xml"
+        page_file.write_text(f"<PcGts>{file_id}</PcGts>")
+        return odem.OCRResult(str(page_file), 1.0, 2.0)
+    monkeypatch.setattr(odem.OCRDPageParallel, "run", _fake_run)
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 1, page_parallel.logger,
+                                    page_parallel)
+    with pytest.raises(odem.ODEMException):
+        runner.run()
+    (work_dir / "PAGE" / "00000002.xml").write_text("<PcGts>garbage</PcGts>")
+
+    # act
+    page_parallel.config.set(odem.CFG_SEC_FLOW, odem.CFG_SEC_FLOW_OPT_RESUME, 'True')
+    ocred.clear()
+    results = runner.run()
+
+    assert ocred == ["00000002", "00000005", "00000006", "00000007"]
+    assert len(results) == 7
+    assert page_parallel.odem_process.process_statistics[odem.STATS_KEY_N_RESUMED] == 3
+    assert len(page_parallel.odem_process.ocr_candidates) == 7
+
+
+@pytest.mark.parametrize("resume,kept", [('True', True), ('False', False)])
+def test_failed_record_keeps_work_dir_to_resume(page_parallel, resume, kept):
+    """Work dir with manifest survives failure only
+    if next run is going to resume"""
+
+    odem_process = page_parallel.odem_process
+    odem_process.manifest.path.write_text("")
+    odem_process.configuration.set(odem.CFG_SEC_FLOW, odem.CFG_SEC_FLOW_OPT_RESUME, resume)
+
+    # act
+    odem_process.clear_mets_resources(keep_resumable=True)
+
+    assert odem_process.manifest.path.is_file() == kept
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_tesseract_checkpoints_final_output(page_parallel, monkeypatch, n_workers):
+    """Page is postprocessed without blocking run and
+    checkpointed as postprocessed and moved to fulltext
+    subdir, not as raw pipeline output"""
+
+    odem_process = page_parallel.odem_process
+    work_dir = Path(odem_process.work_dir_root)
+    odem_process.configuration.set(odem.CFG_SEC_OCR, 'fulltext_subdir', 'FULLTEXT_FINAL')
+    odem_process.configuration.set(odem.CFG_SEC_OCR, 'n_postprocess_workers', str(n_workers))
+    (work_dir / "FULLTEXT").mkdir()
+    raw_alto = TEST_RES / '0041.xml'
+
+    def _fake_pipeline(input_data):
+        alto_path = work_dir / "FULLTEXT" / Path(input_data[0][0]).with_suffix('.xml').name
+        shutil.copyfile(raw_alto, alto_path)
+        return odem.OCRResult(alto_path)
+    monkeypatch.setattr(odem_wf.odem_tess, "run_pipeline", _fake_pipeline)
+    tesseract = odem.ODEMTesseract(odem_process)
+    odem_process.resume_ocr()
+
+    # act
+    a_result = tesseract.run((odem_process.ocr_candidates[0], 1, 7, tesseract.logger,
+                              configparser.ConfigParser()))
+    tesseract.checkpoint(a_result)
+    assert odem_process.manifest.read() == {}
+    tesseract.process_outputs([a_result])
+
+    assert tesseract.ocr_results == [a_result]
+    entry = odem_process.manifest.read()["00000001"]
+    assert entry.path == "FULLTEXT_FINAL/00000001.xml"
+    assert a_result.local_path.read_bytes() != raw_alto.read_bytes()
+    assert odem_process.manifest.verify(entry, "ger.traineddata")
+
+
+def test_result_cache_skips_known_pages(page_parallel, monkeypatch, tmp_path):
+    """Second run of same images takes results from cache,
+    until OCR-D processors change"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'result_cache_dir', str(tmp_path / "cache"))
+    called = []
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd", _fake_ocrd_run([], called))
+    batch = page_parallel.odem_process.ocr_candidates[:4]
+    odem.OCRDPageParallel(page_parallel.odem_process).run(batch)
+    shutil.rmtree(Path(page_parallel.odem_process.work_dir_root) / "PAGE")
+
+    # act
+    rerun = odem.OCRDPageParallel(page_parallel.odem_process)
+    results = rerun.run(batch)
+
+    assert len(called) == 1
+    assert Path(results[2].local_path).read_text() == "MAX/00000003.png"
+    assert rerun.statistics[odem.STATS_KEY_CACHE]['hits'] == 4
+    assert rerun.statistics[odem.STATS_KEY_CACHE]['misses'] == 0
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'ocrd_process_list', 'tesserocr-recognize')
+    changed = odem.OCRDPageParallel(page_parallel.odem_process)
+    changed.run(batch[0])
+    assert len(called) == 2
+    assert changed.statistics[odem.STATS_KEY_CACHE]['misses'] == 1
+
+
+def test_result_cache_respects_rtl_models(page_parallel, monkeypatch, tmp_path):
+    """Models read right-to-left change OCR-D result"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'result_cache_dir', str(tmp_path / "cache"))
+    called = []
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd", _fake_ocrd_run([], called))
+    a_page = page_parallel.odem_process.ocr_candidates[0]
+    odem.OCRDPageParallel(page_parallel.odem_process).run(a_page)
+
+    # act
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'tesseract_model_rtl', 'ara')
+    changed = odem.OCRDPageParallel(page_parallel.odem_process)
+    changed.run(a_page)
+
+    assert len(called) == 2
+    assert changed.statistics[odem.STATS_KEY_CACHE]['misses'] == 1
+
+
+def test_tesseract_cache_hit_keeps_statistics(page_parallel, monkeypatch, tmp_path):
+    """Cached Tesseract result comes with estimation
+    statistics of pipeline run creating it"""
+
+    odem_process = page_parallel.odem_process
+    work_dir = Path(odem_process.work_dir_root)
+    odem_process.configuration.set(odem.CFG_SEC_OCR, 'result_cache_dir', str(tmp_path / "cache"))
+    called = []
+
+    def _fake_pipeline(input_data):
+        called.append(input_data)
+        alto_path = Path(input_data[0][0]).with_suffix('.xml')
+        shutil.copyfile(TEST_RES / '0041.xml', alto_path)
+        a_result = odem.OCRResult(alto_path)
+        a_result.statistics = (97.5, 120, 3, 40, 2, 1, 38)
+        return a_result
+    monkeypatch.setattr(odem_wf.odem_tess, "run_pipeline", _fake_pipeline)
+    input_data = (odem_process.ocr_candidates[0], 1, 7, page_parallel.logger,
+                  configparser.ConfigParser())
+    odem.ODEMTesseract(odem_process).run(input_data)
+    (work_dir / "MAX" / "00000001.xml").unlink()
+
+    # act
+    a_result = odem.ODEMTesseract(odem_process).run(input_data)
+
+    assert len(called) == 1
+    assert a_result.statistics == (97.5, 120, 3, 40, 2, 1, 38)
+
+
+@unittest.mock.patch("subprocess.run")
+def test_records_share_worker_container_pool(mock_run, page_parallel, tmp_path):
+    """Pool provided by long running worker for all records
+    beneath it's work root isn't replaced nor stopped by
+    any record's workflow, thus bounds containers in total"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'docker_container_pool', 'True')
+    worker_pool = odem.create_container_pool(page_parallel.config, 2, tmp_path, "odem_worker")
+    worker_pool.start()
+
+    # act
+    for _ in range(3):
+        a_workflow = odem.OCRDPageParallel(page_parallel.odem_process)
+        a_workflow.container_pool = worker_pool
+        a_workflow.start(4, 4)
+        a_workflow.stop()
+
+    cmds = [a_call.args[0] for a_call in mock_run.call_args_list]
+    assert len(cmds) == 2
+    assert all(f"-v {tmp_path}:{tmp_path}" in a_cmd for a_cmd in cmds)
+    assert worker_pool.is_running
+
+
+def test_prefetch_converts_images_ahead(page_parallel, monkeypatch):
+    """Images converted by prefetch stage in dispatch
+    order, staged images cleared afterwards"""
+
+    page_parallel.config.set(odem.CFG_SEC_OCR, 'ocrd_prefetch_pages', '2')
+    converted = []
+    ensure_format_png = odem_wf.odem_img.ensure_format_png
+
+    def _record_conversion(image_path, *args):
+        converted.append((Path(image_path).stem, threading.current_thread().name))
+        return ensure_format_png(image_path, *args)
+    monkeypatch.setattr(odem_wf.odem_img, "ensure_format_png", _record_conversion)
+    called = []
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd", _fake_ocrd_run([], called))
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 2, page_parallel.logger,
+                                    page_parallel)
+    page_parallel.start(2)
+
+    outcomes = runner.run_parallel(page_parallel.odem_process.ocr_candidates)
+    page_parallel.stop()
+
+    assert len(called) == 7
+    assert Path(outcomes[2].local_path).read_text() == "MAX/00000003.png"
+    assert [stem for stem, _ in converted] == [f"{i:08d}" for i in range(1, 8)]
+    assert all(thread.startswith("odem.prefetch") for _, thread in converted)
+    work_dir = Path(page_parallel.odem_process.work_dir_root)
+    assert not (work_dir / odem_wf.PREFETCH_DIR).exists()
+    assert not list((work_dir / "MAX").glob("*.png"))
+
+
+def test_page_stats_from_probed_images(page_parallel, monkeypatch):
+    """Cost estimation and page statistics reuse
+    image features probed before"""
+
+    image_path = page_parallel.odem_process.ocr_candidates[0][0]
+    page_parallel.odem_process.image_infos[image_path] = \
+        odem_wf.odem_img.ImageInfo(2 * 1048576, 2000, 3000, 400, 'L', 8)
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd", _fake_ocrd_run([], []))
+
+    result = page_parallel.run(page_parallel.odem_process.ocr_candidates[0])
+
+    assert page_parallel.estimate_cost(page_parallel.odem_process.ocr_candidates[0]) == 6.0
+    assert (result.images_mps, result.images_fsize) == (6.0, 2.0)
+
+
+class _FakeDownloader:
+    """Write test images in place of download"""
+
+    n_workers = 1
+
+    def __init__(self, failing):
+        self.failing = failing
+        self.loaded = []
+        self.statistics = {}
+
+    def load(self, resource):
+        if resource.url in self.failing:
+            raise RuntimeError(f"load {resource.url} exception: 503")
+        create_test_tif(Path(resource.local_path))
+        self.loaded.append(Path(resource.local_path).stem)
+
+
+def test_streaming_ocr_while_loading(page_parallel, monkeypatch):
+    """Pages run as their images arrive, failed
+    download reported per page after the others
+    have been done and checkpointed"""
+
+    odem_proc = page_parallel.odem_process
+    for image_path, _ in odem_proc.ocr_candidates:
+        Path(image_path).unlink()
+    odem_proc.streaming = True
+    fake_downloader = _FakeDownloader(["http://host/00000004"])
+    monkeypatch.setattr(odem.ODEMProcessImpl, "_create_loader", lambda *_: None)
+    monkeypatch.setattr(odem.ODEMProcessImpl, "_create_downloader", lambda *_: fake_downloader)
+    monkeypatch.setattr(odem.ODEMProcessImpl, "image_resources",
+                        lambda proc: [odem_download.ImageResource(f"http://host/{Path(p).stem}", p)
+                                      for p, _ in proc.ocr_candidates])
+    called = []
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd", _fake_ocrd_run([], called))
+    monkeypatch.setattr(odem.OCRDPageParallel, "process_outputs",
+                        lambda wf, outcomes: setattr(wf, "ocr_results", outcomes))
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 2, page_parallel.logger,
+                                    page_parallel)
+
+    with pytest.raises(odem.ODEMDownloadException) as odem_exc:
+        runner.run()
+
+    assert "download failed for 1 images" in odem_exc.value.args[0]
+    assert sorted(w[0] for w in called) == ["00000001", "00000002", "00000003",
+                                            "00000005", "00000006", "00000007"]
+    assert list(odem_proc.process_statistics[odem.STATS_KEY_DOWNLOAD_FAILS]) == \
+        ["00000004.tif"]
+    assert len(odem_proc.manifest.read()) == 6
+
+
+def test_failed_stream_keeps_manifest_to_resume(page_parallel, monkeypatch):
+    """Pages done before download failed survive
+    cleanup and are spared by resumed run"""
+
+    odem_proc = page_parallel.odem_process
+    odem_proc.configuration.set(odem.CFG_SEC_FLOW, odem.CFG_SEC_FLOW_OPT_RESUME, 'True')
+    for image_path, _ in odem_proc.ocr_candidates:
+        Path(image_path).unlink()
+    odem_proc.streaming = True
+    monkeypatch.setattr(odem.ODEMProcessImpl, "_create_loader", lambda *_: None)
+    monkeypatch.setattr(odem.ODEMProcessImpl, "_create_downloader",
+                        lambda *_: _FakeDownloader(["http://host/00000004"]))
+    monkeypatch.setattr(odem.ODEMProcessImpl, "image_resources",
+                        lambda proc: [odem_download.ImageResource(f"http://host/{Path(p).stem}", p)
+                                      for p, _ in proc.ocr_candidates])
+    monkeypatch.setattr(odem.OCRDPageParallel, "_run_ocrd", _fake_ocrd_run([], []))
+    monkeypatch.setattr(odem.OCRDPageParallel, "process_outputs",
+                        lambda wf, outcomes: setattr(wf, "ocr_results", outcomes))
+    runner = odem.OCRWorkflowRunner("1981185920_44046", 2, page_parallel.logger,
+                                    page_parallel)
+    with pytest.raises(odem.ODEMDownloadException):
+        runner.run()
+
+    # act
+    odem_proc.clear_mets_resources(keep_resumable=True)
+
+    assert len(odem_proc.manifest.read()) == 6
+    odem_proc.resume_ocr()
+    assert odem_proc.process_statistics[odem.STATS_KEY_N_RESUMED] == 6
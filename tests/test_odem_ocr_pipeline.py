@@ -2,8 +2,10 @@
 """Tests OCR Pipeline API"""
 
 import json
+import logging
 import os
 import shutil
+import time
 import unittest
 import unittest.mock
 
@@ -47,7 +49,56 @@ def test_ocr_pipeline_profile():
     # act
     inner = InnerClass()
     result = o3o_pop.profile(inner.func)
-    assert "test_ocr_pipeline_profile run" in result
+    assert isinstance(result, float)
+    assert result > 0
+
+
+def test_run_pipeline_collects_step_timings(tmp_path, monkeypatch):
+    """Each step's run is timed by it's class
+    and aggregated over all pages of record"""
+
+    # pylint: disable=missing-class-docstring,too-few-public-methods
+    class StepFast:
+        path_next = None
+
+        def execute(self):
+            pass
+
+    class StepSlow(StepFast):
+
+        def execute(self):
+            time.sleep(0.01)
+
+    image_path = tmp_path / "0001.jpg"
+    image_path.write_bytes(b'')
+    image_path.chmod(0o664)
+    tmp_path.chmod(0o775)
+    monkeypatch.setattr(o3o_pop, "init_steps", lambda _: [StepSlow(), StepFast(), StepFast()])
+    the_logger = logging.getLogger(__name__)
+
+    results = [o3o_pop.run_pipeline((str(image_path), i, 2, the_logger, None))
+               for i in (1, 2)]
+
+    assert sorted(results[0].step_timings) == ['StepFast', 'StepSlow']
+    assert len(results[0].step_timings['StepFast']) == 2
+    timings = o3o_pop.aggregate_step_timings(results + [odem.OCRResult(odem.UNSET)])
+    assert timings['StepFast']['count'] == 4
+    assert timings['StepSlow']['count'] == 2
+    assert timings['StepSlow']['p50'] >= 0.01
+    assert timings['StepSlow']['mean'] <= timings['StepSlow']['max']
+
+
+def test_aggregate_step_timings_nearest_rank():
+    """Median of two samples is the lower one, not max"""
+
+    a_result = odem.OCRResult(Path('0001.xml'))
+    a_result.step_timings = {'StepTesseract': [2.0, 1.0]}
+
+    timings = o3o_pop.aggregate_step_timings([a_result])
+
+    assert timings['StepTesseract']['p50'] == 1.0
+    assert timings['StepTesseract']['p95'] == 2.0
+    assert timings['StepTesseract']['max'] == 2.0
 
 
 @pytest.fixture(name="a_workspace")
@@ -0,0 +1,225 @@
+"""Specification for download of record resources"""
+
+import hashlib
+import http.server
+import threading
+import time
+
+from pathlib import Path
+
+import pytest
+
+import lib.odem.processing.download as odem_download
+
+
+@pytest.mark.parametrize("file_group,file_type,url,file_id,local_name",
+                         [
+                             ('MAX', 'image/jpeg', 'http://host/res/00000001.jpg', None,
+                              '00000001.jpg'),
+                             ('MAX', 'image/jpeg', 'http://host/res/00000001', None,
+                              '00000001.jpg'),
+                             ('MAX', 'image/tiff', 'http://host/res/00000001.tif', None,
+                              '00000001.tif.jpg'),
+                             ('MAX', 'image/jpeg', 'http://host/res/1', 'FILE_0001_MAX',
+                              'FILE_0001_MAX.jpg'),
+                             ('ORIGINAL', 'image/tiff', 'http://host/res/00000001.tif', None,
+                              '00000001.tif'),
+                         ])
+def test_local_image_path(file_group, file_type, url, file_id, local_name):
+    """Local layout like digiflow.OAILoader"""
+
+    local_path = odem_download.local_image_path('/wrk/123', file_group, file_type, url, file_id)
+
+    assert local_path == Path('/wrk/123') / file_group / local_name
+
+
+def _fake_load(failing=()):
+    def _load(resource):
+        if resource.url in failing:
+            raise RuntimeError(f"load {resource.url} exception: 404")
+        Path(resource.local_path).write_bytes(b"0" * 100)
+    return _load
+
+
+def test_image_stream_announces_pages(tmp_path):
+    """Only pages of interest announced in order,
+    failures as well, end of stream as None"""
+
+    resources = [odem_download.ImageResource(f"http://host/{i}", str(tmp_path / f"{i}.jpg")) for i in range(1, 5)]
+    stream = odem_download.ImageStream(resources, _fake_load(["http://host/3"]),
+                                       [r.local_path for r in resources[1:]])
+
+    stream.start()
+    announced = [stream.get(timeout=1) for _ in range(4)]
+    stream.stop()
+
+    assert announced == [(str(tmp_path / "2.jpg"), True),
+                         (str(tmp_path / "3.jpg"), False),
+                         (str(tmp_path / "4.jpg"), True),
+                         None]
+    assert list(stream.failures) == [str(tmp_path / "3.jpg")]
+    assert (tmp_path / "1.jpg").exists()
+    assert stream.n_loaded == 3
+
+
+def test_image_stream_bounded(tmp_path):
+    """Download doesn't run ahead of consumption
+    more than queue size pages"""
+
+    resources = [odem_download.ImageResource(f"http://host/{i}", str(tmp_path / f"{i}.jpg")) for i in range(1, 21)]
+    stream = odem_download.ImageStream(resources, _fake_load(),
+                                       [r.local_path for r in resources], queue_size=4)
+
+    stream.start()
+    time.sleep(0.3)
+    n_loaded_unconsumed = stream.n_loaded
+    stream.stop()
+
+    assert n_loaded_unconsumed == 5
+
+
+def test_image_stream_disk_check_fatal(tmp_path):
+    """Disk check sees projected record size,
+    exception stops download and ends stream"""
+
+    checked = []
+
+    def _check_disk(bytes_loaded, bytes_projected):
+        checked.append((bytes_loaded, bytes_projected))
+        if len(checked) == 2:
+            raise OSError("disk full")
+
+    resources = [odem_download.ImageResource(f"http://host/{i}", str(tmp_path / f"{i}.jpg")) for i in range(1, 11)]
+    stream = odem_download.ImageStream(resources, _fake_load(), [],
+                                       fct_check_disk=_check_disk)
+
+    stream.start()
+    assert stream.get(timeout=1) is None
+    stream.stop()
+
+    assert checked == [(100, 1000), (200, 1000)]
+    assert isinstance(stream.error, OSError)
+    assert stream.n_loaded == 2
+
+
+_IMAGE_DATA = bytes(range(256)) * 64
+
+
+class _RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serve image data with range support,
+    count requests and concurrency per path"""
+
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def do_GET(self):  # pylint:disable=invalid-name
+        """Respond range or complete data"""
+        with self.lock:
+            self.requests.append((self.path, self.headers.get('Range')))
+            self.active.append(self.path)
+            self.peak.append(len(self.active))
+        time.sleep(0.05)
+        data = _IMAGE_DATA
+        status = 200
+        the_range = self.headers.get('Range')
+        if the_range is not None:
+            data = data[int(the_range[len('bytes='):-1]):]
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.lock:
+            self.active.remove(self.path)
+
+    def log_message(self, *_):
+        pass
+
+
+@pytest.fixture(name="image_server")
+def _fixture_image_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _RangeHandler)
+    _RangeHandler.requests.clear()
+    _RangeHandler.peak.clear()
+    a_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    a_thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_downloader_skips_matching_checksum(tmp_path, image_server):
+    """Files matching METS CHECKSUM aren't requested
+    again, mismatching ones are replaced"""
+
+    checksum = hashlib.md5(_IMAGE_DATA).hexdigest()
+    (tmp_path / "1.jpg").write_bytes(_IMAGE_DATA)
+    (tmp_path / "2.jpg").write_bytes(b"broken")
+    resources = [odem_download.ImageResource(f"{image_server}/{i}", str(tmp_path / f"{i}.jpg"),
+                                             checksum=checksum, checksum_type='MD5')
+                 for i in (1, 2)]
+    downloader = odem_download.ConcurrentDownloader(n_workers=2)
+
+    failures = downloader.load_all(resources)
+    downloader.close()
+
+    assert not failures
+    assert [r[0] for r in _RangeHandler.requests] == ["/2"]
+    assert (tmp_path / "2.jpg").read_bytes() == _IMAGE_DATA
+    assert downloader.statistics[odem_download.DOWNLOAD_STATS_SKIPPED] == 1
+    assert downloader.statistics[odem_download.DOWNLOAD_STATS_LOADED] == 1
+
+
+def test_downloader_resumes_partial_file(tmp_path, image_server):
+    """Partial file is completed by range request"""
+
+    (tmp_path / "1.jpg.part").write_bytes(_IMAGE_DATA[:1000])
+    resource = odem_download.ImageResource(f"{image_server}/1", str(tmp_path / "1.jpg"),
+                                           size=len(_IMAGE_DATA))
+    downloader = odem_download.ConcurrentDownloader(n_workers=1)
+
+    assert downloader.load(resource)
+    downloader.close()
+
+    assert _RangeHandler.requests == [("/1", "bytes=1000-")]
+    assert (tmp_path / "1.jpg").read_bytes() == _IMAGE_DATA
+    assert not (tmp_path / "1.jpg.part").exists()
+    assert downloader.statistics[odem_download.DOWNLOAD_STATS_RESUMED] == 1
+    assert downloader.statistics[odem_download.DOWNLOAD_STATS_BYTES] == len(_IMAGE_DATA) - 1000
+
+
+def test_downloader_mismatching_size_fails(tmp_path, image_server):
+    """Loaded data not matching METS SIZE is
+    reported as failure and not kept"""
+
+    resource = odem_download.ImageResource(f"{image_server}/1", str(tmp_path / "1.jpg"),
+                                           size=42)
+    downloader = odem_download.ConcurrentDownloader(n_workers=1)
+
+    failures = downloader.load_all([resource])
+    downloader.close()
+
+    assert list(failures) == [str(tmp_path / "1.jpg")]
+    assert "SIZE/CHECKSUM" in failures[str(tmp_path / "1.jpg")]
+    assert not (tmp_path / "1.jpg").exists()
+    assert not (tmp_path / "1.jpg.part").exists()
+
+
+def test_downloader_limits_requests_per_host(tmp_path, image_server):
+    """More workers than allowed per host
+    don't exceed host's limit"""
+
+    resources = [odem_download.ImageResource(f"{image_server}/{i}", str(tmp_path / f"{i}.jpg"))
+                 for i in range(1, 9)]
+    downloader = odem_download.ConcurrentDownloader(n_workers=8, max_per_host=2)
+
+    failures = downloader.load_all(resources)
+    downloader.close()
+
+    assert not failures
+    assert len(_RangeHandler.requests) == 8
+    assert max(_RangeHandler.peak) <= 2
@@ -45,3 +45,37 @@ def test_format_tif_imput(tmp_path: Path):
 
     result_image = PIL.Image.open(result)
     assert "dpi" in result_image.info
+
+
+def test_format_png_fast_into_output_dir(tmp_path: Path):
+    """Fast compressed PNG put into given dir keeps DPI"""
+
+    path_img = tmp_path / "my.tif"
+    out_dir = tmp_path / "staged"
+    out_dir.mkdir()
+    create_test_tif(path_img)
+
+    result = oi.ensure_format_png(path_img, compress_level=1, output_dir=out_dir)
+
+    assert result == out_dir / "my.png"
+    assert not (tmp_path / "my.png").exists()
+    assert oi.get_imageinfo(result) == (0.006, 300.0)
+    assert oi.has_dpi(result)
+
+
+def test_probe_image_header(tmp_path: Path):
+    """Probe size, resolution, mode and bit depth"""
+
+    path_tif = tmp_path / "my.tif"
+    create_test_tif(path_tif, 600, 1000)
+    path_png = tmp_path / "my16.png"
+    PIL.Image.new('I;16', (20, 10)).save(path_png)
+
+    tif_info = oi.probe_image(path_tif)
+    png_info = oi.probe_image(path_png)
+
+    assert (tif_info.width, tif_info.height, tif_info.dpi) == (600, 1000, 300)
+    assert (tif_info.mode, tif_info.bit_depth) == ('L', 8)
+    assert tif_info.mps == 0.6
+    assert tif_info.file_size == path_tif.stat().st_size
+    assert (png_info.mode, png_info.bit_depth, png_info.dpi) == ('I;16', 16, 0)
@@ -0,0 +1,42 @@
+"""Specification for page manifest"""
+
+import lib.odem.processing.manifest as odem_manifest
+
+
+def test_manifest_survives_broken_last_line(tmp_path):
+    """Entry written partially when worker died is ignored,
+    latest entry for a page wins"""
+
+    (tmp_path / "PAGE").mkdir()
+    page_01 = tmp_path / "PAGE" / "00000001.xml"
+    page_01.write_text("<PcGts/>")
+    manifest = odem_manifest.PageManifest(tmp_path)
+    manifest.append("00000001", page_01, "ger.traineddata", 1.2, 7.5)
+    page_01.write_text("<PcGts></PcGts>")
+    manifest.append("00000001", page_01, "ger.traineddata", 1.2, 7.5)
+    with open(manifest.path, 'a', encoding='utf-8') as writer:
+        writer.write('{"page": "00000002", "path": "PAG')
+
+    entries = manifest.read()
+
+    assert list(entries) == ["00000001"]
+    assert entries["00000001"].path == "PAGE/00000001.xml"
+    assert entries["00000001"].size == len("<PcGts></PcGts>")
+    assert entries["00000001"].images_mps == 7.5
+
+
+def test_manifest_verify(tmp_path):
+    """Entries only valid for unchanged output
+    created with same model configuration"""
+
+    page_01 = tmp_path / "00000001.xml"
+    page_01.write_text("<PcGts/>")
+    manifest = odem_manifest.PageManifest(tmp_path)
+    entry = manifest.append("00000001", page_01, "ger.traineddata")
+
+    assert manifest.verify(entry, "ger.traineddata")
+    assert not manifest.verify(entry, "lat.traineddata")
+    page_01.write_text("<PcGts>")
+    assert not manifest.verify(entry, "ger.traineddata")
+    page_01.unlink()
+    assert not manifest.verify(entry, "ger.traineddata")
@@ -540,3 +540,27 @@ def test_metadata_newspaper_year_provoke_exception():
 
     # assert
     assert "no PICA type for OCR: Az" in mets_ex.value.args[0]
+
+
+def test_image_files_size_and_checksum(tmp_path):
+    """Image files in METS order with optional SIZE
+    and CHECKSUM, which are missing in origin"""
+
+    mets_path = tmp_path / "1981185920_44046.xml"
+    shutil.copy(TEST_RES / "1981185920_44046.xml", mets_path)
+    tree = ET.parse(str(mets_path))
+    first_file = tree.find('.//mets:fileGrp[@USE="MAX"]/mets:file', df.XMLNS)
+    first_file.set('SIZE', '1024')
+    first_file.set('CHECKSUM', 'abc123')
+    first_file.set('CHECKSUMTYPE', 'MD5')
+    tree.write(str(mets_path))
+
+    image_files = odem_pm.image_files(mets_path, 'MAX')
+
+    assert len(image_files) == 5
+    assert image_files[0] == odem_pm.METSImageFile(
+        'IMG_MAX_1930901', 'image/jpeg',
+        'https://opendata.uni-halle.de/retrieve/8531a599-805e-414a-ac27-bc86f92e28fd/00000001.jpg',
+        1024, 'abc123', 'MD5')
+    assert image_files[1].size is None
+    assert image_files[1].checksum is None
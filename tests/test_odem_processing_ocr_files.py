@@ -90,3 +90,21 @@ def test_postprocess_empty_alto():
     assert ' Missing child element(s)' in str(inv_exc)
     assert 'Expected is ( {http://www.loc.gov/standards/alto/ns-v4#}Layout' in str(inv_exc)
     odem.postprocess_ocr_file(res_path, strip_tags)
+
+
+def test_convert_and_postprocess(tmp_path):
+    """Single PAGE file converted to sanitized ALTO
+    within destination dir named like origin"""
+
+    page_file = tmp_path / "00000001.xml"
+    page_file.write_bytes((TEST_RES / "OCR-RESULT_0001.xml").read_bytes())
+    strip_tags = fixture_configuration().getlist(odem.CFG_SEC_OCR, 'strip_tags')  # pylint: disable=no-member
+    dst_dir = tmp_path / "FULLTEXT"
+    dst_dir.mkdir()
+
+    alto_file = odem.convert_and_postprocess(str(page_file), str(dst_dir), strip_tags)
+
+    assert alto_file == str(dst_dir / "00000001.xml")
+    alto_root = ET.parse(alto_file).getroot()
+    assert alto_root.xpath('//alto:String', namespaces=df.XMLNS)
+    assert not alto_root.xpath('//alto:Shape', namespaces=df.XMLNS)
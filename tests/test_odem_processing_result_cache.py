@@ -0,0 +1,113 @@
+"""Specification for OCR result cache"""
+
+import os
+import time
+
+import lib.odem.processing.result_cache as odem_cache
+
+
+def _put(cache, tmp_path, name, size):
+    image = tmp_path / f"{name}.tif"
+    image.write_bytes(name.encode())
+    result = tmp_path / f"{name}.xml"
+    result.write_bytes(b"x" * size)
+    key = cache.create_key(image, "ger.traineddata")
+    cache.put(key, result)
+    return key
+
+
+def test_cache_key_depends_on_image_and_parts(tmp_path):
+    """Same image with other model yields other key"""
+
+    image = tmp_path / "00000001.tif"
+    image.write_bytes(b"II*\0")
+    copied = tmp_path / "00000002.tif"
+    copied.write_bytes(b"II*\0")
+
+    key = odem_cache.OCRResultCache.create_key(image, "ger.traineddata", "ocrd/all")
+
+    assert key == odem_cache.OCRResultCache.create_key(copied, "ger.traineddata", "ocrd/all")
+    assert key != odem_cache.OCRResultCache.create_key(image, "lat.traineddata", "ocrd/all")
+    assert key != odem_cache.OCRResultCache.create_key(image, "ger.traineddata")
+
+
+def test_cache_hit_and_miss(tmp_path):
+    """Hit restores result file, both counted"""
+
+    cache = odem_cache.OCRResultCache(tmp_path / "cache", 1024)
+    key = _put(cache, tmp_path, "page", 10)
+    restored = tmp_path / "PAGE" / "00000001.xml"
+
+    assert cache.get(key, restored)
+    assert restored.read_bytes() == b"x" * 10
+    assert not cache.get("0" * 64, restored)
+    assert cache.statistics[odem_cache.CACHE_STATS_HITS] == 1
+    assert cache.statistics[odem_cache.CACHE_STATS_MISSES] == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Recently read entry survives, oldest unread entry goes"""
+
+    cache = odem_cache.OCRResultCache(tmp_path / "cache", 100)
+    key_a = _put(cache, tmp_path, "a", 40)
+    key_b = _put(cache, tmp_path, "b", 40)
+    assert cache.get(key_a, tmp_path / "a_restored.xml")
+
+    key_c = _put(cache, tmp_path, "c", 40)
+
+    assert cache.total_size == 80
+    assert not cache.get(key_b, tmp_path / "b_restored.xml")
+    assert cache.get(key_a, tmp_path / "a_restored.xml")
+    assert cache.get(key_c, tmp_path / "c_restored.xml")
+    assert cache.statistics[odem_cache.CACHE_STATS_EVICTED] == 1
+
+
+def test_cache_order_persists(tmp_path):
+    """Following process sharing cache dir
+    evicts by usage of previous one"""
+
+    cache = odem_cache.OCRResultCache(tmp_path / "cache", 100)
+    key_a = _put(cache, tmp_path, "a", 40)
+    key_b = _put(cache, tmp_path, "b", 40)
+    entry_a = tmp_path / "cache" / key_a[:2] / key_a
+    past = time.time() - 60
+    os.utime(tmp_path / "cache" / key_b[:2] / key_b, (past, past))
+    assert entry_a.is_file()
+
+    following = odem_cache.OCRResultCache(tmp_path / "cache", 100)
+    _put(following, tmp_path, "c", 40)
+
+    assert following.get(key_a, tmp_path / "a_restored.xml")
+    assert not following.get(key_b, tmp_path / "b_restored.xml")
+
+
+def test_cache_skips_oversized(tmp_path):
+    """Result larger than whole cache isn't stored"""
+
+    cache = odem_cache.OCRResultCache(tmp_path / "cache", 10)
+    key = _put(cache, tmp_path, "huge", 20)
+
+    assert cache.total_size == 0
+    assert not cache.get(key, tmp_path / "restored.xml")
+
+
+def test_cache_metadata_kept_and_evicted_with_entry(tmp_path):
+    """Metadata restored by following process, doesn't
+    count as entry itself and goes along with it's entry"""
+
+    cache = odem_cache.OCRResultCache(tmp_path / "cache", 100)
+    image = tmp_path / "a.tif"
+    image.write_bytes(b"a")
+    result = tmp_path / "a.xml"
+    result.write_bytes(b"x" * 40)
+    key_a = cache.create_key(image, "ger.traineddata")
+    cache.put(key_a, result, {'statistics': [98.5, 120]})
+
+    following = odem_cache.OCRResultCache(tmp_path / "cache", 100)
+    assert following.total_size == 40
+    assert following.metadata(key_a) == {'statistics': [98.5, 120]}
+    _put(following, tmp_path, "b", 40)
+    _put(following, tmp_path, "c", 40)
+
+    assert following.metadata(key_a) == {}
+    assert not (tmp_path / "cache" / key_a[:2] / f"{key_a}.json").exists()
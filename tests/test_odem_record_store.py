@@ -0,0 +1,503 @@
+"""Specification for SQLite record store"""
+
+import concurrent.futures
+import functools
+import http.server
+import logging
+import sqlite3
+import threading
+
+import digiflow.record as df_r
+import pytest
+import requests
+
+import lib.odem.monitoring.datatypes as odem_mdt
+import lib.odem.record_store as odem_rs
+
+_HEADER = [df_r.FIELD_IDENTIFIER, df_r.FIELD_INFO, df_r.FIELD_STATE, df_r.FIELD_STATETIME]
+
+
+def _write_list(list_path, n_records, state=df_r.UNSET_LABEL):
+    lines = ['\t'.join(_HEADER)]
+    for i in range(1, n_records + 1):
+        lines.append(f"oai:host:{i}\tn.a.\t{state}\tn.a.")
+    list_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return list_path
+
+
+@pytest.fixture(name="store")
+def _fixture_store(tmp_path):
+    list_path = _write_list(tmp_path / "records.csv", 5)
+    a_store = odem_rs.import_record_list(list_path, tmp_path / "records.sqlite")
+    yield a_store
+    a_store.close()
+
+
+def test_import_keeps_schema_and_order(store):
+    """Imported records keep list's
+    header and are taken in order"""
+
+    assert store.schema == _HEADER
+    assert store.total_len == 5
+    record = store.next_record()
+    assert record.identifier == "oai:host:1"
+    assert record.context.position == 1
+
+
+def test_next_record_marks_new_state(store):
+    """Record taken with new state isn't open anymore"""
+
+    first = store.next_record(new_state='ocr_busy')
+    second = store.next_record(new_state='ocr_busy')
+
+    assert first.identifier == "oai:host:1"
+    assert second.identifier == "oai:host:2"
+    assert store.get("oai:host:1").state == 'ocr_busy'
+    assert store.count_states() == {df_r.UNSET_LABEL: 3, 'ocr_busy': 2}
+
+
+def test_next_record_exhausted(store):
+    """None left in requested state"""
+
+    assert store.next_record(state='ocr_busy') is None
+
+
+def test_concurrent_next_record_unique(tmp_path):
+    """Many threads with own connections
+    never get the same record twice"""
+
+    list_path = _write_list(tmp_path / "records.csv", 60)
+    store_path = tmp_path / "records.sqlite"
+    odem_rs.import_record_list(list_path, store_path).close()
+
+    def _take_all():
+        a_store = odem_rs.SQLiteRecordHandler(store_path)
+        taken = []
+        while (record := a_store.next_record(new_state='ocr_busy')) is not None:
+            taken.append(record.identifier)
+        a_store.close()
+        return taken
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda _: _take_all(), range(6)))
+
+    taken = [ident for a_result in results for ident in a_result]
+    assert sorted(taken) == sorted(f"oai:host:{i}" for i in range(1, 61))
+
+
+def test_save_record_state_with_info(store):
+    """State and additional fields are persisted"""
+
+    store.save_record_state("oai:host:3", 'ocr_fail', INFO="{'pages': 3}")
+
+    record = store.get("oai:host:3")
+    assert record.state == 'ocr_fail'
+    assert record.info == {'pages': 3}
+    assert record.state_time != df_r.UNSET_LABEL
+
+
+def test_save_record_state_unknown(store):
+    """Unknown records raise like file based handler"""
+
+    with pytest.raises(RuntimeError):
+        store.save_record_state("oai:host:99", 'ocr_fail')
+
+
+def test_get_inexact(store):
+    """Identifier may just be contained"""
+
+    assert store.get("host:4", exact_match=False).identifier == "oai:host:4"
+    assert store.get("host:4") is None
+
+
+def test_schema_mismatch(tmp_path, store):
+    """Fields not matching stored schema are rejected"""
+
+    with pytest.raises(df_r.RecordHandlerException):
+        odem_rs.SQLiteRecordHandler(store.data_path, data_fields=['IDENTIFIER', 'STATE'])
+    with pytest.raises(FileNotFoundError):
+        odem_rs.SQLiteRecordHandler(tmp_path / "missing.sqlite")
+
+
+def test_export_roundtrip(tmp_path, store):
+    """Exported list is readable by file based
+    handler and re-import updates states"""
+
+    store.next_record(new_state='ocr_done')
+    export_path = tmp_path / "export.csv"
+
+    assert store.export_list(export_path) == 5
+    handler = df_r.RecordHandler(export_path, data_fields=_HEADER)
+    assert handler.total_len == 5
+    assert handler.get("oai:host:1").state == 'ocr_done'
+    handler.save_record_state("oai:host:2", 'ocr_fail')
+    assert store.import_list(export_path) == 5
+    assert store.total_len == 5
+    assert store.count_states() == {df_r.UNSET_LABEL: 3, 'ocr_done': 1, 'ocr_fail': 1}
+
+
+def test_open_record_handler_by_suffix(tmp_path, store):
+    """Store picked by suffix, list file otherwise"""
+
+    list_path = _write_list(tmp_path / "other.csv", 2)
+
+    assert isinstance(odem_rs.open_record_handler(store.data_path),
+                      odem_rs.SQLiteRecordHandler)
+    assert isinstance(odem_rs.open_record_handler(list_path), df_r.RecordHandler)
+
+
+def test_server_serves_store(tmp_path):
+    """Record server hands out records from store
+    rather than list file with same name and
+    takes state updates of client"""
+
+    _write_list(tmp_path / "records.csv", 3, state='ocr_skip')
+    odem_rs.import_record_list(_write_list(tmp_path / "import.csv", 3),
+                               tmp_path / "records.sqlite").close()
+    start_data = df_r.HandlerInformation(tmp_path, logging.getLogger(__name__))
+    the_handler = functools.partial(odem_rs.RecordStoreRequestHandler, start_data)
+    server = http.server.HTTPServer(('127.0.0.1', 0), the_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = df_r.Client("records", '127.0.0.1', server.server_address[1])
+        record = client.get_record(df_r.UNSET_LABEL, 'ocr_busy')
+        client.update('ocr_done', record.identifier, pages=12)
+    finally:
+        server.shutdown()
+        server.server_close()
+    store = odem_rs.RecordStoreRequestHandler.get_store(tmp_path / "records.sqlite")
+    done = store.get("oai:host:1")
+
+    assert done.state == 'ocr_done'
+    assert done.info == {'client': '127.0.0.1', 'pages': 12}
+    assert store.count_states() == {df_r.UNSET_LABEL: 2, 'ocr_done': 1}
+
+
+def test_lease_batch(store):
+    """Batch leased at once in list order"""
+
+    leased = store.lease_records(3, new_state='ocr_busy', owner='worker01')
+
+    assert [r.identifier for r in leased] == ["oai:host:1", "oai:host:2", "oai:host:3"]
+    assert store.count_states() == {df_r.UNSET_LABEL: 2, 'ocr_busy': 3}
+    assert len(store.lease_records(3, new_state='ocr_busy', owner='worker02')) == 2
+
+
+def test_reclaim_expired_lease(store):
+    """Records with expired lease return to
+    previous state, others are kept"""
+
+    store.lease_records(2, new_state='ocr_busy', owner='worker01', lease_seconds=-1)
+    store.next_record(new_state='ocr_busy')
+
+    assert store.reclaim_expired() == ["oai:host:1", "oai:host:2"]
+    assert store.get("oai:host:1").state == df_r.UNSET_LABEL
+    assert store.get("oai:host:3").state == 'ocr_busy'
+    assert store.reclaim_expired() == []
+    # expired leases are reclaimed before leasing
+    store.lease_records(1, new_state='ocr_busy', owner='worker01', lease_seconds=-1)
+    assert store.lease_records(1, owner='worker02')[0].identifier == "oai:host:1"
+
+
+def test_reclaim_within_single_write(store):
+    """Reclaiming expired leases, taking next record
+    and noting it's client take a single write"""
+
+    store.lease_records(2, new_state='ocr_busy', owner='worker01', lease_seconds=-1)
+    reported = []
+    n_writes = store.n_writes
+
+    leased = store.lease_records(1, new_state='ocr_busy', owner='worker02',
+                                 on_reclaimed=reported.append)
+    taken = store.next_record(new_state='ocr_busy', info={'client': '10.0.0.2'},
+                              reclaim=True, on_reclaimed=reported.append)
+
+    assert store.n_writes == n_writes + 2
+    assert reported == [["oai:host:1", "oai:host:2"]]
+    assert leased[0].identifier == "oai:host:1"
+    assert taken.identifier == "oai:host:2"
+    assert taken.info == {'client': '10.0.0.2'}
+    assert store.get("oai:host:2").info == {'client': '10.0.0.2'}
+    assert store.get("oai:host:2").state == 'ocr_busy'
+
+
+def test_renew_lease_by_owner(store):
+    """Only owner renews, saved state ends lease"""
+
+    store.lease_records(2, new_state='ocr_busy', owner='worker01', lease_seconds=-1)
+    store.save_record_state("oai:host:2", 'ocr_done')
+
+    assert store.renew_leases(["oai:host:1", "oai:host:2"], owner='worker02') == []
+    assert store.renew_leases(["oai:host:1", "oai:host:2"], owner='worker01') == ["oai:host:1"]
+    assert store.reclaim_expired() == []
+    assert store.count_states() == {df_r.UNSET_LABEL: 3, 'ocr_busy': 1, 'ocr_done': 1}
+
+
+def test_lease_columns_added_to_existing_store(tmp_path):
+    """Stores created without lease columns get them"""
+
+    store_path = tmp_path / "old.sqlite"
+    conn = sqlite3.connect(store_path)
+    conn.execute("CREATE TABLE records (position INTEGER PRIMARY KEY,"
+                 " identifier TEXT NOT NULL UNIQUE, state TEXT NOT NULL,"
+                 " state_time TEXT NOT NULL, data TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    a_store = odem_rs.SQLiteRecordHandler(store_path, data_fields=_HEADER)
+    a_store.import_list(_write_list(tmp_path / "records.csv", 2))
+
+    assert len(a_store.lease_records(2, owner='worker01')) == 2
+
+
+def test_server_leases_and_heartbeats(tmp_path):
+    """Client leases batch from store, keeps it by
+    heartbeat and lists files don't support leases"""
+
+    odem_rs.import_record_list(_write_list(tmp_path / "import.csv", 5),
+                               tmp_path / "leases.sqlite").close()
+    _write_list(tmp_path / "plain.csv", 2)
+    start_data = df_r.HandlerInformation(tmp_path, logging.getLogger(__name__))
+    the_handler = functools.partial(odem_rs.RecordStoreRequestHandler, start_data)
+    server = http.server.HTTPServer(('127.0.0.1', 0), the_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    try:
+        client = odem_rs.LeaseClient("leases", '127.0.0.1', port, owner='worker01')
+        leased = client.lease_records(df_r.UNSET_LABEL, 'ocr_busy', n_records=3)
+        client.update('ocr_done', leased[0].identifier)
+        renewed = client.heartbeat([r.identifier for r in leased])
+        rest = client.lease_records(df_r.UNSET_LABEL, 'ocr_busy', n_records=3)
+        with pytest.raises(df_r.RecordsExhaustedException):
+            client.lease_records(df_r.UNSET_LABEL, 'ocr_busy', n_records=3)
+        with pytest.raises(df_r.RecordsServiceException):
+            odem_rs.LeaseClient("plain", '127.0.0.1', port).lease_records(
+                df_r.UNSET_LABEL, 'ocr_busy')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [r.identifier for r in leased] == ["oai:host:1", "oai:host:2", "oai:host:3"]
+    assert leased[0].info == {'client': '127.0.0.1'}
+    assert renewed == ["oai:host:2", "oai:host:3"]
+    assert [r.identifier for r in rest] == ["oai:host:4", "oai:host:5"]
+
+
+def test_smallest_first_fitting_capacity(store):
+    """Least megapixels first, records too large for
+    worker's disk or memory left for larger ones,
+    records without hints come last, if they fit"""
+
+    store.set_size_hints("oai:host:1", n_pages=300, megapixels=3000.0)
+    store.set_size_hints("oai:host:2", n_pages=10, megapixels=40.0)
+    store.set_size_hints("oai:host:3", n_pages=5, megapixels=50.0, image_bytes=10 ** 12)
+    store.set_size_hints("oai:host:4", n_pages=2)
+    small = odem_mdt.RmCapacity(cores=8, memory_available=4 * 1024 ** 3,
+                                disk_free=100 * 1024 ** 3)
+
+    leased = store.lease_records(5, capacity=small, policy=odem_rs.POLICY_SMALLEST)
+
+    # 8 pages in flight with 10 MP each don't fit into 4 GB,
+    # which is assumed for records without any hints, too
+    assert [r.identifier for r in leased] == ["oai:host:4", "oai:host:2"]
+    assert store.next_record(policy=odem_rs.POLICY_SMALLEST).identifier == "oai:host:3"
+    large = odem_mdt.RmCapacity(cores=8, memory_available=8 * 1024 ** 3,
+                                disk_free=100 * 1024 ** 3)
+    leased = store.lease_records(2, capacity=large, policy=odem_rs.POLICY_SMALLEST)
+    assert [r.identifier for r in leased] == ["oai:host:1", "oai:host:5"]
+
+
+def test_records_without_hints_fit_conservatively(store):
+    """Record without any hints is assumed to have
+    default number of pages with default size, each
+    core having a page in flight"""
+
+    n_cores = 4
+    memory = odem_rs.MEGAPIXELS_PER_PAGE * odem_rs.MEMORY_PER_MEGAPIXEL * n_cores
+    disk = odem_rs.PAGES_PER_RECORD * odem_rs.IMAGE_BYTES_PER_PAGE * odem_rs.DISK_PER_IMAGE_BYTE
+
+    assert store.next_record(capacity=odem_mdt.RmCapacity(n_cores, memory - 1, disk)) is None
+    assert store.next_record(capacity=odem_mdt.RmCapacity(n_cores, memory, disk - 1)) is None
+    fitting = store.next_record(capacity=odem_mdt.RmCapacity(n_cores, memory, disk))
+    assert fitting.identifier == "oai:host:1"
+
+
+def test_deadline_first(store):
+    """Earliest deadline first, none last"""
+
+    store.set_size_hints("oai:host:4", deadline="2026-11-01_00:00:00")
+    store.set_size_hints("oai:host:2", deadline="2026-10-20_00:00:00")
+
+    leased = store.lease_records(3, policy=odem_rs.POLICY_DEADLINE)
+
+    assert [r.identifier for r in leased] == ["oai:host:2", "oai:host:4", "oai:host:1"]
+    with pytest.raises(df_r.RecordHandlerException):
+        store.next_record(policy='largest')
+
+
+def test_policy_uses_index(store):
+    """Picking smallest open record doesn't sort all"""
+
+    the_plan = store._conn.execute(  # pylint:disable=protected-access
+        "EXPLAIN QUERY PLAN SELECT position FROM records WHERE state = 'n.a.'"
+        f" ORDER BY {odem_rs._SQL_ORDER[odem_rs.POLICY_SMALLEST]} LIMIT 1"  # pylint:disable=protected-access
+    ).fetchall()
+
+    assert 'idx_records_cost' in str(the_plan)
+    assert 'TEMP B-TREE' not in str(the_plan)
+
+
+def test_import_size_hints(tmp_path, store):
+    """Hints from tab separated file, unknown records skipped"""
+
+    hints_path = tmp_path / "hints.tsv"
+    hints_path.write_text("IDENTIFIER\tPAGES\tMEGAPIXELS\tDEADLINE\n"
+                          "oai:host:5\t12\t140.5\tn.a.\n"
+                          "oai:host:99\t1\t1\tn.a.\n", encoding='utf-8')
+
+    assert store.import_size_hints(hints_path) == 1
+    assert store.next_record(policy=odem_rs.POLICY_SMALLEST).identifier == "oai:host:5"
+
+
+def test_size_hints_from_info():
+    """Hints from statistics of processed record"""
+
+    info = {'n_images_pages': 12, 'mb': 1.5, 'mps': [(2.5, 10), (12.0, 2)]}
+
+    assert odem_rs.size_hints_from_info(info) == {'n_pages': 12,
+                                                  'image_bytes': 1572864,
+                                                  'megapixels': 49.0}
+    # only half of images OCR'd
+    info['n_images_pages'] = 24
+    assert odem_rs.size_hints_from_info(info) == {'n_pages': 24,
+                                                  'image_bytes': 3145728,
+                                                  'megapixels': 98.0}
+    info['download'] = {'loaded': 12, 'bytes': 2048}
+    assert odem_rs.size_hints_from_info(info)['image_bytes'] == 2048
+    assert not odem_rs.size_hints_from_info("n.a.")
+
+
+def test_server_assigns_by_capacity(tmp_path):
+    """Server picks by policy for capacity reported
+    and caches hints reported with final state"""
+
+    odem_rs.import_record_list(_write_list(tmp_path / "import.csv", 3),
+                               tmp_path / "sized.sqlite").close()
+    a_store = odem_rs.RecordStoreRequestHandler.get_store(tmp_path / "sized.sqlite")
+    a_store.set_size_hints("oai:host:1", n_pages=1000, image_bytes=10 ** 12)
+    a_store.set_size_hints("oai:host:3", n_pages=10)
+    start_data = df_r.HandlerInformation(tmp_path, logging.getLogger(__name__))
+    start_data.assignment_policy = odem_rs.POLICY_SMALLEST
+    the_handler = functools.partial(odem_rs.RecordStoreRequestHandler, start_data)
+    server = http.server.HTTPServer(('127.0.0.1', 0), the_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = odem_rs.LeaseClient(
+            "sized", '127.0.0.1', server.server_address[1],
+            fct_capacity=lambda: odem_mdt.RmCapacity(4, 8 * 1024 ** 3, 50 * 1024 ** 3))
+        record = client.get_record(df_r.UNSET_LABEL, 'ocr_busy')
+        client.update('ocr_done', record.identifier, n_images_pages=12,
+                      mps=[(2.0, 12)])
+        leased = client.lease_records(df_r.UNSET_LABEL, 'ocr_busy', n_records=3)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert record.identifier == "oai:host:3"
+    assert [r.identifier for r in leased] == ["oai:host:2"]
+    hints = a_store._conn.execute(  # pylint:disable=protected-access
+        "SELECT n_pages, megapixels FROM records WHERE identifier = 'oai:host:3'").fetchone()
+    assert hints == (12, 24.0)
+
+
+def test_batched_writes_commit_together(tmp_path):
+    """Concurrent writes share commits, a failing
+    write doesn't affect others in same batch"""
+
+    list_path = _write_list(tmp_path / "records.csv", 40)
+    store_path = tmp_path / "records.sqlite"
+    odem_rs.import_record_list(list_path, store_path).close()
+    a_store = odem_rs.SQLiteRecordHandler(store_path, batch_writes=True)
+    idents = [f"oai:host:{i}" for i in range(1, 41)] + ["oai:host:unknown"]
+    barrier = threading.Barrier(len(idents))
+
+    def _save(an_ident):
+        barrier.wait()
+        a_store.save_record_state(an_ident, 'ocr_done')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(idents)) as executor:
+        futures = [executor.submit(_save, i) for i in idents]
+    with pytest.raises(RuntimeError):
+        futures[-1].result()
+    n_writes, n_commits = a_store.n_writes, a_store.n_commits
+    a_store.close()
+
+    assert n_writes == 41
+    assert n_commits < n_writes
+    assert odem_rs.SQLiteRecordHandler(store_path).count_states() == {'ocr_done': 40}
+
+
+def test_threaded_server_hands_out_unique_records(tmp_path):
+    """Pooled server with batched writes hands each
+    record out just once to concurrent clients"""
+
+    odem_rs.import_record_list(_write_list(tmp_path / "import.csv", 30),
+                               tmp_path / "pooled.sqlite").close()
+    start_data = df_r.HandlerInformation(tmp_path, logging.getLogger(__name__))
+    start_data.server_threads = 4
+    server = odem_rs.create_server('127.0.0.1', 0, start_data)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def _take_all():
+        client = df_r.Client("pooled", '127.0.0.1', server.server_address[1])
+        taken = []
+        while True:
+            try:
+                record = client.get_record(df_r.UNSET_LABEL, 'ocr_busy')
+            except df_r.RecordsExhaustedException:
+                return taken
+            client.update('ocr_done', record.identifier)
+            taken.append(record.identifier)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+            taken = [i for f in [executor.submit(_take_all) for _ in range(6)]
+                     for i in f.result()]
+    finally:
+        server.shutdown()
+        server.server_close()
+    store = odem_rs.RecordStoreRequestHandler.get_store(tmp_path / "pooled.sqlite")
+
+    assert isinstance(server, odem_rs.PooledHTTPServer)
+    assert sorted(taken) == sorted(f"oai:host:{i}" for i in range(1, 31))
+    assert store.count_states() == {'ocr_done': 30}
+
+
+def test_metrics_endpoint(tmp_path):
+    """Server aggregates statistics of records
+    finished and counts records by state"""
+
+    odem_rs.import_record_list(_write_list(tmp_path / "import.csv", 3),
+                               tmp_path / "stored.sqlite").close()
+    start_data = df_r.HandlerInformation(tmp_path, logging.getLogger(__name__))
+    server = odem_rs.create_server('127.0.0.1', 0, start_data)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = df_r.Client("stored", '127.0.0.1', server.server_address[1])
+        client.get_record(df_r.UNSET_LABEL, 'ocr_busy')
+        client.update('ocr_done', "oai:host:1", n_ocr=12, mb=3.0,
+                      timedelta='0:06:00', host='worker01')
+        client.get_record(df_r.UNSET_LABEL, 'ocr_busy')
+        client.update('ocr_fail', "oai:host:2", exception='PermissionError')
+        response = requests.get(f"http://127.0.0.1:{server.server_address[1]}/metrics",
+                                timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+    lines = response.text.splitlines()
+
+    assert response.headers['Content-Type'].startswith('text/plain')
+    assert 'odem_pages_per_hour{host="worker01"} 120' in lines
+    assert 'odem_record_failure_ratio{exception="PermissionError"} 0.5' in lines
+    assert 'odem_records{list="stored",state="ocr_done"} 1' in lines
+    assert 'odem_records{list="import",state="n.a."} 3' in lines
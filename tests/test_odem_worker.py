@@ -0,0 +1,277 @@
+"""Specification for long-running record worker"""
+
+import logging
+import os
+import shutil
+import signal
+import threading
+import time
+import unittest.mock
+
+from pathlib import Path
+
+import digiflow.record as df_r
+
+from lib import odem
+import lib.odem.commons as oc
+import lib.odem.worker as odem_worker
+
+from .conftest import TEST_RES, fixture_configuration
+
+
+def _records(*idents):
+    pending = [df_r.Record(f"oai:host:{an_ident}") for an_ident in idents]
+    return lambda: pending.pop(0) if pending else None
+
+
+def test_worker_processes_until_exhausted():
+    """Without poll interval worker quits
+    as soon as no open record is left"""
+
+    processed = []
+    worker = odem_worker.RecordWorker(_records(1, 2, 3),
+                                      lambda r: processed.append(r.identifier) or True,
+                                      poll_interval=0)
+
+    assert worker.run() == 3
+    assert processed == ["oai:host:1", "oai:host:2", "oai:host:3"]
+    assert not worker.failed
+
+
+def test_worker_halts_if_record_requires_human():
+    """Record returning False stops worker"""
+
+    worker = odem_worker.RecordWorker(_records(1, 2, 3), lambda r: r.identifier != "oai:host:2",
+                                      poll_interval=0)
+
+    assert worker.run() == 2
+    assert worker.failed
+
+
+def test_worker_sigterm_completes_current_record():
+    """SIGTERM while processing lets current
+    record finish but no further one start"""
+
+    shutdown = odem_worker.WorkerShutdown()
+    shutdown.install([signal.SIGUSR1])
+    processed = []
+
+    def _process(record):
+        os.kill(os.getpid(), signal.SIGUSR1)
+        processed.append(record.identifier)
+        return True
+
+    worker = odem_worker.RecordWorker(_records(1, 2, 3), _process, shutdown, poll_interval=0)
+    try:
+        n_processed = worker.run()
+    finally:
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+
+    assert n_processed == 1
+    assert processed == ["oai:host:1"]
+    assert shutdown.requested
+
+
+def test_worker_polls_and_respects_max_records():
+    """Worker waits for new open records
+    and quits after max records"""
+
+    answers = [None, df_r.Record("oai:host:1"), None, df_r.Record("oai:host:2"),
+               df_r.Record("oai:host:3")]
+    worker = odem_worker.RecordWorker(lambda: answers.pop(0), lambda _: True,
+                                      poll_interval=0.01, max_records=2)
+
+    assert worker.run() == 2
+    assert len(answers) == 1
+
+
+def test_worker_concurrent_records():
+    """Several records processed at once, each in
+    thread named after record, never more than
+    n_concurrent and no more than max_records"""
+
+    lock = threading.Lock()
+    running = []
+    peak = []
+    names = []
+
+    def _process(record):
+        with lock:
+            running.append(record)
+            peak.append(len(running))
+            names.append(threading.current_thread().name)
+        time.sleep(0.02)
+        with lock:
+            running.remove(record)
+        return True
+
+    worker = odem_worker.RecordWorker(_records(*range(1, 8)), _process, poll_interval=0,
+                                      max_records=5, n_concurrent=2)
+
+    assert worker.run() == 5
+    assert max(peak) == 2
+    assert sorted(names) == [f"odem.record.{i}" for i in range(1, 6)]
+    assert not worker.failed
+
+
+def test_worker_concurrent_halts_if_record_requires_human():
+    """Failed record stops taking further ones,
+    but those already running are completed"""
+
+    def _process(record):
+        if record.identifier == "oai:host:1":
+            return False
+        time.sleep(0.05)
+        return True
+
+    worker = odem_worker.RecordWorker(_records(*range(1, 8)), _process,
+                                      poll_interval=0, n_concurrent=2)
+
+    assert worker.run() == 2
+    assert worker.failed
+
+
+def test_worker_concurrent_survives_record_error():
+    """Unexpected error of one record is handed
+    to fail callback, other records go on"""
+
+    failed = []
+
+    def _process(record):
+        if record.identifier == "oai:host:2":
+            raise ValueError("broken record")
+        return True
+
+    worker = odem_worker.RecordWorker(_records(1, 2, 3, 4), _process, poll_interval=0,
+                                      n_concurrent=2,
+                                      fct_fail_record=lambda r, e: failed.append((r, e)))
+
+    assert worker.run() == 4
+    assert not worker.failed
+    assert [r.identifier for r, _ in failed] == ["oai:host:2"]
+    assert isinstance(failed[0][1], ValueError)
+
+
+def test_worker_prefetches_next_record():
+    """Next record is staged while current one is
+    processed and taken over afterwards"""
+
+    events = []
+    prefetcher = odem_worker.RecordPrefetcher(
+        lambda r: events.append(("stage", r.identifier)),
+        lambda r: events.append(("release", r.identifier)))
+    worker = odem_worker.RecordWorker(_records(1, 2, 3),
+                                      lambda r: events.append(("process", r.identifier)),
+                                      poll_interval=0, prefetcher=prefetcher)
+
+    assert worker.run() == 3
+    assert [e for e in events if e[0] == "stage"] == [("stage", "oai:host:2"),
+                                                      ("stage", "oai:host:3")]
+    assert [e for e in events if e[0] == "process"] == [("process", "oai:host:1"),
+                                                        ("process", "oai:host:2"),
+                                                        ("process", "oai:host:3")]
+    # staging of next record starts before current is processed
+    assert events.index(("stage", "oai:host:3")) > events.index(("process", "oai:host:1"))
+
+
+def test_worker_hands_back_prefetched_on_shutdown():
+    """Prefetched record not processed
+    because of shutdown is released"""
+
+    shutdown = odem_worker.WorkerShutdown()
+    released = []
+    prefetcher = odem_worker.RecordPrefetcher(lambda _: None,
+                                              lambda r: released.append(r.identifier))
+    worker = odem_worker.RecordWorker(_records(1, 2, 3),
+                                      lambda _: shutdown.request(), shutdown,
+                                      poll_interval=0, prefetcher=prefetcher)
+
+    assert worker.run() == 1
+    assert released == ["oai:host:2"]
+
+
+def test_worker_prefetch_failure_keeps_record():
+    """Record failed to stage is
+    processed nevertheless"""
+
+    def _stage(_):
+        raise OSError("disk full")
+
+    processed = []
+    prefetcher = odem_worker.RecordPrefetcher(_stage, lambda _: None)
+    worker = odem_worker.RecordWorker(_records(1, 2),
+                                      lambda r: processed.append(r.identifier),
+                                      poll_interval=0, prefetcher=prefetcher)
+
+    assert worker.run() == 2
+    assert processed == ["oai:host:1", "oai:host:2"]
+
+
+def test_claim_staged(tmp_path):
+    """Staged data moved into work dir unless
+    there's already one, i.e. to be resumed"""
+
+    staged = Path(odem_worker.staging_dir(tmp_path, "1234"))
+    staged.mkdir(parents=True)
+    (staged / "1234.xml").write_text("<mets/>")
+
+    assert odem_worker.claim_staged(tmp_path, "1234", tmp_path / "1234")
+    assert (tmp_path / "1234" / "1234.xml").exists()
+    assert not staged.exists()
+
+    staged.mkdir()
+    assert not odem_worker.claim_staged(tmp_path, "1234", tmp_path / "1234")
+    assert not staged.exists()
+    assert not odem_worker.claim_staged(tmp_path, "5678", tmp_path / "5678")
+
+
+def test_stage_record_preloads_process(tmp_path):
+    """Prefetched record's data is used
+    without loading it again"""
+
+    record = df_r.Record('oai:opendata.uni-halle.de:1981185920/44046')
+    cfg = fixture_configuration()
+    cfg.set(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_URL, 'http://host/oai')
+    cfg.set(oc.CFG_SEC_MONITOR, 'path_disk_usage', str(tmp_path))
+    logger = logging.getLogger(__name__)
+
+    def _load(*_, **kwargs):
+        shutil.copyfile(TEST_RES / '1981185920_44046.xml', kwargs['local_dst'])
+
+    with unittest.mock.patch('digiflow.OAILoader.load') as request_mock:
+        request_mock.side_effect = _load
+        odem_worker.stage_record(record, cfg, tmp_path, logger)
+        work_dir = tmp_path / '1981185920_44046'
+        assert odem_worker.claim_staged(tmp_path, '1981185920_44046', work_dir)
+        odem_process = odem.ODEMProcessImpl(record, cfg, work_dir=work_dir, logger=logger)
+        odem_process.preloaded = True
+        odem_process.load()
+        odem_process.inspect_metadata()
+
+    assert request_mock.call_count == 1
+    assert len(odem_process.ocr_candidates) == 4
+
+
+def test_leases_batches_and_heartbeats():
+    """Records leased in batches, held ones kept alive
+    by heartbeats and those not taken handed back"""
+
+    batches = [[df_r.Record(f"oai:host:{i}") for i in range(1, 4)]]
+    beats = []
+    released = []
+    leases = odem_worker.RecordLeases(lambda n: batches.pop(0) if batches else [],
+                                      lambda idents: beats.append(idents) or idents,
+                                      lambda r: released.append(r.identifier),
+                                      n_records=3, heartbeat_interval=0.01)
+    leases.start()
+
+    first = leases.next_record()
+    leases.done(first)
+    time.sleep(0.05)
+    leases.release()
+
+    assert first.identifier == "oai:host:1"
+    assert beats[-1] == ["oai:host:2", "oai:host:3"]
+    assert released == ["oai:host:2", "oai:host:3"]
+    assert not leases.held
+    assert leases.next_record() is None
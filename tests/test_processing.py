@@ -10,12 +10,14 @@ from pathlib import Path
 
 import digiflow as df
 import digiflow.record as df_r
+import digiflow.digiflow_io as dfo
 import lxml.etree as ET
 
 import pytest
 
 from lib import odem
 import lib.odem.commons as oc
+import lib.odem.processing.mets as odem_mets
 
 from .conftest import (
     PROJECT_ROOT_DIR,
@@ -179,6 +181,70 @@ def test_load_mock_called(tmp_path_factory):
     assert os.path.exists(odem_proc.mets_file_path)
 
 
+@pytest.mark.parametrize("derivans_enabled,n_loaded", [(False, 4), (True, 5)])
+def test_two_phase_load_only_required_images(tmp_path, monkeypatch, derivans_enabled, n_loaded):
+    """First phase loads METS only, second phase
+    loads ocr candidates and, if Derivans is about
+    to run, all images of file group"""
+
+    workdir = tmp_path / '1981185920_44046'
+    workdir.mkdir()
+    record = df_r.Record('oai:opendata.uni-halle.de:1981185920/44046')
+    odem_proc = odem.ODEMProcessImpl(record, fixture_configuration(), workdir,
+                                     str(tmp_path), odem.get_worker_logger(str(tmp_path)))
+    odem_proc.configuration.set(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_URL, 'http://host/oai')
+    odem_proc.configuration.set(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_TWO_PHASE, 'True')
+    odem_proc.configuration.set(oc.CFG_SEC_DERIVANS, oc.CFG_SEC_DERIVANS_ENABLED,
+                                str(derivans_enabled))
+    loaded = []
+    monkeypatch.setattr(odem.ODEMProcessImpl, "_load_image",
+                        lambda _, __, resource: loaded.append(Path(resource.local_path).name))
+
+    with unittest.mock.patch('digiflow.OAILoader.load') as request_mock:
+        request_mock.side_effect = lambda *_, **__: shutil.copyfile(
+            TEST_RES / '1981185920_44046.xml', workdir / '1981185920_44046.xml')
+        odem_proc.load()
+    odem_proc.inspect_metadata()
+    odem_proc.load_deferred_images()
+
+    assert request_mock.call_args.kwargs['skip_resources']
+    assert len(odem_proc.ocr_candidates) == 4
+    assert len(loaded) == n_loaded
+    assert {name for name, _ in odem_proc.ocr_candidates} <= set(loaded)
+    assert not odem_proc.images_deferred
+
+
+def test_concurrent_load_keeps_fulltext(tmp_path, monkeypatch):
+    """Concurrent image download makes loader skip
+    resources, but existing OCR file group gets
+    loaded anyway like loader does"""
+
+    workdir = tmp_path / '1981185920_33908'
+    workdir.mkdir()
+    record = df_r.Record('oai:opendata.uni-halle.de:1981185920/33908')
+    odem_proc = odem.ODEMProcessImpl(record, fixture_configuration(), workdir,
+                                     str(tmp_path), odem.get_worker_logger(str(tmp_path)))
+    odem_proc.configuration.set(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_URL, 'http://host/oai')
+    odem_proc.configuration.set(oc.CFG_SEC_FLOW, oc.CFG_SEC_FLOW_OPT_DOWNLOAD_WORKERS, '2')
+    monkeypatch.setattr(odem.ODEMProcessImpl, "_load_image", lambda *_: None)
+    loaded = []
+    monkeypatch.setattr(df.OAILoader, "load_resource",
+                        lambda _, url, path, post_func: loaded.append((url, path, post_func)))
+
+    with unittest.mock.patch('digiflow.OAILoader.load') as request_mock:
+        request_mock.side_effect = lambda *_, **__: shutil.copyfile(
+            TEST_RES / '1981185920_33908.xml', workdir / '1981185920_33908.xml')
+        odem_proc.load()
+
+    assert request_mock.call_args.kwargs['skip_resources']
+    n_fulltext = len(odem_mets.image_files(odem_proc.mets_file_path, 'FULLTEXT'))
+    assert n_fulltext > 0
+    assert len(loaded) == n_fulltext
+    assert loaded[0][0].endswith('/00000019.xml')
+    assert loaded[0][1] == workdir / 'FULLTEXT' / '00000019.xml'
+    assert loaded[0][2] is dfo.post_oai_store_ocr
+
+
 def test_odem_process_identifier_local_workdir(tmp_path):
     """Ensure expected identifier calculated
     if no OAI record present at all"""